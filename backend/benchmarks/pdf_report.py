@@ -0,0 +1,87 @@
+"""
+Замер времени генерации PDF со списком покупок на один запрос.
+
+"До": шрифты Vera (без кириллицы) регистрируются на каждый запрос,
+весь список выводится одним текстовым блоком на одной странице
+(прежняя реализация).
+"После": шрифты зарегистрированы один раз при старте приложения
+(RecipesConfig.ready), recipes_services.write_pdf_shopping_list.
+"Регистрация на запрос": текущая разметка с постраничным выводом,
+но шрифты с кириллицей регистрируются на каждый запрос.
+
+Запуск из директории backend/:
+    python benchmarks/pdf_report.py --rows 50 --repeat 100
+"""
+import argparse
+import io
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'foodgram'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.test_settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from reportlab.lib.units import cm  # noqa: E402
+from reportlab.pdfbase import pdfmetrics  # noqa: E402
+from reportlab.pdfbase.ttfonts import TTFont  # noqa: E402
+from reportlab.pdfgen import canvas  # noqa: E402
+
+from recipes import recipes_services  # noqa: E402
+
+
+def legacy_pdf_report(rows):
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer)
+    pdfmetrics.registerFont(TTFont('Vera', 'Vera.ttf'))
+    pdfmetrics.registerFont(TTFont('VeraBd', 'VeraBd.ttf'))
+    pdfmetrics.registerFont(TTFont('VeraIt', 'VeraIt.ttf'))
+    pdfmetrics.registerFont(TTFont('VeraBI', 'VeraBI.ttf'))
+    pdf.setFont('Vera', 16)
+    textobject = pdf.beginText(2 * cm, 29.7 * cm - 2 * cm)
+    textobject.textLine('SHOPPING LIST:')
+    for num, (name, amount, unit) in enumerate(rows, start=1):
+        textobject.textLine(f'{num}. {name} - {amount} {unit}.')
+    pdf.drawText(textobject)
+    pdf.save()
+    return buffer
+
+
+def register_fonts_per_request_pdf_report(rows):
+    fonts = settings.SHOPPING_LIST_PDF_FONTS
+    pdfmetrics.registerFont(
+        TTFont(recipes_services.PDF_REPORT_FONT, fonts['regular']))
+    pdfmetrics.registerFont(
+        TTFont(recipes_services.PDF_REPORT_FONT_BOLD, fonts['bold']))
+    return current_pdf_report(rows)
+
+
+def current_pdf_report(rows):
+    buffer = io.BytesIO()
+    recipes_services.write_pdf_shopping_list(rows, buffer)
+    return buffer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=50,
+                        help='Количество строк в списке покупок')
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args()
+    rows = [(f'Ингредиент {num}', num * 10, 'г') for num in range(args.rows)]
+    for title, report in (
+            ('до', legacy_pdf_report),
+            ('после', current_pdf_report),
+            # Перерегистрирует шрифты, поэтому выполняется последним
+            ('регистрация на запрос', register_fonts_per_request_pdf_report)):
+        seconds = timeit.timeit(lambda: report(rows), number=args.repeat)
+        print(f'{title:>22}: {seconds / args.repeat * 1000:.2f} мс '
+              f'на запрос ({args.rows} строк)')
+
+
+if __name__ == '__main__':
+    main()
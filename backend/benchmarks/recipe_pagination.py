@@ -0,0 +1,114 @@
+"""
+Замер времени получения страницы ленты рецептов в зависимости от ее
+глубины: постраничная пагинация (OFFSET и COUNT(*)) против курсорной
+(api.pagination.KeysetPagination по (pub_date, id)).
+
+Создается тестовая БД (по дефолту SQLite в памяти, см. test_settings)
+с --recipes рецептами. Для каждой глубины замеряется только выборка
+страницы, без сериализации.
+Запуск из директории backend/:
+    python benchmarks/recipe_pagination.py --recipes 100000
+"""
+import argparse
+import base64
+import datetime
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'foodgram'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.test_settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.test.utils import (setup_databases,  # noqa: E402
+                               teardown_databases)
+from rest_framework.request import Request  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from api.pagination import CursorOrPageNumberPagination  # noqa: E402
+from recipes import models  # noqa: E402
+
+User = get_user_model()
+
+KEYSET_ORDERING = ('-pub_date', '-id')
+
+
+class FeedView:
+    keyset_ordering = KEYSET_ORDERING
+
+
+def seed(recipes_count):
+    author = User.objects.create(
+        username='author', email='author@foodgram.test')
+    models.Recipe.objects.bulk_create([
+        models.Recipe(name=f'Рецепт {num}', text='Описание',
+                      image='images/seed.png', cooking_time=5,
+                      author=author)
+        for num in range(recipes_count)
+    ], batch_size=5000)
+    # auto_now_add дает всем рецептам одну дату, а в реальной ленте
+    # даты публикации различаются
+    start = datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc)
+    recipes = list(models.Recipe.objects.only('id'))
+    for recipe in recipes:
+        recipe.pub_date = start + datetime.timedelta(minutes=recipe.id)
+    models.Recipe.objects.bulk_update(recipes, ('pub_date',),
+                                      batch_size=5000)
+
+
+def get_page(query):
+    request = Request(APIRequestFactory().get('/api/recipes/', query))
+    return CursorOrPageNumberPagination().paginate_queryset(
+        models.Recipe.objects.all(), request, FeedView())
+
+
+def get_cursor(offset):
+    """
+    Курсор страницы, начинающейся с позиции offset
+    """
+    if not offset:
+        return ''
+    last = models.Recipe.objects.order_by(*KEYSET_ORDERING)[offset - 1]
+    return base64.urlsafe_b64encode(json.dumps(
+        [str(last.pub_date), str(last.id)]).encode()).decode()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--recipes', type=int, default=100000)
+    parser.add_argument('--limit', type=int, default=9)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    # Миграций в репозитории нет, таблицы создаются по моделям
+    settings.MIGRATION_MODULES = {
+        app: None for app in ('recipes', 'users', 'auth', 'contenttypes',
+                              'admin', 'sessions', 'authtoken')}
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        seed(args.recipes)
+        last_page = args.recipes // args.limit
+        print(f'{"страница":>10} {"page, мс":>10} {"cursor, мс":>11}')
+        for page in sorted({1, 10, 100, last_page // 2, last_page}):
+            page_query = {'page': page, 'limit': args.limit}
+            cursor_query = {'cursor': get_cursor((page - 1) * args.limit),
+                            'limit': args.limit}
+            assert ([recipe.pk for recipe in get_page(page_query)]
+                    == [recipe.pk for recipe in get_page(cursor_query)])
+            timings = [
+                timeit.timeit(lambda: get_page(query), number=args.repeat)
+                / args.repeat * 1000
+                for query in (page_query, cursor_query)
+            ]
+            print(f'{page:>10} {timings[0]:>10.2f} {timings[1]:>11.2f}')
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Замер поиска рецептов и ингредиентов на PostgreSQL.
+
+Создается тестовая БД с --recipes рецептами, затем одни и те же
+запросы выполняются с отключенными индексами (последовательное
+чтение таблицы) и с индексами pg_trgm и GIN по search_vector
+(recipes.search.create_postgres_search_objects).
+
+Требуется PostgreSQL (DB_ENGINE=django.db.backends.postgresql и
+переменные POSTGRES_DB, POSTGRES_USER и т.д., как для приложения).
+Запуск из директории backend/:
+    python benchmarks/recipe_search.py --recipes 100000
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'foodgram'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.test_settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import (setup_databases,  # noqa: E402
+                               teardown_databases)
+
+from recipes import models, search  # noqa: E402
+
+User = get_user_model()
+
+WORDS = ('борщ', 'суп', 'салат', 'пирог', 'котлеты', 'каша', 'омлет',
+         'блины', 'плов', 'рагу', 'запеканка', 'соус', 'гуляш', 'паста')
+QUERIES = {
+    'рецепты по названию': lambda: search.search_recipes(
+        models.Recipe.objects.all(), 'запеканка'),
+    'рецепты с опечаткой': lambda: search.search_recipes(
+        models.Recipe.objects.all(), 'запиканка'),
+    'ингредиенты по подстроке': lambda: search.filter_ingredients(
+        models.Ingredient.objects.all(), 'молок'),
+}
+
+
+def seed(recipes_count):
+    rnd = random.Random(2022)
+    author = User.objects.create(
+        username='author', email='author@foodgram.test')
+    models.Ingredient.objects.bulk_create([
+        models.Ingredient(name=f'{rnd.choice(WORDS)} {num}',
+                          measurement_unit='г')
+        for num in range(recipes_count // 10)
+    ] + [models.Ingredient(name='молоко', measurement_unit='мл')],
+        batch_size=5000)
+    models.Recipe.objects.bulk_create([
+        models.Recipe(
+            name=f'{rnd.choice(WORDS)} {rnd.choice(WORDS)} {num}',
+            text=' '.join(rnd.choices(WORDS, k=30)),
+            image='images/seed.png', cooking_time=rnd.randint(1, 180),
+            author=author)
+        for num in range(recipes_count)
+    ], batch_size=5000)
+    search.create_postgres_search_objects()
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def run_queries(repeat, use_indexes):
+    value = 'on' if use_indexes else 'off'
+    with connection.cursor() as cursor:
+        cursor.execute(f'SET enable_indexscan = {value}')
+        cursor.execute(f'SET enable_bitmapscan = {value}')
+    for title, build_queryset in QUERIES.items():
+        seconds = timeit.timeit(
+            lambda: list(build_queryset()[:20]), number=repeat)
+        print(f'{title:>26}: {seconds / repeat * 1000:.2f} мс')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--recipes', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    if not search.is_postgres_search_enabled():
+        sys.exit('Для замера нужен PostgreSQL и POSTGRES_SEARCH=True')
+    # Миграций в репозитории нет, таблицы создаются по моделям
+    settings.MIGRATION_MODULES = {
+        app: None for app in ('recipes', 'users', 'auth', 'contenttypes',
+                              'admin', 'sessions', 'authtoken')}
+    old_config = setup_databases(verbosity=1, interactive=False)
+    try:
+        seed(args.recipes)
+        print('Без индексов (последовательное чтение):')
+        run_queries(args.repeat, use_indexes=False)
+        print('С индексами pg_trgm и GIN:')
+        run_queries(args.repeat, use_indexes=True)
+    finally:
+        teardown_databases(old_config, verbosity=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,3 +4,47 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.db.models.signals import (post_delete, post_init,
+                                              post_save)
+
+        from django.contrib.auth import get_user_model
+
+        from api.pagination import bump_count_version
+        from api.response_cache import (invalidate_on_user_change,
+                                        invalidate_recipes_cache,
+                                        remember_user_fields)
+        from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                                    RecipeTag, Tag)
+
+        User = get_user_model()
+        for model in (Recipe, Tag, Ingredient):
+            for signal in (post_save, post_delete):
+                signal.connect(
+                    invalidate_recipes_cache, sender=model,
+                    dispatch_uid=f'recipes_cache_{model.__name__}_{signal}')
+        # Автор рецепта входит в ответ: кэш сбрасывается при изменении
+        # полей автора из ответа и при удалении пользователя
+        post_init.connect(remember_user_fields, sender=User,
+                          dispatch_uid='recipes_cache_User')
+        post_save.connect(invalidate_on_user_change, sender=User,
+                          dispatch_uid='recipes_cache_User')
+        post_delete.connect(invalidate_recipes_cache, sender=User,
+                            dispatch_uid='recipes_cache_User')
+        # Сервисы рецептов пишут теги и ингредиенты через bulk_create
+        # и QuerySet.delete() без сигналов, поэтому RecipeSerializer
+        # сбрасывает кэш сам. Обработчик post_save - для остальных
+        # путей (админка, shell). post_delete не подключается: он
+        # отключил бы быстрое удаление строк одним запросом; удаление
+        # в админке RecipeTag и RecipeIngredient сбрасывает кэш само
+        # (recipes.admin.RecipesCacheAdminMixin)
+        for model in (RecipeTag, RecipeIngredient):
+            post_save.connect(
+                invalidate_recipes_cache, sender=model,
+                dispatch_uid=f'recipes_cache_{model.__name__}')
+        for model in (Recipe, User):
+            for signal in (post_save, post_delete):
+                signal.connect(
+                    bump_count_version, sender=model,
+                    dispatch_uid=f'count_version_{model.__name__}_{signal}')
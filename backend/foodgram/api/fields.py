@@ -1,21 +1,56 @@
 import base64
 import uuid
 
+from django.conf import settings
 from django.core.files.base import ContentFile
-from rest_framework import exceptions, serializers
+from rest_framework import serializers
+
+from recipes import images
 
 
 class ImageFromBase64Field(serializers.ImageField):
+    """
+    Изображение в виде data URL (data:image/png;base64,...).
+    Размер проверяется до декодирования, формат и разрешение -
+    по заголовку изображения. Перекодирование и миниатюры
+    выполняются в фоне (recipes.image_jobs).
+    """
     def to_internal_value(self, data):
         try:
-            data_format, base64_string = data.split(';base64,')
-            extension = data_format.split('/')[-1]
-            image_id = uuid.uuid4()
-            data = ContentFile(
-                base64.b64decode(base64_string),
-                name=f'{image_id}.{extension}'
-            )
-        except exceptions.APIException:
+            _, base64_string = data.split(';base64,')
+        except (AttributeError, ValueError):
             raise serializers.ValidationError(
                 'Ошибка декодирования изображения')
-        return super().to_internal_value(data)
+        # Размер после декодирования - 3/4 длины строки base64
+        max_size = settings.RECIPE_IMAGES['MAX_UPLOAD_SIZE']
+        if len(base64_string) * 3 // 4 > max_size:
+            raise serializers.ValidationError(
+                f'Размер изображения не должен превышать '
+                f'{max_size // (1024 * 1024)} МБ')
+        try:
+            content = base64.b64decode(base64_string)
+            image_format = images.check_image(content).format
+        except ValueError as error:
+            # В том числе binascii.Error и images.ImageError
+            raise serializers.ValidationError(
+                str(error) if isinstance(error, images.ImageError)
+                else 'Ошибка декодирования изображения')
+        # Расширение - по фактическому формату, а не по data URL.
+        # Полная проверка ImageField (распаковка через Pillow) выполняется
+        # при обработке в фоне
+        return ContentFile(
+            content, name=f'{uuid.uuid4()}.{image_format.lower()}')
+
+
+class ThumbnailsField(serializers.ReadOnlyField):
+    """
+    Ссылки на миниатюры изображения: {вариант: url}.
+    Как и в ImageField, ссылки абсолютные, если в контексте есть request.
+    """
+    def to_representation(self, image):
+        urls = images.get_thumbnail_urls(image)
+        request = self.context.get('request')
+        if request is None:
+            return urls
+        return {variant: request.build_absolute_uri(url)
+                for variant, url in urls.items()}
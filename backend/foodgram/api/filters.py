@@ -1,19 +1,37 @@
+from django import forms
 from django_filters import rest_framework as django_filters
 from rest_framework import filters
 
-from recipes import models, recipes_services
+from recipes import models, recipes_services, search
+
+
+class MultipleValueField(forms.Field):
+    """
+    Все значения повторяющегося параметра (?tags=a&tags=b)
+    без проверки по списку вариантов
+    """
+    widget = forms.SelectMultiple
+
+    def to_python(self, value):
+        return [item for item in value or () if item]
+
+
+class MultipleValueFilter(django_filters.Filter):
+    field_class = MultipleValueField
 
 
 class IngredientFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(
-        field_name='name',
-        lookup_expr='icontains',
+        method='search_name'
     )
 
     class Meta:
         model = models.Ingredient
         fields = ('name',)
 
+    def search_name(self, queryset, name, value):
+        return search.filter_ingredients(queryset, value)
+
 
 class RecipeFilter(django_filters.FilterSet):
     author = django_filters.NumberFilter(
@@ -21,9 +39,13 @@ class RecipeFilter(django_filters.FilterSet):
         lookup_expr='exact'
     )
 
-    tags = django_filters.AllValuesMultipleFilter(
-        field_name='tags__slug',
-        lookup_expr='icontains'
+    tags = MultipleValueFilter(
+        method='filter_tags'
+    )
+    # any - рецепты хотя бы с одним из тегов, all - со всеми тегами
+    tags_match = django_filters.ChoiceFilter(
+        choices=(('any', 'any'), ('all', 'all')),
+        method='skip_filter'
     )
 
     is_favorited = django_filters.BooleanFilter(
@@ -32,10 +54,22 @@ class RecipeFilter(django_filters.FilterSet):
     is_in_shopping_cart = django_filters.BooleanFilter(
         method='show_shopping_cart'
     )
+    search = django_filters.CharFilter(
+        method='search_recipes'
+    )
 
     class Meta:
         model = models.Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'tags_match', 'is_favorited',
+                  'is_in_shopping_cart', 'search')
+
+    def filter_tags(self, queryset, name, value):
+        return recipes_services.filter_recipes_by_tags(
+            queryset=queryset, slugs=value,
+            match_all=self.form.cleaned_data.get('tags_match') == 'all')
+
+    def skip_filter(self, queryset, name, value):
+        return queryset
 
     def show_favorited(self, queryset, name, value):
         if value:
@@ -49,6 +83,9 @@ class RecipeFilter(django_filters.FilterSet):
                 user=self.request.user, queryset=queryset)
         return queryset.all()
 
+    def search_recipes(self, queryset, name, value):
+        return search.search_recipes(queryset, value)
+
 
 class LimitRecipesFilterBackend(filters.BaseFilterBackend):
 
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import response_cache
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of the anonymous recipes response cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Обнулить счетчики после вывода')
+
+    def handle(self, *args, **options):
+        if not settings.RECIPES_RESPONSE_CACHE['STATS']:
+            self.stdout.write(
+                'Счетчики выключены (RECIPES_RESPONSE_CACHE["STATS"])')
+        stats = response_cache.get_cache_stats()
+        self.stdout.write(
+            f'Попаданий: {stats["hits"]}, промахов: {stats["misses"]}, '
+            f'доля попаданий: {stats["hit_ratio"]:.1%}')
+        if options['reset']:
+            response_cache.reset_cache_stats()
+            self.stdout.write('...Счетчики обнулены...')
@@ -1,4 +1,17 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
 from rest_framework import permissions, viewsets
+from rest_framework.response import Response
+
+from recipes.data_versions import get_data_version
+from . import response_cache
+
+REFERENCE_DATA_KEY = 'reference_data:{}'
 
 
 class FlattenMixinSerializer:
@@ -24,3 +37,98 @@ class FlattenMixinSerializer:
 class ReadOnlyAnyNoPaginationMixinViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
     permission_classes = (permissions.AllowAny,)
+
+
+class VersionedCacheMixin:
+    """
+    HTTP-кэширование справочных данных (list/retrieve).
+    ETag строится по версии данных (recipes.data_versions) и запросу,
+    поэтому на запрос с совпадающим If-None-Match отвечаем 304
+    без обращения к БД и сериализатору. Ответы без параметров запроса
+    хранятся в кэше уже отрендеренными до смены версии данных.
+    """
+    data_version = None
+
+    def list(self, request, *args, **kwargs):
+        return self.versioned_response(
+            lambda: super(VersionedCacheMixin, self).list(
+                request, *args, **kwargs).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.versioned_response(
+            lambda: super(VersionedCacheMixin, self).retrieve(
+                request, *args, **kwargs).data)
+
+    def versioned_response(self, get_data):
+        """
+        Ответ с данными get_data() (вызывается только при промахе кэша)
+        """
+        request = self.request
+        renderer = request.accepted_renderer
+        if renderer.format != 'json':
+            # Browsable API не кэшируем
+            return Response(get_data())
+        key = hashlib.sha1(
+            f'{get_data_version(self.data_version)}:'
+            f'{request.accepted_media_type}:'
+            f'{request.get_full_path()}'.encode()
+        ).hexdigest()
+        etag = f'"{key}"'
+        if self._etag_matches(etag):
+            response = HttpResponseNotModified()
+        else:
+            content = cache.get(REFERENCE_DATA_KEY.format(key))
+            if content is None:
+                content = renderer.render(
+                    get_data(), request.accepted_media_type,
+                    self.get_renderer_context())
+                if not request.query_params:
+                    cache.set(REFERENCE_DATA_KEY.format(key), content,
+                              settings.REFERENCE_DATA_CACHE['VERSION_TTL'])
+            response = HttpResponse(
+                content, content_type=request.accepted_media_type)
+        response['ETag'] = etag
+        patch_cache_control(
+            response, public=True,
+            max_age=settings.REFERENCE_DATA_CACHE['MAX_AGE'])
+        return response
+
+    def _etag_matches(self, etag):
+        etags = parse_etags(self.request.headers.get('If-None-Match', ''))
+        # If-None-Match сравнивается без учета признака слабого ETag
+        return '*' in etags or etag in (
+            tag[2:] if tag.startswith('W/') else tag for tag in etags)
+
+
+class AnonymousResponseCacheMixin:
+    """
+    Кэширование ответов list/retrieve для анонимных пользователей
+    (api.response_cache). Заголовок X-Cache показывает HIT/MISS.
+    """
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            lambda: super(AnonymousResponseCacheMixin, self).list(
+                request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            lambda: super(AnonymousResponseCacheMixin, self).retrieve(
+                request, *args, **kwargs))
+
+    def cached_response(self, get_response):
+        if not response_cache.is_cacheable(self.request):
+            return get_response()
+        key = response_cache.get_cache_key(self.request)
+        content = response_cache.get_response(key)
+        if content is not None:
+            response = HttpResponse(
+                content, content_type=self.request.accepted_media_type)
+            response['X-Cache'] = 'HIT'
+            return response
+        response = get_response()
+        if response.status_code == 200:
+            response.add_post_render_callback(
+                lambda rendered: response_cache.set_response(
+                    key, rendered.content))
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,14 @@
+from rest_framework.negotiation import BaseContentNegotiation
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """
+    Не учитывает заголовок Accept при выборе рендерера DRF.
+    Нужен для эндпоинтов, которые сами отдают файлы в разных форматах
+    (например, application/pdf), иначе DRF ответит 406.
+    """
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
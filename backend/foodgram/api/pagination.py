@@ -1,6 +1,287 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import hashlib
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import (EmptyPage, Page, PageNotAnInteger,
+                                   Paginator)
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from recipes.data_versions import bump_data_version, get_data_version
+
+
+APPROXIMATE_COUNT_KEY = 'approximate_count:{}'
+# Версия данных для кэшированных подсчетов: меняется при создании
+# и удалении объектов модели (обработчики подключаются в ApiConfig.ready)
+COUNT_DATA_VERSION = 'count:{}'
 
 
 class CustomPageNumberPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     max_page_size = 999
+
+
+def estimate_count(queryset):
+    """
+    Примерное количество строк в queryset без COUNT(*):
+    на PostgreSQL - оценка планировщика (EXPLAIN), на остальных БД -
+    точный подсчет, сохраненный в кэше на CACHE_TIMEOUT секунд.
+    Возвращает None, если оценки нет: для выборок с условиями
+    (оценка планировщика для EXISTS и LIKE бывает сильно занижена)
+    и срезов (их размер ограничен срезом) или если подсчет еще
+    не кэширован.
+    """
+    if queryset.query.is_sliced or queryset.query.where:
+        return None
+    queryset = queryset.order_by()
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        # Выборка заведомо пустая (например, queryset.none())
+        return 0
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    return cache.get(_get_count_key(queryset, sql, params))
+
+
+def remember_count(queryset, count):
+    if (connections[queryset.db].vendor == 'postgresql'
+            or queryset.query.is_sliced or queryset.query.where):
+        return None
+    queryset = queryset.order_by()
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return None
+    cache.set(_get_count_key(queryset, sql, params), count,
+              settings.APPROXIMATE_COUNT['CACHE_TIMEOUT'])
+    return None
+
+
+def _get_count_key(queryset, sql, params):
+    version = get_data_version(
+        COUNT_DATA_VERSION.format(queryset.model._meta.label_lower))
+    return APPROXIMATE_COUNT_KEY.format(
+        hashlib.sha1(f'{version}:{sql}:{params}'.encode()).hexdigest())
+
+
+def bump_count_version(sender, created=True, **kwargs):
+    """
+    Обработчик post_save/post_delete: количество строк меняется
+    только при создании и удалении объектов
+    """
+    if created:
+        bump_data_version(
+            COUNT_DATA_VERSION.format(sender._meta.label_lower))
+
+
+class ApproximatePage(Page):
+    """
+    Страница при примерном count: наличие следующей страницы
+    известно по лишней выбранной строке, а не по count
+    """
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator, который считает строки точно только для небольших
+    выборок: если оценка (estimate_count) не меньше THRESHOLD,
+    count - это оценка, а approximate = True.
+    Номер страницы при этом с оценкой не сверяется: страница
+    выбирается как есть, пустой считается только страница без строк.
+    """
+    approximate = False
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if (estimate is not None
+                and estimate >= settings.APPROXIMATE_COUNT['THRESHOLD']):
+            self.approximate = True
+            return estimate
+        count = super().count
+        remember_count(self.object_list, count)
+        return count
+
+    def validate_number(self, number):
+        if not self.count or not self.approximate:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы должен быть числом')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.approximate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        # Лишняя строка показывает, есть ли следующая страница
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('На странице нет результатов')
+        return ApproximatePage(rows[:self.per_page], number, self,
+                               has_next=len(rows) > self.per_page)
+
+
+class ApproximateCountPagination(CustomPageNumberPagination):
+    """
+    Постраничная пагинация с примерным count для больших выборок.
+    Поле approximate в ответе показывает, что count - оценка.
+    """
+    django_paginator_class = ApproximateCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('approximate', self.page.paginator.approximate),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная пагинация по набору полей ordering (например,
+    ('-pub_date', '-id')): следующая страница выбирается условием
+    "строго после последней строки" по индексу, без OFFSET и COUNT(*),
+    поэтому время ответа не зависит от глубины страницы.
+    Курсор - значения полей ordering последней строки страницы.
+    Последнее поле ordering должно быть уникальным.
+    Срез queryset (например, после ?recipes_limit=) не пересортировать
+    и не отфильтровать, такие выборки не принимаются.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def __init__(self, ordering, page_size):
+        self.ordering = ordering
+        self.page_size = page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        if queryset.query.is_sliced:
+            raise ValueError('Срез queryset нельзя разбить курсором')
+        self.fields = [field.lstrip('-') for field in self.ordering]
+        queryset = queryset.order_by(*self.ordering)
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            queryset = queryset.filter(self._get_after_cursor_filter(
+                queryset.model, self._decode_cursor(encoded)))
+        # Лишняя строка показывает, есть ли следующая страница
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        cursor = json.dumps(
+            [str(getattr(last, field)) for field in self.fields])
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            base64.urlsafe_b64encode(cursor.encode()).decode())
+
+    def _decode_cursor(self, encoded):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def _get_after_cursor_filter(self, model, values):
+        """
+        (a, b) после (x, y) при сортировке по убыванию:
+        a <= x AND (a < x OR (a = x AND b < y)).
+        Условие a <= x избыточно, но задает границу просмотра индекса.
+        """
+        try:
+            values = [model._meta.get_field(field).to_python(value)
+                      for field, value in zip(self.fields, values)]
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+        condition = Q()
+        for position, field in enumerate(self.ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            after = Q(**{f'{self.fields[position]}__{lookup}':
+                         values[position]})
+            for equal_field, value in zip(self.fields[:position], values):
+                after &= Q(**{equal_field: value})
+            condition |= after
+        first_lookup = 'lte' if self.ordering[0].startswith('-') else 'gte'
+        return Q(**{f'{self.fields[0]}__{first_lookup}': values[0]}) & (
+            condition)
+
+
+class CursorOrPageNumberPagination(ApproximateCountPagination):
+    """
+    По дефолту - постраничная пагинация (page, limit)
+    с примерным count для больших выборок.
+    Если в запросе есть параметр cursor (для первой страницы - пустой),
+    используется курсорная пагинация KeysetPagination по полям
+    keyset_ordering представления.
+    Параметры ordered_query_params задают собственную сортировку
+    выдачи (search - по релевантности), курсор по keyset_ordering
+    ее бы потерял. С ними, как и для среза queryset (recipes_limit),
+    cursor игнорируется и используется постраничная пагинация.
+    """
+    cursor_query_param = KeysetPagination.cursor_query_param
+    ordered_query_params = ('search',)
+
+    def _use_keyset(self, queryset, request, view) -> bool:
+        params = request.query_params
+        return (getattr(view, 'keyset_ordering', None) is not None
+                and not queryset.query.is_sliced
+                and self.cursor_query_param in params
+                and not any(params.get(param)
+                            for param in self.ordered_query_params))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self._use_keyset(queryset, request, view):
+            self.keyset = None
+            return super().paginate_queryset(queryset, request, view)
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        self.keyset = KeysetPagination(view.keyset_ordering, page_size)
+        return self.keyset.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is None:
+            return super().get_paginated_response(data)
+        return self.keyset.get_paginated_response(data)
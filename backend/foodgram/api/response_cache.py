@@ -0,0 +1,127 @@
+# Кэш ответов /api/recipes/ (список и рецепт) для анонимных пользователей.
+# Ответы хранятся уже отрендеренными в кэше RECIPES_RESPONSE_CACHE
+# ['CACHE_ALIAS'] с ключом по версии данных рецептов и нормализованным
+# параметрам запроса. Любое изменение рецептов, их тегов и ингредиентов
+# меняет версию (обработчик сигналов подключается в ApiConfig.ready).
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+from recipes.data_versions import (RECIPES_DATA_VERSION,
+                                   bump_recipes_data_version,
+                                   get_data_version)
+
+RESPONSE_KEY = 'recipes_response:{}'
+# Поля автора, которые есть в ответах с рецептами
+USER_RESPONSE_FIELDS = ('username', 'first_name', 'last_name', 'email')
+STATS_KEY = 'recipes_response_stats:{}'
+
+
+def _get_cache():
+    return caches[settings.RECIPES_RESPONSE_CACHE['CACHE_ALIAS']]
+
+
+def is_cacheable(request) -> bool:
+    return (settings.RECIPES_RESPONSE_CACHE['ENABLED']
+            and request.method == 'GET'
+            and not request.user.is_authenticated
+            and request.accepted_renderer.format == 'json')
+
+
+def get_cache_key(request) -> str:
+    """
+    Ключ ответа: порядок параметров и значений, а также пустые
+    значения параметров на ответ не влияют
+    """
+    params = sorted(
+        (key, sorted(value for value in values if value))
+        for key, values in request.query_params.lists()
+        if any(values)
+    )
+    version = get_data_version(
+        RECIPES_DATA_VERSION,
+        using=settings.RECIPES_RESPONSE_CACHE['CACHE_ALIAS'],
+        timeout=settings.RECIPES_RESPONSE_CACHE['TIMEOUT'])
+    # Ссылки пагинации в ответе содержат хост
+    return hashlib.sha1(
+        f'{version}:{request.get_host()}:{request.accepted_media_type}:'
+        f'{request.path}:{params}'.encode()
+    ).hexdigest()
+
+
+def get_response(key: str):
+    content = _get_cache().get(RESPONSE_KEY.format(key))
+    _count('hits' if content is not None else 'misses')
+    return content
+
+
+def set_response(key: str, content: bytes) -> None:
+    _get_cache().set(RESPONSE_KEY.format(key), content,
+                     settings.RECIPES_RESPONSE_CACHE['TIMEOUT'])
+
+
+def _count(name: str) -> None:
+    if not settings.RECIPES_RESPONSE_CACHE['STATS']:
+        return
+    cache = _get_cache()
+    key = STATS_KEY.format(name)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Счетчик вытеснен из кэша между add и incr
+        pass
+
+
+def get_cache_stats() -> dict:
+    cache = _get_cache()
+    hits = cache.get(STATS_KEY.format('hits'), 0)
+    misses = cache.get(STATS_KEY.format('misses'), 0)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+    }
+
+
+def reset_cache_stats() -> None:
+    _get_cache().delete_many(
+        [STATS_KEY.format('hits'), STATS_KEY.format('misses')])
+
+
+def invalidate_recipes_cache(**kwargs) -> None:
+    """
+    Обработчик post_save/post_delete
+    """
+    bump_recipes_data_version()
+
+
+def _get_user_response_fields(user) -> dict:
+    # Значения из __dict__: отложенные поля не загружаются
+    return {field: user.__dict__.get(field) for field in USER_RESPONSE_FIELDS}
+
+
+def remember_user_fields(sender, instance, **kwargs) -> None:
+    """
+    Обработчик post_init пользователя: запоминает поля, которые
+    выводятся в ответах, чтобы при сохранении понять, изменились ли они
+    """
+    instance._response_fields = _get_user_response_fields(instance)
+
+
+def invalidate_on_user_change(sender, instance, created,
+                              update_fields=None, **kwargs) -> None:
+    """
+    Обработчик post_save пользователя. Кэш сбрасывается, только если
+    изменились поля из ответов: сохранение last_login при каждом входе
+    на ответы не влияет. Новый пользователь еще не автор рецептов.
+    """
+    if created or (update_fields is not None
+                   and not set(update_fields) & set(USER_RESPONSE_FIELDS)):
+        return
+    current = _get_user_response_fields(instance)
+    if current != getattr(instance, '_response_fields', None):
+        invalidate_recipes_cache()
+    instance._response_fields = current
@@ -1,11 +1,11 @@
 from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
+from django.db import transaction
 from rest_framework import serializers
-from rest_framework import validators
 
-from api.fields import ImageFromBase64Field
+from api.fields import ImageFromBase64Field, ThumbnailsField
 from api.mixins import FlattenMixinSerializer
-from recipes import models, recipes_services
+from api.response_cache import invalidate_recipes_cache
+from recipes import image_jobs, models, recipes_services
 from users.models import Subscription
 
 User = get_user_model()
@@ -25,6 +25,8 @@ class UserSerializer(serializers.ModelSerializer):
             'is_subscribed')
 
     def get_is_subscribed(self, user):
+        if hasattr(user, 'is_subscribed'):
+            return user.is_subscribed
         subscriber = self.context.get('request').user
         if not subscriber.is_authenticated:
             return False
@@ -67,13 +69,9 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
 
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=models.Ingredient.objects.all().values_list(
-            'pk', flat=True),
-        validators=[validators.UniqueValidator(
-            queryset=models.Ingredient.objects.all().values_list('id', flat=True)
-        )]
-    )
+    # Существование ингредиентов проверяется одним запросом
+    # в RecipeSerializer.validate
+    id = serializers.IntegerField()
     name = serializers.ReadOnlyField(source='ingredient.name')
     measurement_unit = serializers.ReadOnlyField(
         source='ingredient.measurement_unit')
@@ -85,18 +83,15 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         """Возвращаем id ингредиента при работе на чтение данных"""
         representation = super().to_representation(instance)
-        representation['id'] = get_object_or_404(
-            models.RecipeIngredient,
-            id=representation['id']
-        ).ingredient.id
+        representation['id'] = instance.ingredient_id
         return representation
 
 
 class TagSerializer(serializers.ModelSerializer):
 
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=models.Tag.objects.all().values_list('pk', flat=True),
-    )
+    # Существование тегов проверяется одним запросом
+    # в RecipeSerializer.validate
+    id = serializers.IntegerField()
 
     class Meta:
         model = models.Tag
@@ -116,19 +111,25 @@ class RecipeSerializer(serializers.ModelSerializer):
         many=True,
         source='ingredients_in_recipe')
     tags = TagSerializer(many=True,)
-    image = ImageFromBase64Field()
+    # Обязательно только при создании рецепта (см. validate):
+    # при редактировании изображение меняется, только если прислано новое
+    image = ImageFromBase64Field(required=False)
+    thumbnails = ThumbnailsField(source='image')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = models.Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'thumbnails',
+                  'text', 'cooking_time')
         read_only_fields = ('id', 'author', 'is_favorited',
                             'is_in_shopping_cart')
 
     def get_is_favorited(self, recipe):
+        # Признак уже посчитан в запросе RecipeViewSet.get_queryset
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         user = self.context.get('request').user
         if not user.is_authenticated:
             return False
@@ -138,6 +139,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         ).exists()
 
     def get_is_in_shopping_cart(self, recipe):
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         user = self.context.get('request').user
         if not user.is_authenticated:
             return False
@@ -146,27 +149,65 @@ class RecipeSerializer(serializers.ModelSerializer):
             recipe=recipe
         ).exists()
 
+    def validate(self, data):
+        errors = {}
+        if self.instance is None and 'image' not in data:
+            errors['image'] = 'Обязательное поле.'
+        tag_ids = [tag['id'] for tag in data.get('tags', ())]
+        ingredient_ids = [
+            ingredient['id']
+            for ingredient in data.get('ingredients_in_recipe', ())]
+        for field, model, ids in (
+                ('tags', models.Tag, tag_ids),
+                ('ingredients', models.Ingredient, ingredient_ids)):
+            if len(ids) != len(set(ids)):
+                errors[field] = 'Значения не должны повторяться.'
+                continue
+            missing_ids = recipes_services.get_missing_ids(model, ids)
+            if missing_ids:
+                errors[field] = (
+                    f'Объекты с id {", ".join(map(str, missing_ids))} '
+                    f'не существуют.')
+        if errors:
+            raise serializers.ValidationError(errors)
+        return data
+
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients_in_recipe')
-        recipe = models.Recipe.objects.create(**validated_data)
+        # Изображение обрабатывается в фоне, до этого у рецепта - заглушка
+        upload = validated_data.pop('image')
+        recipe = models.Recipe.objects.create(
+            image=image_jobs.get_placeholder(), **validated_data)
         recipes_services.create_tags_in_recipe(tags, recipe)
         recipes_services.create_ingredients_in_recipe(ingredients, recipe)
+        image_jobs.enqueue(recipe, upload)
+        # Теги и ингредиенты записаны bulk_create, без сигналов
+        invalidate_recipes_cache()
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients_in_recipe')
-        image = validated_data.pop('image')
-        models.RecipeTag.objects.filter(recipe=recipe).delete()
-        models.RecipeIngredient.objects.filter(recipe=recipe).delete()
-        models.Recipe.objects.filter(pk=recipe.pk).update(**validated_data)
-        recipes_services.create_tags_in_recipe(tags, recipe)
-        recipes_services.create_ingredients_in_recipe(ingredients, recipe)
-        new_recipe = get_object_or_404(models.Recipe, pk=recipe.pk)
-        new_recipe.image = image
-        new_recipe.save()
-        return new_recipe
+        """
+        Применяем только разницу между сохраненными и присланными
+        тегами/ингредиентами, сам рецепт сохраняется одним запросом.
+        """
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients_in_recipe', None)
+        if tags is not None:
+            recipes_services.update_tags_in_recipe(tags, recipe)
+        if ingredients is not None:
+            recipes_services.update_ingredients_in_recipe(
+                ingredients, recipe)
+        # До окончания обработки у рецепта остается прежнее изображение
+        upload = validated_data.pop('image', None)
+        recipe = super().update(recipe, validated_data)
+        if upload is not None:
+            image_jobs.enqueue(recipe, upload)
+        # Теги и ингредиенты меняются bulk_create/delete, без сигналов
+        invalidate_recipes_cache()
+        return recipe
 
 
 class FilterListSerializer(serializers.ListSerializer):
@@ -188,21 +229,18 @@ class FilterListSerializer(serializers.ListSerializer):
 class CompactRecipeSerializer(serializers.ModelSerializer):
 
     image = serializers.ReadOnlyField(source='image.url')
+    thumbnails = ThumbnailsField(source='image')
 
     class Meta:
         list_serializer_class = FilterListSerializer
         model = models.Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnails', 'cooking_time')
 
 
 class ExtendedUserSerializer(UserSerializer):
 
     recipes = CompactRecipeSerializer(read_only=True, many=True)
 
-    recipes_count = serializers.IntegerField(
-        read_only=True,
-        source='recipes.count')
-
     class Meta(UserSerializer.Meta):
         fields = UserSerializer.Meta.fields + ('recipes', 'recipes_count')
 
@@ -1,16 +1,30 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.db.models.functions import Lower
 from django_filters import rest_framework as django_filters
 from djoser.serializers import SetPasswordSerializer
 from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
 from recipes import models
-from recipes.recipes_services import get_pdf_report, get_txt_report
-from users.users_services import get_user_subscriptions
-from . import filters, serializers
-from .mixins import ReadOnlyAnyNoPaginationMixinViewSet
+from recipes.ingredients_index import ingredients_index
+from recipes.recipes_services import (SHOPPING_LIST_REPORTS,
+                                      add_recipe_to_shopping_list,
+                                      annotate_user_recipe_flags,
+                                      get_shopping_list_format,
+                                      lock_shopping_list,
+                                      prefetch_latest_recipes,
+                                      prefetch_recipe_related,
+                                      render_shopping_list)
+from users.users_services import (annotate_is_subscribed,
+                                  get_user_subscriptions)
+from . import filters, pagination, serializers
+from .mixins import (AnonymousResponseCacheMixin,
+                     ReadOnlyAnyNoPaginationMixinViewSet, VersionedCacheMixin)
+from .negotiation import IgnoreClientContentNegotiation
 from .permissions import IsAuthorOrReadOnlyPermission
 
 User = get_user_model()
@@ -22,6 +36,12 @@ class UserViewSet(mixins.ListModelMixin,
                   viewsets.GenericViewSet):
 
     queryset = User.objects.all()
+    # Курсорная пагинация подписок (?cursor=)
+    keyset_ordering = ('id',)
+
+    def get_queryset(self):
+        return annotate_is_subscribed(
+            user=self.request.user, queryset=super().get_queryset())
 
     def get_permissions(self):
         if (self.action not in (
@@ -70,36 +90,75 @@ class UserViewSet(mixins.ListModelMixin,
         serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-    @action(['get'], detail=False)
+    @action(['get'], detail=False,
+            pagination_class=pagination.CursorOrPageNumberPagination)
     def subscriptions(self, request):
-        subscriptions = get_user_subscriptions(request.user)
+        subscriptions = annotate_is_subscribed(
+            user=request.user,
+            queryset=get_user_subscriptions(request.user))
         page = self.paginate_queryset(subscriptions)
+        authors = page if page is not None else list(subscriptions)
+        # Рецепты загружаются одним запросом для всей страницы,
+        # причем только первые recipes_limit рецептов каждого автора
+        prefetch_latest_recipes(
+            authors, limit=self._get_recipes_limit(request))
+        serializer = self.get_serializer(authors, many=True)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
-        return Response(
-            self.get_serializer(subscriptions, many=True).data
-        )
+        return Response(serializer.data)
 
+    @staticmethod
+    def _get_recipes_limit(request):
+        try:
+            limit = int(request.query_params.get('recipes_limit'))
+        except (TypeError, ValueError):
+            return None
+        return limit if limit >= 0 else None
 
-class IngredientViewSet(ReadOnlyAnyNoPaginationMixinViewSet):
+
+class IngredientViewSet(VersionedCacheMixin,
+                        ReadOnlyAnyNoPaginationMixinViewSet):
     queryset = models.Ingredient.objects.all().order_by(Lower('name'))
     serializer_class = serializers.IngredientSerializer
     filter_backends = (django_filters.DjangoFilterBackend,)
     filter_class = filters.IngredientFilter
+    data_version = 'ingredient'
+
+    def list(self, request, *args, **kwargs):
+        """
+        Поиск ингредиентов по индексу в памяти процесса:
+        сначала совпадения по началу названия, затем по подстроке.
+        Если индекс отключен в настройках - поиск через БД.
+        """
+        if not settings.INGREDIENT_SEARCH_INDEX['ENABLED']:
+            return super().list(request, *args, **kwargs)
+        return self.versioned_response(
+            lambda: ingredients_index.search(
+                request.query_params.get('name')))
 
 
-class TagViewSet(ReadOnlyAnyNoPaginationMixinViewSet):
+class TagViewSet(VersionedCacheMixin, ReadOnlyAnyNoPaginationMixinViewSet):
     queryset = models.Tag.objects.all()
     serializer_class = serializers.TagSerializer
+    data_version = 'tag'
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousResponseCacheMixin, viewsets.ModelViewSet):
     queryset = models.Recipe.objects.all()
     filter_backends = (django_filters.DjangoFilterBackend,
                        filters.LimitRecipesFilterBackend
                        )
     filter_class = filters.RecipeFilter
+    pagination_class = pagination.CursorOrPageNumberPagination
+    # Курсорная пагинация ленты рецептов (?cursor=)
+    keyset_ordering = ('-pub_date', '-id')
+
+    def get_queryset(self):
+        queryset = annotate_user_recipe_flags(
+            user=self.request.user,
+            queryset=super().get_queryset())
+        return prefetch_recipe_related(
+            user=self.request.user, queryset=queryset)
 
     def get_serializer_class(self):
         if self.action == 'shopping_cart':
@@ -118,13 +177,22 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        self._reload_instance(serializer)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        self._reload_instance(serializer)
 
     @action(['post', 'delete'], detail=True)
+    @transaction.atomic
     def shopping_cart(self, request, pk=None):
         """
         Добавить/удалить рецепт из списка покупок
         """
-        return self._add_shopping_card_or_favorite(request)
+        return self._add_shopping_card_or_favorite(
+            request,
+            before=lock_shopping_list,
+            on_add=add_recipe_to_shopping_list)
 
     @action(['post', 'delete'], detail=True)
     def favorite(self, request, pk=None):
@@ -133,29 +201,45 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         return self._add_shopping_card_or_favorite(request)
 
-    @action(detail=False)
+    @action(detail=False,
+            content_negotiation_class=IgnoreClientContentNegotiation)
     def download_shopping_cart(self, request):
         """
         Загрузка списка покупок.
-        Доступно 2 режима: pdf и txt.
-        Для выбора режима надо указать соответствующее расширение
-        в имени файла.
-        По дефолту - txt
+        Формат задается параметром ?format= (txt, pdf, csv, json)
+        либо заголовком Accept. По дефолту - txt.
+        Генерируется только запрошенный формат.
         """
-        FILENAME = 'shopping_list.txt'
-        response = {
-            'txt': get_txt_report(request, FILENAME),
-            'pdf': get_pdf_report(request, FILENAME)
-        }
-        extension = FILENAME.split('.')[-1]
-        return response.get(extension, get_txt_report(request, FILENAME))
-
-    def _add_shopping_card_or_favorite(self, request):
+        extension = get_shopping_list_format(
+            request.query_params.get('format'),
+            request.headers.get('Accept', ''))
+        if extension is None:
+            raise ValidationError({
+                'format': f'Доступные форматы: '
+                          f'{", ".join(SHOPPING_LIST_REPORTS)}'})
+        return render_shopping_list(request, extension)
+
+    def _reload_instance(self, serializer):
+        """
+        Перечитываем сохраненный рецепт через get_queryset,
+        чтобы ответ сериализовался с предзагруженными связями
+        """
+        serializer.instance = self.get_queryset().get(
+            pk=serializer.instance.pk)
+
+    def _add_shopping_card_or_favorite(self, request, before=None,
+                                       on_add=None):
         """
         Общий метод для добавления (либо удаления)
-        в избранное либо список покупок
+        в избранное либо список покупок.
+        before и on_add вызываются с аргументами user и recipe:
+        before - до изменения, on_add - после успешного добавления.
+        Удаление из списка покупок обрабатывает сигнал pre_delete
+        (recipes_services.remove_deleted_cart_from_shopping_list)
         """
         recipe = self.get_object()
+        if before is not None:
+            before(user=request.user, recipe=recipe)
         serializer = self.get_serializer(
             data={
                 'recipe': recipe.pk,
@@ -167,4 +251,6 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return Response(status=status.HTTP_204_NO_CONTENT)
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        if on_add is not None:
+            on_add(user=request.user, recipe=recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -75,6 +75,14 @@ DATABASES = {
 }
 
 
+# Полнотекстовый и триграммный поиск (recipes.search) на PostgreSQL.
+# На других БД используется поиск через LIKE.
+POSTGRES_SEARCH = os.getenv('POSTGRES_SEARCH', 'True') == 'True'
+
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+
 AUTH_USER_MODEL = 'users.User'
 
 
@@ -112,6 +120,113 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'backend_static')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Поиск ингредиентов (/api/ingredients/?name=) по индексу в памяти процесса.
+# TTL - максимальное время (в секундах) жизни индекса, после которого
+# он перестраивается, чтобы подхватить изменения из других процессов.
+INGREDIENT_SEARCH_INDEX = {
+    'ENABLED': True,
+    'MAX_RESULTS': 50,
+    'TTL': 300,
+}
+
+# Кэш общий для всех процессов (gunicorn, image_worker): в нем хранятся
+# версии данных, по которым сбрасываются кэши ответов, и если у каждого
+# процесса свой кэш (LocMemCache), изменение в одном процессе не видно
+# остальным. По дефолту - Redis (сервис redis в infra/docker-compose.yml).
+# Запасной вариант без Redis - таблица в БД:
+# CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache,
+# CACHE_LOCATION=foodgram_cache (и команда createcachetable), но тогда
+# каждое обращение к кэшу - SQL-запрос.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'redis://redis:6379/0'),
+    }
+}
+if CACHES['default']['BACKEND'].endswith('.DatabaseCache'):
+    # По дефолту таблица очищается уже при 300 записях,
+    # а в ней хранятся готовые ответы API
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': 10000}
+
+# HTTP-кэширование справочных данных (/api/tags/, /api/ingredients/).
+# Версии данных и готовые ответы хранятся в общем кэше Django (CACHES).
+# VERSION_TTL - время жизни версии данных (в секундах), после которого
+# она сменяется, даже если изменение было сделано мимо общего кэша.
+# MAX_AGE - max-age в заголовке Cache-Control.
+REFERENCE_DATA_CACHE = {
+    'VERSION_TTL': 300,
+    'MAX_AGE': 60,
+}
+
+# Кэш ответов /api/recipes/ для анонимных пользователей (api.response_cache).
+# CACHE_ALIAS - бэкенд из CACHES, TIMEOUT - время жизни ответов в секундах.
+# STATS - счетчики попаданий и промахов (команда recipes_cache_stats):
+# это запись в кэш на каждый запрос, поэтому по дефолту выключены.
+RECIPES_RESPONSE_CACHE = {
+    'ENABLED': True,
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 300,
+    'STATS': os.getenv('RECIPES_CACHE_STATS', 'False') == 'True',
+}
+
+# Примерный count в постраничной пагинации (api.pagination):
+# выборки, в которых по оценке не меньше THRESHOLD строк, точно
+# не считаются. На PostgreSQL оценка берется у планировщика, на других БД -
+# из кэша точных подсчетов, которые хранятся CACHE_TIMEOUT секунд.
+APPROXIMATE_COUNT = {
+    'THRESHOLD': 10000,
+    'CACHE_TIMEOUT': 60,
+}
+
+# Изображения рецептов (recipes.images): MAX_UPLOAD_SIZE - размер
+# загружаемого файла в байтах, MAX_PIXELS - его разрешение. Изображение
+# перекодируется в FORMAT (WEBP или JPEG) с длинной стороной не больше
+# MAX_DIMENSION, THUMBNAILS - размеры миниатюр (ширина, высота).
+RECIPE_IMAGES = {
+    'MAX_UPLOAD_SIZE': 5 * 1024 * 1024,
+    'MAX_PIXELS': 40_000_000,
+    'MAX_DIMENSION': 1600,
+    'FORMAT': os.getenv('RECIPE_IMAGE_FORMAT', 'WEBP'),
+    'QUALITY': 85,
+    'THUMBNAILS': {
+        'small': (320, 240),
+        'medium': (640, 480),
+    },
+}
+# Изображение приходит в теле JSON в base64 (на треть больше файла)
+DATA_UPLOAD_MAX_MEMORY_SIZE = (
+    RECIPE_IMAGES['MAX_UPLOAD_SIZE'] * 4 // 3 + 1024 * 1024)
+
+# Фоновая обработка изображений (recipes.image_jobs, команда
+# process_image_jobs). ASYNC = False - обработка сразу в запросе.
+# Неудачная попытка повторяется через RETRY_DELAY * 2 ** (попытка - 1)
+# секунд, всего не больше MAX_ATTEMPTS попыток. Задача, которая
+# обрабатывается дольше STALE_TIMEOUT секунд, считается брошенной.
+IMAGE_JOBS = {
+    'ASYNC': os.getenv('IMAGE_JOBS_ASYNC', 'True') == 'True',
+    'MAX_ATTEMPTS': 3,
+    'RETRY_DELAY': 10,
+    'STALE_TIMEOUT': 300,
+    'POLL_INTERVAL': 1,
+}
+
+# Изображения рецептов хранятся по хэшу содержимого (recipes.media):
+# файл без ссылок из рецептов удаляется командой collect_media_garbage
+# не раньше чем через GC_GRACE_PERIOD секунд. Так же удаляются
+# загруженные файлы без задачи ImageJob (после отката транзакции).
+MEDIA_FILES = {
+    'GC_GRACE_PERIOD': 3600,
+}
+
+# Шрифты с кириллицей для списка покупок в PDF
+SHOPPING_LIST_PDF_FONTS = {
+    'regular': os.getenv(
+        'PDF_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'),
+    'bold': os.getenv(
+        'PDF_FONT_BOLD', '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'),
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
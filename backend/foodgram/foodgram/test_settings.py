@@ -0,0 +1,27 @@
+# Настройки для запуска тестов (pytest-django).
+# Если переменные окружения БД не заданы - используется SQLite.
+
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, INSTALLED_APPS, os
+
+SECRET_KEY = os.getenv('SECRET_KEY', 'foodgram-test-secret-key')
+
+if not os.getenv('DB_ENGINE'):
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+    INSTALLED_APPS.remove('django.contrib.postgres')
+
+# Один процесс: общий кэш не нужен, а кэш в памяти не требует таблицы
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram_test_media_')
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
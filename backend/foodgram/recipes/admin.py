@@ -1,8 +1,68 @@
 from django.contrib import admin
 from django.contrib.admin.decorators import register
-
-from .models import (Favorite, Ingredient, Recipe, RecipeIngredient, RecipeTag,
-                     ShoppingCart, Tag)
+from django.db import transaction
+
+from . import recipes_services
+from .data_versions import bump_recipes_data_version
+from .models import (Favorite, ImageJob, Ingredient, MeasurementUnit,
+                     MediaFile, Recipe, RecipeIngredient, RecipeTag,
+                     ShoppingCart, ShoppingListItem, Tag)
+
+
+class ShoppingListAdminMixin:
+    """
+    Списки покупок (ShoppingListItem) обновляются сервисами API.
+    Изменения строк в админке идут в обход них, поэтому списки
+    затронутых пользователей пересчитываются целиком.
+    shopping_list_user_lookup - путь от строки модели до id пользователя,
+    у которого она попадает в список покупок.
+    """
+    shopping_list_user_lookup = 'user_id'
+
+    def get_shopping_list_user_ids(self, queryset) -> set:
+        lookup = self.shopping_list_user_lookup
+        return set(queryset.filter(
+            **{f'{lookup}__isnull': False}
+        ).values_list(lookup, flat=True))
+
+    def _get_user_ids(self, obj) -> set:
+        return self.get_shopping_list_user_ids(
+            self.model.objects.filter(pk=obj.pk))
+
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        # Пользователи до и после изменения: строка могла сменить рецепт
+        user_ids = self._get_user_ids(obj) if change else set()
+        super().save_model(request, obj, form, change)
+        recipes_services.refresh_shopping_lists(
+            user_ids | self._get_user_ids(obj))
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        user_ids = self._get_user_ids(obj)
+        super().delete_model(request, obj)
+        recipes_services.refresh_shopping_lists(user_ids)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        user_ids = self.get_shopping_list_user_ids(queryset)
+        super().delete_queryset(request, queryset)
+        recipes_services.refresh_shopping_lists(user_ids)
+
+
+class RecipesCacheAdminMixin:
+    """
+    Удаление тегов и ингредиентов рецепта не отправляет сигналов
+    в кэш ответов API (см. ApiConfig.ready), поэтому кэш
+    сбрасывается здесь
+    """
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        bump_recipes_data_version()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        bump_recipes_data_version()
 
 
 @register(Tag)
@@ -18,6 +78,12 @@ class IngredientAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 
+@register(MeasurementUnit)
+class MeasurementUnitAdmin(admin.ModelAdmin):
+    list_display = ('name', 'canonical_unit', 'factor')
+    search_fields = ('name',)
+
+
 @register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('name', 'author', 'in_favorite_counts')
@@ -27,21 +93,23 @@ class RecipeAdmin(admin.ModelAdmin):
 
     @admin.display(description='Количество добавлений в избранное')
     def in_favorite_counts(self, recipe):
-        return recipe.favorite_recipes.count()
+        return recipe.favorites_count
 
 
 @register(RecipeTag)
-class RecipeTagAdmin(admin.ModelAdmin):
+class RecipeTagAdmin(RecipesCacheAdminMixin, admin.ModelAdmin):
     list_display = ('recipe', 'tag')
     list_filter = ('tag',)
     search_fields = ('recipe',)
 
 
 @register(RecipeIngredient)
-class RecipeIngredientAdmin(admin.ModelAdmin):
+class RecipeIngredientAdmin(ShoppingListAdminMixin, RecipesCacheAdminMixin,
+                            admin.ModelAdmin):
     list_display = ('recipe', 'ingredient', 'amount')
     list_filter = ('recipe',)
     search_fields = ('ingredient',)
+    shopping_list_user_lookup = 'recipe__shopping_recipes__user_id'
 
 
 @register(Favorite)
@@ -52,5 +120,27 @@ class FavoriteAdmin(admin.ModelAdmin):
 
 
 @register(ShoppingCart)
-class ShoppingCartAdmin(FavoriteAdmin):
+class ShoppingCartAdmin(ShoppingListAdminMixin, FavoriteAdmin):
     pass
+
+
+@register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ingredient', 'amount', 'recipes_count')
+    list_filter = ('user',)
+    readonly_fields = ('user', 'ingredient', 'amount', 'recipes_count')
+
+
+@register(ImageJob)
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = ('recipe', 'status', 'attempts', 'created_at',
+                    'processing_time')
+    list_filter = ('status',)
+    readonly_fields = ('last_error',)
+
+
+@register(MediaFile)
+class MediaFileAdmin(admin.ModelAdmin):
+    list_display = ('name', 'references', 'updated_at')
+    search_fields = ('name',)
+    readonly_fields = ('name', 'references', 'updated_at')
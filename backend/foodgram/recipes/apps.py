@@ -4,3 +4,42 @@ from django.apps import AppConfig
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        from django.db.models.signals import (post_delete, post_init,
+                                              post_migrate, post_save,
+                                              pre_delete)
+
+        from recipes import counters, media
+        from recipes.data_versions import bump_model_data_version
+        from recipes.ingredients_index import ingredients_index
+        from recipes.models import Ingredient, Recipe, ShoppingCart, Tag
+        from recipes.recipes_services import (
+            register_pdf_fonts, remove_deleted_cart_from_shopping_list)
+        from recipes.search import create_postgres_search_objects
+
+        register_pdf_fonts()
+        post_migrate.connect(create_postgres_search_objects, sender=self)
+        for signal in (post_save, post_delete):
+            signal.connect(ingredients_index.invalidate, sender=Ingredient,
+                           dispatch_uid=f'ingredients_index_{signal}')
+            for model in (Tag, Ingredient):
+                signal.connect(
+                    bump_model_data_version, sender=model,
+                    dispatch_uid=f'data_version_{model.__name__}_{signal}')
+        for sender in {source for source, *_ in counters.COUNTERS}:
+            post_init.connect(counters.remember_counted_keys, sender=sender,
+                              dispatch_uid=f'counters_{sender.__name__}')
+            post_save.connect(counters.count_saved, sender=sender,
+                              dispatch_uid=f'counters_{sender.__name__}')
+            post_delete.connect(counters.count_deleted, sender=sender,
+                                dispatch_uid=f'counters_{sender.__name__}')
+        post_init.connect(media.remember_image, sender=Recipe,
+                          dispatch_uid='media_Recipe')
+        post_save.connect(media.count_image_saved, sender=Recipe,
+                          dispatch_uid='media_Recipe')
+        post_delete.connect(media.count_image_deleted, sender=Recipe,
+                            dispatch_uid='media_Recipe')
+        pre_delete.connect(remove_deleted_cart_from_shopping_list,
+                           sender=ShoppingCart,
+                           dispatch_uid='shopping_list_ShoppingCart')
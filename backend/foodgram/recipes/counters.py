@@ -0,0 +1,89 @@
+# Денормализованные счетчики: добавления рецепта в избранное и в списки
+# покупок, рецепты автора и подписчики пользователя.
+# Счетчики меняются атомарным UPDATE с F() в обработчиках сигналов
+# (подключаются в RecipesConfig.ready). Изменения в обход сигналов
+# (bulk_create, update) исправляет команда reconcile_counters.
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from recipes import models
+from users.models import Subscription
+
+User = get_user_model()
+
+# (модель строк, поле со ссылкой на объект, модель объекта, поле счетчика)
+COUNTERS = (
+    (models.Favorite, 'recipe_id', models.Recipe, 'favorites_count'),
+    (models.ShoppingCart, 'recipe_id', models.Recipe, 'shopping_cart_count'),
+    (models.Recipe, 'author_id', User, 'recipes_count'),
+    (Subscription, 'subscribed_id', User, 'subscribers_count'),
+)
+
+
+def get_counters(sender) -> tuple:
+    return tuple(counter for counter in COUNTERS if counter[0] is sender)
+
+
+def _change_counter(model, field: str, pk, delta: int) -> None:
+    if pk is None:
+        return None
+    # Greatest не дает уйти в минус, если счетчик уже разошелся с данными
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)})
+    return None
+
+
+def remember_counted_keys(sender, instance, **kwargs) -> None:
+    """
+    Обработчик post_init: запоминает, к каким объектам относится строка,
+    чтобы при смене ссылки перенести ее в счетчик другого объекта.
+    Значения берутся из __dict__, чтобы не загружать отложенные поля.
+    """
+    instance._counted_keys = {
+        attname: instance.__dict__.get(attname)
+        for _, attname, _, _ in get_counters(sender)
+    }
+
+
+def count_saved(sender, instance, created, **kwargs) -> None:
+    """
+    Обработчик post_save
+    """
+    previous = getattr(instance, '_counted_keys', {})
+    for _, attname, model, field in get_counters(sender):
+        current = getattr(instance, attname)
+        if created:
+            _change_counter(model, field, current, 1)
+        elif previous.get(attname) != current:
+            _change_counter(model, field, previous.get(attname), -1)
+            _change_counter(model, field, current, 1)
+    remember_counted_keys(sender, instance)
+
+
+def count_deleted(sender, instance, **kwargs) -> None:
+    """
+    Обработчик post_delete
+    """
+    for _, attname, model, field in get_counters(sender):
+        _change_counter(model, field, getattr(instance, attname), -1)
+
+
+def reconcile_counters() -> dict:
+    """
+    Пересчитывает счетчики по данным: одним UPDATE на каждый счетчик,
+    который меняет только разошедшиеся значения.
+    Возвращает количество исправленных объектов по счетчикам.
+    """
+    repaired = {}
+    for source, attname, model, field in COUNTERS:
+        actual = Coalesce(Subquery(
+            source.objects.filter(**{attname: OuterRef('pk')})
+            .order_by().values(attname)
+            .annotate(count=Count('pk')).values('count')
+        ), 0)
+        repaired[f'{model._meta.model_name}.{field}'] = (
+            model.objects.exclude(**{field: actual})
+            .update(**{field: actual}))
+    return repaired
@@ -0,0 +1,61 @@
+# Версии данных для кэширования ответов API (теги, ингредиенты, рецепты).
+# Версия хранится в кэше Django и меняется при сохранении или удалении
+# объектов (обработчики сигналов подключаются в AppConfig.ready).
+
+import uuid
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.db import transaction
+
+DATA_VERSION_KEY = 'data_version:{}'
+# Версия рецептов в кэше ответов API (api.response_cache)
+RECIPES_DATA_VERSION = 'recipes'
+
+
+def get_data_version(name: str, using: str = DEFAULT_CACHE_ALIAS,
+                     timeout: int = None) -> str:
+    """
+    Текущая версия данных name в кэше using. Если версии еще нет
+    (или она истекла через timeout секунд) - создается новая.
+    По дефолту timeout - REFERENCE_DATA_CACHE['VERSION_TTL'].
+    """
+    if timeout is None:
+        timeout = settings.REFERENCE_DATA_CACHE['VERSION_TTL']
+    key = DATA_VERSION_KEY.format(name)
+    version = uuid.uuid4().hex
+    # add не перезапишет версию, созданную параллельно другим процессом
+    caches[using].add(key, version, timeout)
+    return caches[using].get(key, version)
+
+
+def bump_data_version(name: str, using: str = DEFAULT_CACHE_ALIAS,
+                      timeout: int = None) -> None:
+    if timeout is None:
+        timeout = settings.REFERENCE_DATA_CACHE['VERSION_TTL']
+    caches[using].set(DATA_VERSION_KEY.format(name), uuid.uuid4().hex,
+                      timeout)
+
+
+def bump_model_data_version(sender, **kwargs) -> None:
+    """
+    Обработчик post_save/post_delete: версия данных модели
+    называется по имени модели (tag, ingredient)
+    """
+    bump_data_version(sender._meta.model_name)
+
+
+def bump_recipes_data_version() -> None:
+    """
+    Сбрасывает кэш ответов API с рецептами (api.response_cache).
+    Версия меняется сразу и еще раз после коммита транзакции: иначе
+    ответ, собранный параллельным запросом до коммита, закэшировался
+    бы с уже новой версией.
+    """
+    def bump():
+        bump_data_version(
+            RECIPES_DATA_VERSION,
+            using=settings.RECIPES_RESPONSE_CACHE['CACHE_ALIAS'],
+            timeout=settings.RECIPES_RESPONSE_CACHE['TIMEOUT'])
+    bump()
+    transaction.on_commit(bump)
@@ -0,0 +1,236 @@
+# Генерация больших объемов тестовых данных для нагрузочного тестирования:
+# пользователи, подписки, теги, рецепты с ингредиентами и тегами,
+# избранное и списки покупок. Популярность авторов, рецептов, тегов
+# и ингредиентов неравномерна (закон Ципфа: вес объекта ранга r -
+# 1 / r ** skew), количество подписок, избранного и покупок
+# у пользователей тоже различается.
+# Объекты создаются потоково, пачками по batch_size: bulk_create либо
+# COPY на PostgreSQL. При одном seed и одном исходном состоянии БД
+# генерируются одни и те же данные, включая даты публикации:
+# они отсчитываются от FAKE_DATA_EPOCH, а не от текущей даты.
+
+import csv
+import datetime
+import io
+import random
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Max
+
+from recipes import counters, importers, models, recipes_services
+from recipes.data_versions import (bump_data_version,
+                                   bump_recipes_data_version)
+from recipes.management.commands.load_csv_data import CSV_DATA_PATH
+from users.models import Subscription
+
+User = get_user_model()
+
+DEFAULT_PASSWORD = 'foodgram-load'
+RECIPE_IMAGE = 'images/fake.png'
+# Рецепты публикуются за days дней до этого момента
+FAKE_DATA_EPOCH = datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class ZipfChoice:
+    """
+    Случайный выбор из population с весом 1 / rank ** skew,
+    где rank - позиция объекта в population (с 1)
+    """
+    def __init__(self, rnd: random.Random, population: list, skew: float):
+        self.rnd = rnd
+        self.population = population
+        self.cum_weights = list(accumulate(
+            1 / rank ** skew for rank in range(1, len(population) + 1)))
+
+    def __call__(self, k: int = 1) -> list:
+        return self.rnd.choices(
+            self.population, cum_weights=self.cum_weights, k=k)
+
+    def distinct(self, k: int) -> set:
+        # Повторы отбрасываются: популярных объектов выпадает
+        # чуть меньше k, зато выбор не зависит от размера population
+        return set(self(k))
+
+
+def _draw_count(rnd: random.Random, mean: float, maximum: int) -> int:
+    """
+    Количество объектов у пользователя: экспоненциальное распределение
+    со средним mean - у большинства мало, у немногих много
+    """
+    if mean <= 0:
+        return 0
+    return min(round(rnd.expovariate(1 / mean)), maximum)
+
+
+def _copy_rows(model, objs: list) -> None:
+    """
+    Загрузка объектов через COPY ... FROM STDIN (PostgreSQL)
+    """
+    fields = [field for field in model._meta.concrete_fields
+              if not field.primary_key]
+    buffer = io.StringIO()
+    # Строки - в кавычках, None - пустое значение без кавычек (NULL)
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    for obj in objs:
+        writer.writerow([
+            field.get_db_prep_save(
+                field.pre_save(obj, add=True), connection)
+            for field in fields])
+    buffer.seek(0)
+    columns = ', '.join(
+        connection.ops.quote_name(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {connection.ops.quote_name(model._meta.db_table)} '
+            f'({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+def _save(model, objs, batch_size: int, use_copy: bool) -> int:
+    """
+    Возвращает количество добавленных строк. Строки генерируются
+    без повторов, поэтому конфликт с существующими - ошибка,
+    как и при COPY.
+    """
+    saved = 0
+    objs = iter(objs)
+    while True:
+        batch = list(islice(objs, batch_size))
+        if not batch:
+            return saved
+        with transaction.atomic():
+            if use_copy:
+                _copy_rows(model, batch)
+            else:
+                model.objects.bulk_create(batch)
+        saved += len(batch)
+
+
+def _new_ids(model, last_id) -> list:
+    return list(model.objects.filter(id__gt=last_id or 0).order_by(
+        'id').values_list('id', flat=True))
+
+
+def generate(users=1000, tags=20, recipes=10000, subscriptions=10,
+             favorites=20, shopping_cart=3, max_ingredients=15, max_tags=3,
+             days=365, skew=1.1, seed=2022, batch_size=10000,
+             use_copy=False, log=None, epoch=FAKE_DATA_EPOCH) -> dict:
+    """
+    Добавляет в БД сгенерированные данные. subscriptions, favorites
+    и shopping_cart - среднее количество на пользователя, даты
+    публикации рецептов - в пределах days дней до epoch.
+    Если в БД нет ингредиентов, они загружаются из data/ingredients.csv.
+    Возвращает количество созданных объектов по моделям.
+    Обработчики сигналов при пакетной вставке не вызываются,
+    поэтому после нее счетчики, списки покупок и версии данных
+    пересчитываются целиком.
+    """
+    if use_copy and connection.vendor != 'postgresql':
+        raise ValueError('COPY доступен только на PostgreSQL')
+    log = log or (lambda message: None)
+    rnd = random.Random(seed)
+    created = {}
+
+    def save(model, objs):
+        created[model._meta.label] = _save(
+            model, objs, batch_size, use_copy)
+        log(f'{model._meta.verbose_name_plural}: '
+            f'{created[model._meta.label]}')
+
+    if not models.Ingredient.objects.exists():
+        importers.import_file(importers.IMPORT_SPECS['ingredients'],
+                              f'{CSV_DATA_PATH}ingredients.csv')
+    # Порядок фиксирован, чтобы выбор зависел только от seed
+    ingredient_ids = list(models.Ingredient.objects.order_by(
+        'id').values_list('id', flat=True))
+    rnd.shuffle(ingredient_ids)
+    ingredient_choice = ZipfChoice(rnd, ingredient_ids, skew)
+
+    last_tag_id = models.Tag.objects.aggregate(last=Max('id'))['last']
+    save(models.Tag, (
+        models.Tag(name=f'Тег {num}', color=f'#{rnd.getrandbits(24):06X}',
+                   slug=f'tag-{num}')
+        for num in range((last_tag_id or 0) + 1,
+                         (last_tag_id or 0) + tags + 1)))
+    tag_choice = ZipfChoice(rnd, _new_ids(models.Tag, last_tag_id), skew)
+
+    # Хэш пароля вычисляется один раз: make_password намеренно медленный
+    password = make_password(DEFAULT_PASSWORD)
+    last_user_id = User.objects.aggregate(last=Max('id'))['last']
+    start = (last_user_id or 0) + 1
+    save(User, (
+        User(username=f'user{num}', email=f'user{num}@foodgram.test',
+             first_name=f'Имя{num}', last_name=f'Фамилия{num}',
+             password=password)
+        for num in range(start, start + users)))
+    user_ids = _new_ids(User, last_user_id)
+    if recipes and not (user_ids and tag_choice.population):
+        raise ValueError('Для рецептов нужны пользователи и теги')
+    rnd.shuffle(user_ids)
+    author_choice = ZipfChoice(rnd, user_ids, skew)
+
+    save(Subscription, (
+        Subscription(subscriber_id=subscriber_id, subscribed_id=subscribed_id)
+        for subscriber_id in user_ids
+        for subscribed_id in sorted(author_choice.distinct(
+            _draw_count(rnd, subscriptions, len(user_ids))))
+        if subscribed_id != subscriber_id))
+
+    last_recipe_id = models.Recipe.objects.aggregate(
+        last=Max('id'))['last']
+    seconds = int(datetime.timedelta(days=days).total_seconds())
+    pub_dates = []
+
+    def recipe(num, author_id):
+        pub_dates.append(epoch - datetime.timedelta(
+            seconds=rnd.randrange(seconds or 1)))
+        return models.Recipe(
+            name=f'Рецепт {num}', image=RECIPE_IMAGE,
+            text=f'Описание рецепта {num}',
+            cooking_time=rnd.randint(1, 180), author_id=author_id)
+
+    save(models.Recipe, (
+        recipe(num, author_id)
+        for num, author_id in enumerate(author_choice(recipes), 1)))
+    recipe_ids = _new_ids(models.Recipe, last_recipe_id)
+    # auto_now_add при вставке ставит текущее время,
+    # даты публикации записываются отдельно
+    dated = zip(recipe_ids, pub_dates)
+    while True:
+        batch = [models.Recipe(id=recipe_id, pub_date=pub_date)
+                 for recipe_id, pub_date in islice(dated, batch_size)]
+        if not batch:
+            break
+        models.Recipe.objects.bulk_update(batch, ('pub_date',))
+
+    save(models.RecipeTag, (
+        models.RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+        for recipe_id in recipe_ids
+        for tag_id in sorted(tag_choice.distinct(rnd.randint(1, max_tags)))))
+    save(models.RecipeIngredient, (
+        models.RecipeIngredient(
+            recipe_id=recipe_id, ingredient_id=ingredient_id,
+            amount=rnd.randint(1, 500))
+        for recipe_id in recipe_ids
+        for ingredient_id in sorted(ingredient_choice.distinct(
+            rnd.randint(1, max_ingredients)))))
+
+    # Популярность рецепта не зависит от его id
+    rnd.shuffle(recipe_ids)
+    recipe_choice = ZipfChoice(rnd, recipe_ids, skew)
+    for model, mean in ((models.Favorite, favorites),
+                        (models.ShoppingCart, shopping_cart)):
+        save(model, (
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in sorted(recipe_choice.distinct(
+                _draw_count(rnd, mean, len(recipe_ids))))))
+
+    counters.reconcile_counters()
+    recipes_services.rebuild_shopping_lists()
+    for name in ('tag', 'ingredient'):
+        bump_data_version(name)
+    bump_recipes_data_version()
+    return created
@@ -0,0 +1,243 @@
+# Фоновая обработка изображений рецептов. Очередь - таблица ImageJob,
+# обработчик - команда process_image_jobs. Рецепт сохраняется сразу:
+# новый - с изображением-заглушкой, отредактированный - с прежним
+# изображением. Обработчик перекодирует загруженный файл, создает
+# миниатюры и подменяет ими изображение рецепта. Неудачные попытки
+# повторяются с экспоненциальной задержкой, для каждой задачи
+# сохраняется время ожидания в очереди и время обработки.
+# При IMAGE_JOBS['ASYNC'] = False задача выполняется сразу, в запросе.
+
+import datetime
+import io
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Q
+from django.utils import timezone
+from PIL import Image
+
+from recipes import images, media
+from recipes.models import ImageJob
+
+PLACEHOLDER_NAME = 'images/placeholder.{}'
+PLACEHOLDER_COLOR = '#EEEEEE'
+
+
+def get_placeholder() -> str:
+    """
+    Имя изображения-заглушки (и его миниатюр) в хранилище,
+    файлы создаются при первом обращении
+    """
+    name = PLACEHOLDER_NAME.format(images.get_extension())
+    if default_storage.exists(name):
+        return name
+    buffer = io.BytesIO()
+    Image.new('RGB', max(settings.RECIPE_IMAGES['THUMBNAILS'].values()),
+              PLACEHOLDER_COLOR).save(buffer, format='PNG')
+    content, thumbnails = images.process_image(buffer.getvalue())
+    # Имя должно быть точно таким, без суффикса от хранилища
+    default_storage.delete(name)
+    default_storage.save(name, ContentFile(content))
+    images.save_thumbnails(name, thumbnails)
+    return name
+
+
+def enqueue(recipe, upload: ContentFile) -> ImageJob:
+    """
+    Ставит загруженный файл в очередь на обработку. Еще не начатые
+    задачи того же рецепта отменяются: их изображения уже не нужны.
+    Файл записывается сразу, а задача - в транзакции вызывающего кода.
+    Если она откатится, файл без задачи удалит collect_orphan_uploads.
+    """
+    for job in ImageJob.objects.filter(
+            recipe=recipe, status=ImageJob.PENDING):
+        job.delete()
+        # Файл отмененной задачи нужен, пока удаление не зафиксировано
+        transaction.on_commit(partial(job.upload.delete, save=False))
+    job = ImageJob(recipe=recipe, available_at=timezone.now())
+    job.upload.save(upload.name, upload, save=False)
+    try:
+        job.save()
+    except Exception:
+        job.upload.delete(save=False)
+        raise
+    if not settings.IMAGE_JOBS['ASYNC']:
+        job = _claim(job)
+        if job is not None:
+            run_job(job)
+    return job
+
+
+def _claim(job):
+    """
+    Помечает задачу как выполняемую. Условие на статус и количество
+    попыток не дает двум обработчикам взять одну задачу.
+    """
+    now = timezone.now()
+    claimed = ImageJob.objects.filter(
+        pk=job.pk, status=job.status, attempts=job.attempts
+    ).update(status=ImageJob.PROCESSING, started_at=now,
+             attempts=F('attempts') + 1)
+    if not claimed:
+        return None
+    job.status = ImageJob.PROCESSING
+    job.started_at = now
+    job.attempts += 1
+    return job
+
+
+def claim_next_job():
+    """
+    Следующая готовая к обработке задача: в очереди и с истекшей
+    задержкой либо "зависшая" в обработке дольше STALE_TIMEOUT
+    (например, если обработчик был остановлен)
+    """
+    now = timezone.now()
+    stale = now - datetime.timedelta(
+        seconds=settings.IMAGE_JOBS['STALE_TIMEOUT'])
+    with transaction.atomic():
+        # На PostgreSQL параллельные обработчики пропускают чужие задачи
+        candidates = ImageJob.objects.select_for_update(
+            skip_locked=True
+        ).filter(
+            Q(status=ImageJob.PENDING, available_at__lte=now)
+            | Q(status=ImageJob.PROCESSING, started_at__lt=stale)
+        ).order_by('available_at', 'id')
+        for job in candidates[:10]:
+            job = _claim(job)
+            if job is not None:
+                return job
+    return None
+
+
+def _finish(job, **fields) -> None:
+    # update, а не save: рецепт (и задача) могли быть удалены
+    ImageJob.objects.filter(pk=job.pk).update(
+        finished_at=timezone.now(), **fields)
+
+
+def _apply(job, content: bytes, thumbnails: dict) -> None:
+    recipe = job.recipe
+    if ImageJob.objects.filter(recipe=recipe, id__gt=job.id).exists():
+        # Пока файл обрабатывался, загружено новое изображение
+        return
+    # Имя - по содержимому: такое же изображение повторно не записывается
+    storage = recipe.image.storage
+    name = storage.save(
+        f'{recipe.image.field.upload_to}image.{images.get_extension()}',
+        ContentFile(content))
+    if name == recipe.image.name:
+        return
+    media.register(name)
+    images.save_thumbnails(name, thumbnails, overwrite=False)
+    recipe.image = name
+    # save, а не update: сигналы сбрасывают кэш ответов с рецептом
+    # и учитывают ссылку на файл
+    recipe.save(update_fields=('image',))
+    if not storage.exists(name):
+        # Файл удалили как ненужный до появления ссылки из рецепта
+        storage.save(name, ContentFile(content))
+        images.save_thumbnails(name, thumbnails)
+
+
+def run_job(job) -> bool:
+    """
+    Выполняет взятую задачу. Возвращает True, если изображение
+    обработано. Некорректное изображение не обрабатывается повторно,
+    при остальных ошибках задача возвращается в очередь, пока не
+    исчерпаны MAX_ATTEMPTS попыток.
+    """
+    started = time.monotonic()
+    try:
+        with job.upload.open('rb') as file:
+            content, thumbnails = images.process_image(file.read())
+        _apply(job, content, thumbnails)
+    except Exception as error:
+        retry = (not isinstance(error, images.ImageError)
+                 and job.attempts < settings.IMAGE_JOBS['MAX_ATTEMPTS'])
+        delay = settings.IMAGE_JOBS['RETRY_DELAY'] * 2 ** (job.attempts - 1)
+        fields = {}
+        if not retry:
+            # Файл больше не понадобится, ошибка сохраняется в last_error
+            job.upload.delete(save=False)
+            fields['upload'] = ''
+        _finish(
+            job, status=ImageJob.PENDING if retry else ImageJob.FAILED,
+            last_error=f'{type(error).__name__}: {error}',
+            available_at=timezone.now() + datetime.timedelta(seconds=delay),
+            processing_time=time.monotonic() - started, **fields)
+        return False
+    job.upload.delete(save=False)
+    _finish(job, status=ImageJob.DONE, upload='',
+            processing_time=time.monotonic() - started)
+    return True
+
+
+def collect_orphan_uploads(dry_run: bool = False) -> list:
+    """
+    Удаляет загруженные файлы, для которых нет задачи (транзакция
+    с задачей откатилась после записи файла). Файлы моложе
+    MEDIA_FILES['GC_GRACE_PERIOD'] секунд не трогаются: их задача
+    могла быть еще не зафиксирована. Возвращает имена файлов.
+    """
+    field = ImageJob._meta.get_field('upload')
+    threshold = timezone.now() - datetime.timedelta(
+        seconds=settings.MEDIA_FILES['GC_GRACE_PERIOD'])
+    try:
+        _, files = field.storage.listdir(field.upload_to)
+    except FileNotFoundError:
+        return []
+    names = [f'{field.upload_to}{file}' for file in files]
+    referenced = set(ImageJob.objects.filter(
+        upload__in=names).values_list('upload', flat=True))
+    orphans = [
+        name for name in names if name not in referenced
+        and field.storage.get_modified_time(name) < threshold]
+    if not dry_run:
+        for name in orphans:
+            field.storage.delete(name)
+    return orphans
+
+
+def process_available(max_jobs: int = None) -> tuple:
+    """
+    Обрабатывает готовые задачи, пока они есть (не больше max_jobs).
+    Возвращает (обработано, ошибок).
+    """
+    done = failed = 0
+    while max_jobs is None or done + failed < max_jobs:
+        job = claim_next_job()
+        if job is None:
+            break
+        if run_job(job):
+            done += 1
+        else:
+            failed += 1
+    return done, failed
+
+
+def get_job_stats() -> dict:
+    """
+    Метрики очереди: количество задач по статусам, среднее
+    и максимальное время обработки и ожидания в очереди (в секундах)
+    для обработанных задач, количество повторных попыток
+    """
+    stats = {status: 0 for status, _ in ImageJob.STATUSES}
+    stats.update(ImageJob.objects.values_list('status').annotate(
+        count=Count('id')).order_by())
+    done = ImageJob.objects.filter(status=ImageJob.DONE).aggregate(
+        avg_processing_time=Avg('processing_time'),
+        max_processing_time=Max('processing_time'),
+        # Ожидание - до начала последней попытки
+        avg_wait_time=Avg(F('started_at') - F('created_at')),
+        max_wait_time=Max(F('started_at') - F('created_at')),
+        retries=Count('id', filter=Q(attempts__gt=1)))
+    for name in ('avg_wait_time', 'max_wait_time'):
+        if done[name] is not None:
+            done[name] = done[name].total_seconds()
+    stats.update(done)
+    return stats
@@ -0,0 +1,142 @@
+# Обработка загружаемых изображений рецептов: проверка размера,
+# перекодирование в WEBP (или JPEG) с ограничением сторон
+# и миниатюры фиксированного размера для карточек рецептов.
+# Миниатюры хранятся рядом с изображением, их имена получаются
+# из имени изображения (thumbnail_name), поэтому в БД они не записываются.
+
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+# Форматы, которые принимаются от клиентов
+ALLOWED_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF')
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+
+class ImageError(ValueError):
+    pass
+
+
+def get_output_format() -> str:
+    image_format = settings.RECIPE_IMAGES['FORMAT'].upper()
+    if image_format == 'WEBP' and not features.check('webp'):
+        # Pillow собран без поддержки WebP
+        return 'JPEG'
+    return image_format
+
+
+def get_extension() -> str:
+    return EXTENSIONS[get_output_format()]
+
+
+def thumbnail_name(name: str, variant: str) -> str:
+    """
+    Имя миниатюры variant изображения name:
+    images/2022/05/01/abc.webp -> images/2022/05/01/abc_small.webp
+    """
+    root, _ = os.path.splitext(name)
+    return f'{root}_{variant}.{get_extension()}'
+
+
+def check_image(content: bytes) -> Image.Image:
+    """
+    Быстрая проверка по заголовку, без распаковки пикселей:
+    формат и разрешение. Возвращает открытое (лениво) изображение.
+    """
+    try:
+        image = Image.open(io.BytesIO(content))
+    except (OSError, Image.DecompressionBombError):
+        raise ImageError('Загрузите корректное изображение')
+    if image.format not in ALLOWED_FORMATS:
+        raise ImageError(
+            f'Допустимые форматы: {", ".join(ALLOWED_FORMATS)}')
+    if image.width * image.height > settings.RECIPE_IMAGES['MAX_PIXELS']:
+        raise ImageError('Слишком большое разрешение изображения')
+    return image
+
+
+def _open(content: bytes) -> Image.Image:
+    image = check_image(content)
+    try:
+        # Поворот по EXIF, после него метаданные не нужны
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # Прозрачный фон - белый, а не черный
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            return background
+        return image.convert('RGB')
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        raise ImageError('Загрузите корректное изображение')
+
+
+def _encode(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=get_output_format(),
+               quality=settings.RECIPE_IMAGES['QUALITY'])
+    return buffer.getvalue()
+
+
+def process_image(content: bytes) -> tuple:
+    """
+    Перекодирует загруженное изображение и готовит миниатюры.
+    Возвращает (изображение, {вариант: миниатюра}) в байтах.
+    Поднимает ImageError, если content - не допустимое изображение.
+    """
+    image = _open(content)
+    max_dimension = settings.RECIPE_IMAGES['MAX_DIMENSION']
+    image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+    thumbnails = {
+        # Обрезка по центру до точного размера карточки
+        variant: _encode(ImageOps.fit(image, size, Image.Resampling.LANCZOS))
+        for variant, size in settings.RECIPE_IMAGES['THUMBNAILS'].items()
+    }
+    return _encode(image), thumbnails
+
+
+def save_thumbnails(name: str, thumbnails: dict,
+                    overwrite: bool = True) -> None:
+    """
+    Сохраняет миниатюры ({вариант: байты}) изображения name под
+    именами thumbnail_name. Миниатюры хранятся в default_storage
+    с точными именами, даже если изображение - в хранилище по
+    содержимому. overwrite=False - существующие миниатюры не
+    перезаписываются (у одинаковых изображений они одинаковые).
+    """
+    for variant, content in thumbnails.items():
+        variant_name = thumbnail_name(name, variant)
+        if default_storage.exists(variant_name):
+            if not overwrite:
+                continue
+            default_storage.delete(variant_name)
+        default_storage.save(variant_name, ContentFile(content))
+
+
+def delete_thumbnails(name: str) -> None:
+    for variant in settings.RECIPE_IMAGES['THUMBNAILS']:
+        default_storage.delete(thumbnail_name(name, variant))
+
+
+def get_thumbnail_urls(image) -> dict:
+    if not image:
+        return {}
+    return {
+        variant: default_storage.url(thumbnail_name(image.name, variant))
+        for variant in settings.RECIPE_IMAGES['THUMBNAILS']
+    }
+
+
+def rebuild_thumbnails(image) -> None:
+    """
+    Миниатюры по уже сохраненному изображению
+    (для рецептов, загруженных до появления миниатюр)
+    """
+    with image.open('rb') as file:
+        _, thumbnails = process_image(file.read())
+    save_thumbnails(image.name, thumbnails)
@@ -0,0 +1,198 @@
+# Пакетная идемпотентная загрузка справочных данных из CSV и JSON.
+# Файл читается потоково, строки обрабатываются пачками по batch_size:
+# на пачку - один запрос существующих записей по естественному ключу,
+# bulk_create новых и bulk_update изменившихся. Память ограничена
+# размером пачки, а запросы выполняются на пачку, а не на строку.
+
+import csv
+import json
+from collections import namedtuple
+from collections.abc import Iterable
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from recipes import models
+from recipes.data_versions import bump_data_version
+
+ImportResult = namedtuple('ImportResult', ('inserted', 'updated', 'skipped'))
+
+JSON_READ_CHUNK_SIZE = 64 * 1024
+# Символы между объектами JSON-массива или JSON Lines
+JSON_SEPARATORS = frozenset(' \t\r\n,[]')
+
+
+class ImportSpec(namedtuple('ImportSpec', ('model', 'key_fields', 'fields'))):
+    """
+    Описание загрузки: модель, поля естественного ключа
+    и все поля в порядке столбцов CSV (строка заголовка необязательна)
+    """
+    @property
+    def update_fields(self):
+        return tuple(
+            field for field in self.fields if field not in self.key_fields)
+
+
+IMPORT_SPECS = {
+    'ingredients': ImportSpec(
+        models.Ingredient, ('name', 'measurement_unit'),
+        ('name', 'measurement_unit')),
+    'measurement_units': ImportSpec(
+        models.MeasurementUnit, ('name',),
+        ('name', 'canonical_unit', 'factor')),
+}
+
+
+def iter_csv_rows(file, fields: tuple) -> Iterable:
+    for number, row in enumerate(csv.reader(file)):
+        if number == 0 and tuple(row) == fields:
+            # Строка заголовка
+            continue
+        yield dict(zip(fields, row))
+
+
+def iter_json_rows(file) -> Iterable:
+    """
+    Объекты из JSON-массива ([{...}, {...}]) или JSON Lines
+    по одному, без чтения всего файла в память
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    # Позиция разбора в buffer: прочитанное начало буфера отрезается
+    # только при дочитывании файла, а не после каждого объекта
+    pos = 0
+    eof = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in JSON_SEPARATORS:
+            pos += 1
+        if pos < len(buffer):
+            try:
+                obj, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield obj
+                continue
+        elif eof:
+            return
+        chunk = file.read(JSON_READ_CHUNK_SIZE)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+def _get_key(spec: ImportSpec, values: dict) -> tuple:
+    return tuple(str(values[field]) for field in spec.key_fields)
+
+
+def _clean_row(spec: ImportSpec, row: dict):
+    """
+    Приводит значения строки к типам полей модели.
+    Возвращает None для строк, которые нельзя загрузить.
+    """
+    if not isinstance(row, dict):
+        return None
+    values = {}
+    for field in spec.fields:
+        value = row.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+        if value in (None, ''):
+            return None
+        try:
+            values[field] = spec.model._meta.get_field(field).to_python(
+                value)
+        except ValidationError:
+            return None
+    return values
+
+
+def _filter_by_keys(spec: ImportSpec, keys: Iterable):
+    # Записи выбираются по первому полю ключа (индекс ограничения
+    # уникальности), полное совпадение ключа проверяется по месту
+    return spec.model.objects.filter(**{
+        f'{spec.key_fields[0]}__in': {key[0] for key in keys}})
+
+
+def _get_existing(spec: ImportSpec, keys: Iterable) -> dict:
+    return {
+        _get_key(spec, obj.__dict__): obj
+        for obj in _filter_by_keys(spec, keys)}
+
+
+def _import_batch(spec: ImportSpec, rows: list) -> ImportResult:
+    skipped = 0
+    batch = {}
+    for row in rows:
+        values = _clean_row(spec, row)
+        if values is None or _get_key(spec, values) in batch:
+            skipped += 1
+            continue
+        batch[_get_key(spec, values)] = values
+
+    existing = _get_existing(spec, batch) if batch else {}
+    to_create, to_update = [], []
+    for key, values in batch.items():
+        obj = existing.get(key)
+        if obj is None:
+            to_create.append(spec.model(**values))
+        elif any(getattr(obj, field) != values[field]
+                 for field in spec.update_fields):
+            for field in spec.update_fields:
+                setattr(obj, field, values[field])
+            to_update.append(obj)
+        else:
+            skipped += 1
+    inserted = 0
+    with transaction.atomic():
+        if to_create:
+            # ignore_conflicts - на случай параллельной загрузки тех же
+            # строк. Пропущенные строки bulk_create не возвращает,
+            # поэтому вставленные считаются по разнице количества записей
+            scope = _filter_by_keys(
+                spec, [_get_key(spec, obj.__dict__) for obj in to_create])
+            before = scope.count()
+            spec.model.objects.bulk_create(to_create, ignore_conflicts=True)
+            inserted = scope.count() - before
+            skipped += len(to_create) - inserted
+        if to_update:
+            spec.model.objects.bulk_update(to_update, spec.update_fields)
+    return ImportResult(inserted, len(to_update), skipped)
+
+
+def import_rows(spec: ImportSpec, rows: Iterable,
+                batch_size: int = 1000) -> ImportResult:
+    """
+    Загружает строки rows (словари поле -> значение): новые записи
+    создаются, у существующих (по естественному ключу) обновляются
+    остальные поля, совпадающие строки, повторы и некорректные
+    строки пропускаются. Повторная загрузка того же файла ничего
+    не меняет.
+    """
+    inserted = updated = skipped = 0
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        result = _import_batch(spec, batch)
+        inserted += result.inserted
+        updated += result.updated
+        skipped += result.skipped
+    if inserted or updated:
+        # bulk_create и bulk_update не отправляют сигналы
+        bump_data_version(spec.model._meta.model_name)
+    return ImportResult(inserted, updated, skipped)
+
+
+def import_file(spec: ImportSpec, path: str, file_format: str = None,
+                batch_size: int = 1000) -> ImportResult:
+    file_format = file_format or path.rsplit('.', 1)[-1].lower()
+    with open(path, encoding='UTF-8', newline='') as file:
+        if file_format == 'json':
+            rows = iter_json_rows(file)
+        else:
+            rows = iter_csv_rows(file, spec.fields)
+        return import_rows(spec, rows, batch_size=batch_size)
@@ -0,0 +1,79 @@
+# Индекс ингредиентов в памяти процесса для автодополнения
+# в /api/ingredients/: сначала совпадения по началу названия,
+# затем по подстроке.
+
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from recipes import models
+
+
+class IngredientsIndex:
+    """
+    Отсортированный по названию список ингредиентов в памяти процесса.
+    Перестраивается при изменении ингредиентов в этом процессе
+    (invalidate вызывается из сигналов) и не реже, чем раз в TTL секунд,
+    чтобы подхватывать изменения, сделанные другими процессами.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = None
+        self._entries = None
+        self._built_at = 0.0
+
+    def invalidate(self, **kwargs) -> None:
+        self._entries = None
+
+    def _get_index(self) -> tuple:
+        keys, entries = self._keys, self._entries
+        ttl = settings.INGREDIENT_SEARCH_INDEX['TTL']
+        if entries is not None and time.monotonic() - self._built_at < ttl:
+            return keys, entries
+        with self._lock:
+            if (self._entries is None
+                    or time.monotonic() - self._built_at >= ttl):
+                self._build()
+            return self._keys, self._entries
+
+    def _build(self) -> None:
+        rows = sorted(
+            (ingredient['name'].lower(), ingredient['id'], ingredient)
+            for ingredient in models.Ingredient.objects.values(
+                'id', 'name', 'measurement_unit'))
+        # Ссылки заменяются целиком, поэтому параллельные
+        # запросы всегда видят согласованный индекс
+        self._keys = [key for key, _, _ in rows]
+        self._entries = [ingredient for _, _, ingredient in rows]
+        self._built_at = time.monotonic()
+
+    def search(self, query: str = None) -> list:
+        """
+        Ингредиенты, название которых начинается с query, затем те,
+        в названии которых query встречается в середине.
+        Количество результатов ограничено MAX_RESULTS.
+        Без query возвращаются все ингредиенты.
+        """
+        keys, entries = self._get_index()
+        query = (query or '').strip().lower()
+        if not query:
+            return list(entries)
+        limit = settings.INGREDIENT_SEARCH_INDEX['MAX_RESULTS']
+        results = []
+        position = bisect_left(keys, query)
+        while (position < len(keys) and len(results) < limit
+               and keys[position].startswith(query)):
+            results.append(entries[position])
+            position += 1
+        if len(results) < limit:
+            for key, ingredient in zip(keys, entries):
+                if query in key and not key.startswith(query):
+                    results.append(ingredient)
+                    if len(results) >= limit:
+                        break
+        return results
+
+
+ingredients_index = IngredientsIndex()
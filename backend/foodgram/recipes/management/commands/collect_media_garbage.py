@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from recipes import image_jobs, media
+
+
+class Command(BaseCommand):
+    help = ('Delete recipe image files (and thumbnails) that are no longer '
+            'referenced by any recipe, and uploads left without an image job')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Сначала пересчитать ссылки по рецептам')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать файлы, которые будут удалены')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            repaired = media.rebuild_references()
+            self.stdout.write(
+                f'...Ссылки пересчитаны, исправлено: {repaired}...')
+        names = media.collect_garbage(dry_run=options['dry_run'])
+        names += image_jobs.collect_orphan_uploads(
+            dry_run=options['dry_run'])
+        for name in names:
+            self.stdout.write(name)
+        action = 'к удалению' if options['dry_run'] else 'удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'...Файлов без ссылок {action}: {len(names)}...'))
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import fake_data
+
+
+class Command(BaseCommand):
+    help = ('Generate large volumes of users, subscriptions, tags, recipes, '
+            'favorites and shopping carts for load testing')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--subscriptions', type=float, default=10,
+            help='Среднее количество подписок на пользователя')
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Среднее количество избранных рецептов на пользователя')
+        parser.add_argument(
+            '--shopping-cart', type=float, default=3,
+            help='Среднее количество рецептов в списке покупок')
+        parser.add_argument('--max-ingredients', type=int, default=15)
+        parser.add_argument('--max-tags', type=int, default=3)
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней до fake_data.FAKE_DATA_EPOCH '
+                 'публикуются рецепты')
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Неравномерность популярности (показатель закона Ципфа)')
+        parser.add_argument('--seed', type=int, default=2022)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Загружать данные через COPY (только PostgreSQL)')
+
+    def handle(self, *args, **options):
+        if options['max_ingredients'] < 1 or options['max_tags'] < 1:
+            raise CommandError(
+                'В рецепте должны быть хотя бы один тег и один ингредиент')
+        started = time.monotonic()
+        try:
+            fake_data.generate(
+                users=options['users'], tags=options['tags'],
+                recipes=options['recipes'],
+                subscriptions=options['subscriptions'],
+                favorites=options['favorites'],
+                shopping_cart=options['shopping_cart'],
+                max_ingredients=options['max_ingredients'],
+                max_tags=options['max_tags'], days=options['days'],
+                skew=options['skew'], seed=options['seed'],
+                batch_size=options['batch_size'],
+                use_copy=options['copy'], log=self.stdout.write)
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'...Данные сгенерированы за '
+            f'{time.monotonic() - started:.1f} с...'))
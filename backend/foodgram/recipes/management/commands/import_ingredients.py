@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import importers
+
+
+class Command(BaseCommand):
+    help = ('Bulk, idempotent import of ingredients (or measurement units) '
+            'from a CSV or JSON file')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к CSV- или JSON-файлу')
+        parser.add_argument(
+            '--format', choices=('csv', 'json'),
+            help='Формат файла (по дефолту - по расширению)')
+        parser.add_argument(
+            '--model', choices=tuple(importers.IMPORT_SPECS),
+            default='ingredients', help='Что загружается')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк, обрабатываемых за раз')
+
+    def handle(self, *args, **options):
+        try:
+            result = importers.import_file(
+                importers.IMPORT_SPECS[options['model']], options['path'],
+                file_format=options['format'],
+                batch_size=options['batch_size'])
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'...Загрузка завершена: добавлено {result.inserted}, '
+            f'обновлено {result.updated}, пропущено {result.skipped}...'))
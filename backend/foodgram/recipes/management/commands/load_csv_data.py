@@ -1,63 +1,32 @@
-import csv
 import os
 
 from django.core.management.base import BaseCommand
 
-from recipes import models
+from recipes import importers
 
 DIR_NAME = os.path.dirname(__file__)
 CSV_DATA_PATH = os.path.join(DIR_NAME, '../../../data/')
 
-FILE_MODEL_DICT = {
-    'ingredients.csv': models.Ingredient,
-}
+# Файлы - по описаниям загрузки recipes.importers.IMPORT_SPECS
+# (поля в порядке столбцов csv и поля естественного ключа)
+FILE_SPECS = {
+    f'{name}.csv': spec for name, spec in importers.IMPORT_SPECS.items()}
 
-TABLES_FOREIGN_KEYS = {
-    # EXAMPLE:
-    # 'comments.csv': {
-    #     'author': lambda pk: models.User.objects.get(pk=pk),
-    #     'review': lambda pk: models.Review.objects.get(pk=pk)},
-}
+FILE_MODEL_DICT = {file: spec.model for file, spec in FILE_SPECS.items()}
 
-LOADING_ORDER = ['ingredients.csv']
-
-
-def load_csv_through_dict_reader(
-        data_path=CSV_DATA_PATH,
-        file_model_dict=FILE_MODEL_DICT,
-        foreign_keys_table=TABLES_FOREIGN_KEYS,
-        file=None):
-    with open(''.join([data_path, file]),
-              encoding='UTF-8', newline='') as csv_file:
-        # Считываем данные из csv в виде словаря
-        reader = csv.DictReader(csv_file)
-        # Формируем данные.
-        # Если поле является ForeignKey,
-        # то берем из связанной модели конкретный экземпляр
-        # с помощью TABLES_FOREIGN_KEYS
-        for row in reader:
-            data = {}
-            for k, v in row.items():
-                if (foreign_keys_table.get(file)
-                        and k in foreign_keys_table.get(file)):
-                    data[k] = foreign_keys_table[file][k](int(v))
-                else:
-                    data[k] = v
-            # записываем подготовленные данные в БД
-            file_model_dict[file].objects.create(**data)
+LOADING_ORDER = list(FILE_SPECS)
 
 
 def load_csv_through_reader(
         data_path=CSV_DATA_PATH,
         file_model_dict=FILE_MODEL_DICT,
         file=None,):
-    with open(''.join([data_path, file])) as f:
-        reader = csv.reader(f)
-        for row in reader:
-            file_model_dict[file].objects.get_or_create(
-                name=row[0],
-                measurement_unit=row[1]
-            )
+    """
+    Пакетная идемпотентная загрузка файла (recipes.importers)
+    """
+    return importers.import_file(
+        FILE_SPECS[file]._replace(model=file_model_dict[file]),
+        ''.join([data_path, file]), file_format='csv')
 
 
 class Command(BaseCommand):
@@ -70,11 +39,14 @@ class Command(BaseCommand):
         #  Проходим каждый файл
         for file in files:
             try:
-                load_csv_through_reader(file=file)
+                result = load_csv_through_reader(file=file)
             except Exception as error:
                 self.stdout.write('ПРОИЗОШЛА ОШИБКА:')
-                self.stdout.write(error)
+                self.stdout.write(str(error))
             else:
                 self.stdout.write(
                     self.style.SUCCESS(
-                        f'...Данные успешно загружены из файла {file}...'))
+                        f'...Данные успешно загружены из файла {file}: '
+                        f'добавлено {result.inserted}, '
+                        f'обновлено {result.updated}, '
+                        f'пропущено {result.skipped}...'))
@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes import image_jobs
+
+
+class Command(BaseCommand):
+    help = ('Process queued recipe images: re-encode uploads, generate '
+            'thumbnails and retry failed attempts')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Обработать готовые задачи и завершиться')
+        parser.add_argument(
+            '--max-jobs', type=int,
+            help='Максимальное количество задач за один проход')
+        parser.add_argument(
+            '--stats', action='store_true',
+            help='Только вывести метрики очереди')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            for name, value in image_jobs.get_job_stats().items():
+                self.stdout.write(f'{name}: {value}')
+            return
+        while True:
+            done, failed = image_jobs.process_available(options['max_jobs'])
+            if done or failed:
+                self.stdout.write(
+                    f'...Изображений обработано: {done}, ошибок: {failed}...')
+            if options['once']:
+                break
+            if not (done or failed):
+                time.sleep(settings.IMAGE_JOBS['POLL_INTERVAL'])
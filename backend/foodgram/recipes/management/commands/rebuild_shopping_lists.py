@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import recipes_services
+
+
+class Command(BaseCommand):
+    help = ('Rebuild per-user shopping list totals (ShoppingListItem) '
+            'and verify them against ShoppingCart and RecipeIngredient')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify-only', action='store_true',
+            help='Только сверить сохраненные списки, ничего не меняя')
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            created = recipes_services.rebuild_shopping_lists()
+            self.stdout.write(
+                f'...Списки покупок пересчитаны, записей: {created}...')
+        mismatches = recipes_services.verify_shopping_lists()
+        if mismatches:
+            for user_id, ingredient_id, actual, expected in mismatches:
+                self.stdout.write(
+                    f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                    f'сохранено {actual}, ожидается {expected}')
+            raise CommandError(
+                f'Расхождений в списках покупок: {len(mismatches)}')
+        self.stdout.write(self.style.SUCCESS(
+            '...Списки покупок совпадают с содержимым корзин...'))
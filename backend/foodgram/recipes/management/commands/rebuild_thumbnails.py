@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from recipes import images, models
+
+
+class Command(BaseCommand):
+    help = ('Generate thumbnails for recipe images uploaded '
+            'before thumbnails were introduced')
+
+    def handle(self, *args, **options):
+        rebuilt = failed = 0
+        for recipe in models.Recipe.objects.exclude(image='').only(
+                'id', 'image').iterator():
+            try:
+                images.rebuild_thumbnails(recipe.image)
+            except (OSError, images.ImageError) as error:
+                failed += 1
+                self.stdout.write(f'Рецепт {recipe.id}: {error}')
+            else:
+                rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'...Миниатюры созданы: {rebuilt}, ошибок: {failed}...'))
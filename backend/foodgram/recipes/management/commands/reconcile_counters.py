@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from recipes import counters
+
+
+class Command(BaseCommand):
+    help = ('Recalculate denormalized counters (favorites, shopping carts, '
+            'recipes and subscribers) and repair drifted values')
+
+    def handle(self, *args, **options):
+        for counter, repaired in counters.reconcile_counters().items():
+            self.stdout.write(f'{counter}: исправлено {repaired}')
+        self.stdout.write(self.style.SUCCESS('...Счетчики пересчитаны...'))
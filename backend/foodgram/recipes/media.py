@@ -0,0 +1,129 @@
+# Учет ссылок рецептов на файлы изображений в хранилище по содержимому
+# (recipes.storage): один файл может быть изображением нескольких
+# рецептов, поэтому удалять его можно, только когда ссылок не осталось.
+# Счетчики (MediaFile) меняются в обработчиках сигналов Recipe
+# (подключаются в RecipesConfig.ready). Файлы без ссылок удаляет команда
+# collect_media_garbage - не сразу, а через GC_GRACE_PERIOD секунд:
+# файл мог только что записать обработчик изображений, который еще
+# не сохранил рецепт.
+# Учитываются только файлы с именем по содержимому: заглушка
+# и загруженные раньше изображения не удаляются.
+
+import datetime
+
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from recipes import images, models
+from recipes.storage import content_storage
+
+
+def is_tracked(name: str) -> bool:
+    return content_storage.is_content_name(name)
+
+
+def register(name: str) -> None:
+    """
+    Отмечает только что записанный файл: у файла появляется
+    счетчик, а отсчет GC_GRACE_PERIOD начинается заново
+    """
+    if is_tracked(name):
+        models.MediaFile.objects.update_or_create(name=name)
+
+
+def _change_references(name: str, delta: int) -> None:
+    if not is_tracked(name):
+        return None
+    updated = models.MediaFile.objects.filter(name=name).update(
+        references=Greatest(F('references') + delta, 0),
+        updated_at=timezone.now())
+    if not updated and delta > 0:
+        media_file, created = models.MediaFile.objects.get_or_create(
+            name=name, defaults={'references': delta})
+        if not created:
+            # Счетчик создан параллельно
+            _change_references(name, delta)
+    return None
+
+
+def _get_image_name(instance):
+    # Значение из __dict__: отложенное поле не загружается
+    image = instance.__dict__.get('image')
+    return getattr(image, 'name', image)
+
+
+def remember_image(sender, instance, **kwargs) -> None:
+    """
+    Обработчик post_init: запоминает изображение рецепта,
+    чтобы при замене уменьшить количество ссылок на прежнее
+    """
+    instance._stored_image = _get_image_name(instance)
+
+
+def count_image_saved(sender, instance, created, update_fields=None,
+                      **kwargs) -> None:
+    """
+    Обработчик post_save
+    """
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    current = _get_image_name(instance)
+    previous = None if created else getattr(instance, '_stored_image', None)
+    if current != previous:
+        _change_references(current, 1)
+        _change_references(previous, -1)
+    instance._stored_image = current
+
+
+def count_image_deleted(sender, instance, **kwargs) -> None:
+    """
+    Обработчик post_delete
+    """
+    _change_references(instance.image.name, -1)
+
+
+def rebuild_references() -> int:
+    """
+    Пересчитывает ссылки по рецептам (например, после изменений
+    в обход сигналов или для файлов, сохраненных до учета ссылок).
+    Возвращает количество исправленных счетчиков.
+    """
+    names = {
+        name for name in models.Recipe.objects.order_by().values_list(
+            'image', flat=True).distinct()
+        if is_tracked(name)}
+    # Существующие счетчики пропускаются (ограничение уникальности name)
+    models.MediaFile.objects.bulk_create(
+        [models.MediaFile(name=name) for name in names],
+        ignore_conflicts=True)
+    actual = Coalesce(Subquery(
+        models.Recipe.objects.filter(image=OuterRef('name'))
+        .order_by().values('image')
+        .annotate(count=Count('pk')).values('count')
+    ), 0)
+    return models.MediaFile.objects.exclude(references=actual).update(
+        references=actual, updated_at=timezone.now())
+
+
+def collect_garbage(dry_run: bool = False) -> list:
+    """
+    Удаляет файлы (и их миниатюры), на которые дольше GC_GRACE_PERIOD
+    секунд нет ссылок. Возвращает имена удаленных файлов.
+    """
+    threshold = timezone.now() - datetime.timedelta(
+        seconds=settings.MEDIA_FILES['GC_GRACE_PERIOD'])
+    orphans = models.MediaFile.objects.filter(
+        references=0, updated_at__lt=threshold)
+    if dry_run:
+        return list(orphans.values_list('name', flat=True))
+    deleted = []
+    for name in list(orphans.values_list('name', flat=True)):
+        # Условие повторяется: ссылка могла появиться после выборки
+        if models.MediaFile.objects.filter(
+                name=name, references=0).delete()[0]:
+            content_storage.delete(name)
+            images.delete_thumbnails(name)
+            deleted.append(name)
+    return deleted
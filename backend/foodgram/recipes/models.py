@@ -1,6 +1,11 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core import validators
 from django.db import models
+from django.db.models.functions import Lower
+
+from recipes.storage import get_content_storage
+from users.models import CountersModelMixin
 
 User = get_user_model()
 
@@ -26,6 +31,17 @@ class Ingredient(models.Model):
 
     class Meta:
         ordering = ('name',)
+        indexes = [
+            # Список ингредиентов сортируется по Lower('name')
+            models.Index(Lower('name'), name='ingredient_lower_name_idx'),
+        ]
+        constraints = [
+            # Естественный ключ для идемпотентной загрузки (recipes.importers)
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient_name_unit'
+            )
+        ]
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
 
@@ -33,9 +49,34 @@ class Ingredient(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class MeasurementUnit(models.Model):
+    """
+    Перевод единицы измерения ингредиентов в базовую
+    (например, кг -> г с множителем 1000) для суммирования
+    количеств в списке покупок.
+    """
+    name = models.CharField('Единица измерения', max_length=200, unique=True)
+    canonical_unit = models.CharField('Базовая единица', max_length=200)
+    factor = models.PositiveIntegerField(
+        'Множитель перевода в базовую единицу',
+        validators=(validators.MinValueValidator(limit_value=1),)
+    )
+
+    class Meta:
+        ordering = ('name',)
+        verbose_name = 'Единица измерения'
+        verbose_name_plural = 'Единицы измерения'
+
+    def __str__(self):
+        return f'{self.name} = {self.factor} {self.canonical_unit}'
+
+
+class Recipe(CountersModelMixin, models.Model):
     name = models.CharField('Название', max_length=200)
-    image = models.ImageField('Изображение', upload_to='images/%Y/%m/%d/')
+    # Имя файла - хэш содержимого, одинаковые изображения хранятся
+    # один раз (см. recipes.storage и recipes.media)
+    image = models.ImageField('Изображение', upload_to='images/',
+                              storage=get_content_storage)
     text = models.TextField('Текст')
     cooking_time = models.IntegerField(
         'Время приготовления',
@@ -48,15 +89,34 @@ class Recipe(models.Model):
         verbose_name='Автор',
         to=User,
         related_name='recipes',
-        on_delete=models.CASCADE)
+        on_delete=models.CASCADE,
+        # Поиск по автору обслуживает индекс recipe_author_pub_date_idx
+        db_index=False)
     tags = models.ManyToManyField(verbose_name='Теги', to=Tag,
                                   through='RecipeTag')
     ingredients = models.ManyToManyField(
         verbose_name='Ингредиенты', to=Ingredient,
         through='RecipeIngredient',)
+    # Заполняется триггером на PostgreSQL (см. recipes.search)
+    search_vector = SearchVectorField(
+        'Поисковый вектор', null=True, editable=False)
+    # Счетчики поддерживаются обработчиками сигналов (см. recipes.counters)
+    favorites_count = models.PositiveIntegerField(
+        'Количество добавлений в избранное', default=0, editable=False)
+    shopping_cart_count = models.PositiveIntegerField(
+        'Количество добавлений в список покупок', default=0, editable=False)
+    counter_fields = ('favorites_count', 'shopping_cart_count')
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            # Лента рецептов и курсорная пагинация
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_idx'),
+            # Рецепты автора (подписки, фильтр по автору)
+            models.Index(fields=('author', '-pub_date'),
+                         name='recipe_author_pub_date_idx'),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -120,11 +180,19 @@ class Favorite(models.Model):
     )
     recipe = models.ForeignKey(
         verbose_name='Рецепт', to=Recipe, on_delete=models.CASCADE,
-        related_name='favorite_recipes'
+        related_name='favorite_recipes',
+        # Поиск по рецепту обслуживает индекс favorite_recipe_user_idx
+        db_index=False
     )
 
     class Meta:
         ordering = ('user',)
+        indexes = [
+            # Прямой поиск (user, recipe) обслуживает индекс
+            # ограничения unique_user_recipe, этот - обратный
+            models.Index(fields=('recipe', 'user'),
+                         name='favorite_recipe_user_idx'),
+        ]
         verbose_name = 'Избранное'
         verbose_name_plural = verbose_name
         constraints = [
@@ -158,3 +226,110 @@ class ShoppingCart(models.Model):
                 name='unique_user_recipe_shopping'
             )
         ]
+
+
+class ShoppingListItem(models.Model):
+    """
+    Итоговое количество ингредиента в списке покупок пользователя.
+    Поддерживается инкрементально при изменении списка покупок
+    и ингредиентов рецептов (см. recipes_services), чтобы выгрузка
+    списка была одним чтением по индексу, а не агрегацией.
+    """
+    user = models.ForeignKey(
+        verbose_name='Пользователь', to=User, on_delete=models.CASCADE,
+        related_name='shopping_list_items'
+    )
+    ingredient = models.ForeignKey(
+        verbose_name='Ингредиент', to=Ingredient, on_delete=models.CASCADE,
+        related_name='shopping_list_items'
+    )
+    amount = models.IntegerField('Количество ингредиента')
+    recipes_count = models.IntegerField(
+        'Количество рецептов с ингредиентом')
+
+    class Meta:
+        ordering = ('user',)
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_user_ingredient_shopping_list'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient}: {self.amount}'
+
+
+class ImageJob(models.Model):
+    """
+    Задача фоновой обработки загруженного изображения рецепта
+    (см. recipes.image_jobs): исходный файл upload перекодируется,
+    для него создаются миниатюры, после чего он становится
+    изображением рецепта.
+    """
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (PROCESSING, 'Обрабатывается'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    recipe = models.ForeignKey(
+        verbose_name='Рецепт', to=Recipe, on_delete=models.CASCADE,
+        related_name='image_jobs'
+    )
+    upload = models.FileField('Загруженный файл', upload_to='uploads/')
+    status = models.CharField(
+        'Статус', max_length=20, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField('Попытки', default=0)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created_at = models.DateTimeField('Поставлена в очередь',
+                                      auto_now_add=True)
+    available_at = models.DateTimeField('Доступна для обработки с')
+    started_at = models.DateTimeField('Начало обработки', null=True)
+    finished_at = models.DateTimeField('Окончание обработки', null=True)
+    processing_time = models.FloatField(
+        'Время обработки, с', null=True)
+
+    class Meta:
+        ordering = ('id',)
+        indexes = [
+            # Выбор следующей задачи обработчиком
+            models.Index(fields=('status', 'available_at'),
+                         name='image_job_queue_idx'),
+        ]
+        verbose_name = 'Обработка изображения'
+        verbose_name_plural = 'Обработка изображений'
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.get_status_display()}'
+
+
+class MediaFile(models.Model):
+    """
+    Количество рецептов, ссылающихся на файл изображения в хранилище
+    по содержимому. Файлы без ссылок удаляются командой
+    collect_media_garbage (см. recipes.media).
+    """
+    name = models.CharField('Имя файла', max_length=255, unique=True)
+    references = models.PositiveIntegerField('Количество ссылок', default=0)
+    updated_at = models.DateTimeField('Изменено', auto_now=True)
+
+    class Meta:
+        ordering = ('name',)
+        indexes = [
+            # Поиск файлов без ссылок
+            models.Index(fields=('references', 'updated_at'),
+                         name='media_file_orphans_idx'),
+        ]
+        verbose_name = 'Файл изображения'
+        verbose_name_plural = 'Файлы изображений'
+
+    def __str__(self):
+        return f'{self.name}: {self.references}'
@@ -1,36 +1,89 @@
 # Модуль, в котором содержится логика работы приложения:
 # обращения к БД, генерация отчетов и т.д.
 
-import io
-from collections import Iterable
+import csv
+import json
+import logging
+import tempfile
+from collections import namedtuple
+from collections.abc import Iterable
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import FileResponse, HttpResponse
-from django.shortcuts import get_object_or_404
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (BooleanField, Case, Count, Exists, F,
+                              IntegerField, OuterRef, Prefetch, Subquery,
+                              Sum, Value, When, Window,
+                              prefetch_related_objects)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, RowNumber
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm
+from reportlab.lib.utils import simpleSplit
 from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
 from reportlab.pdfgen import canvas
 
 from recipes import models
+from recipes.data_versions import get_data_version
+from users.users_services import annotate_is_subscribed
 
 
-# Настройки полей для страницы со списком покупок в PDF
-PDF_REPORT_PAGE_WIDTH = 29.7 * cm
+TAG_IDS_KEY = 'tag_ids:{}'
+
+# Настройки страницы со списком покупок в PDF
+PDF_REPORT_PAGE_SIZE = A4
 PDF_REPORT_LEFT_MARGIN = 2 * cm
 PDF_REPORT_TOP_MARGIN = 2 * cm
+PDF_REPORT_BOTTOM_MARGIN = 2 * cm
+PDF_REPORT_FONT = 'ShoppingList'
+PDF_REPORT_FONT_BOLD = 'ShoppingListBold'
+PDF_REPORT_FONT_SIZE = 14
+PDF_REPORT_TITLE_FONT_SIZE = 16
+PDF_REPORT_LEADING = 1.5 * PDF_REPORT_FONT_SIZE
+PDF_REPORT_PAGE_TEMPLATE = 'shopping_list_page'
+# PDF больше этого размера (в байтах) хранится во временном файле,
+# а не в памяти процесса
+PDF_REPORT_SPOOL_MAX_SIZE = 1024 * 1024
+
+# Размер порции при чтении списка покупок из БД и при потоковой отдаче
+SHOPPING_LIST_CHUNK_SIZE = 500
 
 
 User = get_user_model()
 
+logger = logging.getLogger(__name__)
+
+# Зарегистрированные форматы выгрузки списка покупок:
+# расширение файла -> ShoppingListReport
+SHOPPING_LIST_REPORTS = {}
+DEFAULT_SHOPPING_LIST_FORMAT = 'txt'
+
+ShoppingListReport = namedtuple('ShoppingListReport', ('media_type', 'render'))
+
+
+def get_missing_ids(model, ids: Iterable) -> list:
+    """
+    Возвращает отсортированный список id из ids, которых нет в БД.
+    Все id проверяются одним запросом.
+    """
+    ids = set(ids)
+    if not ids:
+        return []
+    existing_ids = set(model.objects.filter(
+        pk__in=ids).values_list('pk', flat=True))
+    return sorted(ids - existing_ids)
+
 
 def create_tags_in_recipe(tags: Iterable, recipe: models.Recipe) -> None:
+    """
+    Теги должны быть предварительно проверены на существование
+    (см. get_missing_ids), поэтому записи создаются сразу по id.
+    """
     models.RecipeTag.objects.bulk_create([
-        models.RecipeTag(
-            recipe=recipe,
-            tag=get_object_or_404(models.Tag, pk=tag.get('id'))
-        )
+        models.RecipeTag(recipe=recipe, tag_id=tag.get('id'))
         for tag in tags])
     return None
 
@@ -40,73 +93,621 @@ def create_ingredients_in_recipe(
     models.RecipeIngredient.objects.bulk_create([
         models.RecipeIngredient(
             recipe=recipe,
-            ingredient=get_object_or_404(
-                models.Ingredient, pk=ingredient_in_recipe.get('id')),
+            ingredient_id=ingredient_in_recipe.get('id'),
             amount=ingredient_in_recipe.get('amount')
         )
         for ingredient_in_recipe in ingredients])
     return None
 
 
-def get_txt_report(request, filename: str) -> HttpResponse:
+def update_tags_in_recipe(tags: Iterable, recipe: models.Recipe) -> None:
+    """
+    Удаляет из рецепта отсутствующие в tags теги и добавляет новые,
+    не трогая неизменившиеся записи.
+    """
+    new_ids = {tag.get('id') for tag in tags}
+    current_ids = set(models.RecipeTag.objects.filter(
+        recipe=recipe).values_list('tag_id', flat=True))
+    removed_ids = current_ids - new_ids
+    if removed_ids:
+        models.RecipeTag.objects.filter(
+            recipe=recipe, tag_id__in=removed_ids).delete()
+    create_tags_in_recipe(
+        [{'id': tag_id} for tag_id in new_ids - current_ids], recipe)
+    return None
+
+
+# Блокировки списков покупок - FOR NO KEY UPDATE: она не конфликтует
+# с FOR KEY SHARE, которую берет INSERT строки со ссылкой на рецепт
+# или пользователя (ShoppingCart, RecipeIngredient) в параллельных
+# транзакциях. Порядок всегда один: рецепт, затем пользователи по id.
+
+def _lock_recipe(recipe_id: int) -> None:
+    """
+    Блокирует строку рецепта до конца транзакции. Изменение ингредиентов
+    рецепта и добавление/удаление его в списках покупок берут эту
+    блокировку до чтения ингредиентов, поэтому изменения списков покупок
+    считаются по одному и тому же составу рецепта.
+    """
+    list(models.Recipe.objects.select_for_update(no_key=True).filter(
+        pk=recipe_id).values_list('pk', flat=True))
+    return None
+
+
+def _lock_users(user_ids: Iterable) -> list:
+    """
+    Блокирует пользователей, чтобы параллельные изменения списка
+    покупок одного пользователя применялись по очереди.
+    Возвращает id существующих пользователей.
+    """
+    return list(User.objects.select_for_update(no_key=True).filter(
+        pk__in=set(user_ids)).order_by('pk').values_list('pk', flat=True))
+
+
+@transaction.atomic
+def lock_shopping_list(user: User, recipe: models.Recipe) -> None:
+    """
+    Блокировки для изменения списка покупок user рецептом recipe.
+    Берутся до записи строки ShoppingCart, в том же порядке, что
+    и при пересчете списка.
+    """
+    _lock_recipe(recipe.pk)
+    _lock_users([user.pk])
+    return None
+
+
+@transaction.atomic
+def update_ingredients_in_recipe(
+        ingredients: Iterable, recipe: models.Recipe) -> None:
+    """
+    Приводит ингредиенты рецепта к ingredients:
+    удаляет лишние, добавляет новые и обновляет изменившиеся количества.
+    """
+    _lock_recipe(recipe.pk)
+    new_amounts = {
+        ingredient.get('id'): ingredient.get('amount')
+        for ingredient in ingredients}
+    current = {
+        ingredient_in_recipe.ingredient_id: ingredient_in_recipe
+        for ingredient_in_recipe in models.RecipeIngredient.objects.filter(
+            recipe=recipe)}
+    # Изменения для списков покупок, в которых есть этот рецепт
+    shopping_list_changes = {}
+    removed_ids = current.keys() - new_amounts.keys()
+    if removed_ids:
+        models.RecipeIngredient.objects.filter(
+            recipe=recipe, ingredient_id__in=removed_ids).delete()
+        for ingredient_id in removed_ids:
+            shopping_list_changes[ingredient_id] = (
+                -current[ingredient_id].amount, -1)
+    added_ids = new_amounts.keys() - current.keys()
+    create_ingredients_in_recipe(
+        [{'id': ingredient_id, 'amount': new_amounts[ingredient_id]}
+         for ingredient_id in added_ids],
+        recipe)
+    for ingredient_id in added_ids:
+        shopping_list_changes[ingredient_id] = (new_amounts[ingredient_id], 1)
+    changed = []
+    for ingredient_id, ingredient_in_recipe in current.items():
+        amount = new_amounts.get(ingredient_id)
+        if amount is not None and amount != ingredient_in_recipe.amount:
+            shopping_list_changes[ingredient_id] = (
+                amount - ingredient_in_recipe.amount, 0)
+            ingredient_in_recipe.amount = amount
+            changed.append(ingredient_in_recipe)
+    if changed:
+        models.RecipeIngredient.objects.bulk_update(changed, ('amount',))
+    _change_shopping_lists(
+        recipe.shopping_recipes.values_list('user_id', flat=True),
+        shopping_list_changes)
+    return None
+
+
+def register_shopping_list_report(extension: str, media_type: str):
+    """
+    Декоратор для регистрации функции генерации списка покупок
+    в формате extension. Функция принимает request и имя файла
+    и возвращает готовый HTTP-ответ.
+    """
+    def decorator(render):
+        SHOPPING_LIST_REPORTS[extension] = ShoppingListReport(
+            media_type, render)
+        return render
+    return decorator
+
+
+def get_shopping_list_format(requested_format: str = None,
+                             accept: str = '') -> str:
+    """
+    Определение формата выгрузки списка покупок: явно запрошенный
+    формат, затем первый подходящий тип из заголовка Accept,
+    иначе - формат по умолчанию.
+    Возвращает None, если запрошен незарегистрированный формат.
+    """
+    if requested_format:
+        return (requested_format
+                if requested_format in SHOPPING_LIST_REPORTS else None)
+    media_types = [
+        media_type.split(';')[0].strip() for media_type in accept.split(',')]
+    for media_type in media_types:
+        for extension, report in SHOPPING_LIST_REPORTS.items():
+            if report.media_type == media_type:
+                return extension
+    return DEFAULT_SHOPPING_LIST_FORMAT
+
+
+def render_shopping_list(request, extension: str) -> HttpResponse:
+    return SHOPPING_LIST_REPORTS[extension].render(
+        request, f'shopping_list.{extension}')
+
+
+def _get_shopping_list_rows(user: User) -> Iterable:
+    """
+    Строки списка покупок: (название, количество, единица измерения).
+    """
+    # iterator() не кэширует результаты, а на PostgreSQL читает их
+    # серверным курсором порциями по SHOPPING_LIST_CHUNK_SIZE строк
+    for ingredient in _get_shopping_list(user).iterator(
+            chunk_size=SHOPPING_LIST_CHUNK_SIZE):
+        yield (ingredient['name'].capitalize(), ingredient['shop_amount'],
+               ingredient['measurement_unit'])
+
+
+def _join_chunks(parts: Iterable) -> Iterable:
     """
-    Генерация списка покупок в TXT
+    Склеивает мелкие фрагменты ответа в порции
+    по SHOPPING_LIST_CHUNK_SIZE штук, чтобы не отдавать их по одному.
     """
-    text = 'СПИСОК ПОКУПОК:'
-    shopping_list = _get_shopping_list(request.user)
-    num = 1
-    for ingredient in shopping_list:
-        ingredient_amount = (f'{num}. {ingredient.name.capitalize()} - '
-                             f'{ingredient.shop_amount} '
-                             f'{ingredient.measurement_unit}.')
-        text += f'\n{ingredient_amount}'
-        num += 1
-    response = HttpResponse(text, content_type='text/plain; charset=utf8')
+    chunk = []
+    for part in parts:
+        chunk.append(part)
+        if len(chunk) >= SHOPPING_LIST_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def _streaming_attachment(parts: Iterable, content_type: str,
+                          filename: str) -> StreamingHttpResponse:
+    response = StreamingHttpResponse(
+        _join_chunks(parts), content_type=content_type)
     response['Content-Disposition'] = f'attachment; filename={filename}'
     return response
 
 
+class _Echo:
+    """
+    Псевдо-файл для csv.writer: возвращает записанную строку,
+    вместо того чтобы ее где-то хранить.
+    """
+    def write(self, value):
+        return value
+
+
+@register_shopping_list_report('txt', 'text/plain')
+def get_txt_report(request, filename: str) -> StreamingHttpResponse:
+    """
+    Генерация списка покупок в TXT (потоковая отдача)
+    """
+    def lines():
+        yield 'СПИСОК ПОКУПОК:'
+        rows = _get_shopping_list_rows(request.user)
+        for num, (name, amount, unit) in enumerate(rows, start=1):
+            yield f'\n{num}. {name} - {amount} {unit}.'
+    return _streaming_attachment(
+        lines(), 'text/plain; charset=utf8', filename)
+
+
+def register_pdf_fonts() -> None:
+    """
+    Регистрация шрифтов для PDF-отчетов. Выполняется один раз
+    при старте приложения (RecipesConfig.ready), а не на каждый запрос.
+    Шрифты берутся из settings.SHOPPING_LIST_PDF_FONTS и должны содержать
+    кириллицу; если файлы не найдены - используется Vera из reportlab
+    (без кириллицы).
+    """
+    if PDF_REPORT_FONT in pdfmetrics.getRegisteredFontNames():
+        return None
+    fonts = settings.SHOPPING_LIST_PDF_FONTS
+    try:
+        pdfmetrics.registerFont(TTFont(PDF_REPORT_FONT, fonts['regular']))
+        pdfmetrics.registerFont(TTFont(PDF_REPORT_FONT_BOLD, fonts['bold']))
+    except (IOError, TTFError) as error:
+        logger.warning(
+            'Шрифты для PDF не найдены (%s), кириллица в списке покупок '
+            'отображаться не будет', error)
+        pdfmetrics.registerFont(TTFont(PDF_REPORT_FONT, 'Vera.ttf'))
+        pdfmetrics.registerFont(TTFont(PDF_REPORT_FONT_BOLD, 'VeraBd.ttf'))
+    return None
+
+
+def _draw_pdf_page_template(pdf: canvas.Canvas) -> None:
+    """
+    Общее оформление страниц списка покупок.
+    Рисуется один раз в PDF-форму и переиспользуется на всех страницах.
+    """
+    page_width, page_height = PDF_REPORT_PAGE_SIZE
+    pdf.beginForm(PDF_REPORT_PAGE_TEMPLATE)
+    pdf.setFont(PDF_REPORT_FONT_BOLD, PDF_REPORT_TITLE_FONT_SIZE)
+    pdf.drawString(PDF_REPORT_LEFT_MARGIN,
+                   page_height - PDF_REPORT_TOP_MARGIN, 'СПИСОК ПОКУПОК')
+    line_y = page_height - PDF_REPORT_TOP_MARGIN - PDF_REPORT_LEADING / 2
+    pdf.line(PDF_REPORT_LEFT_MARGIN, line_y,
+             page_width - PDF_REPORT_LEFT_MARGIN, line_y)
+    pdf.endForm()
+    return None
+
+
+def _iter_pdf_lines(rows: Iterable, max_width: float) -> Iterable:
+    """
+    Строки списка покупок, разбитые по ширине страницы.
+    """
+    for num, (name, amount, unit) in enumerate(rows, start=1):
+        yield from simpleSplit(
+            f'{num}. {name} - {amount} {unit}.',
+            PDF_REPORT_FONT, PDF_REPORT_FONT_SIZE, max_width)
+
+
+def write_pdf_shopping_list(rows: Iterable, output) -> None:
+    """
+    Запись строк списка покупок (название, количество, единица измерения)
+    в PDF-файл output. Длинный список переносится на следующие страницы
+    с нумерацией.
+    """
+    page_width, page_height = PDF_REPORT_PAGE_SIZE
+    pdf = canvas.Canvas(output, pagesize=PDF_REPORT_PAGE_SIZE)
+    _draw_pdf_page_template(pdf)
+    top = (page_height - PDF_REPORT_TOP_MARGIN
+           - PDF_REPORT_TITLE_FONT_SIZE - PDF_REPORT_LEADING)
+    page_number = 1
+    y = top
+
+    def finish_page():
+        pdf.doForm(PDF_REPORT_PAGE_TEMPLATE)
+        pdf.setFont(PDF_REPORT_FONT, PDF_REPORT_FONT_SIZE)
+        pdf.drawRightString(page_width - PDF_REPORT_LEFT_MARGIN,
+                            PDF_REPORT_BOTTOM_MARGIN / 2,
+                            f'Страница {page_number}')
+        pdf.showPage()
+
+    pdf.setFont(PDF_REPORT_FONT, PDF_REPORT_FONT_SIZE)
+    for line in _iter_pdf_lines(
+            rows, page_width - 2 * PDF_REPORT_LEFT_MARGIN):
+        if y < PDF_REPORT_BOTTOM_MARGIN:
+            finish_page()
+            page_number += 1
+            pdf.setFont(PDF_REPORT_FONT, PDF_REPORT_FONT_SIZE)
+            y = top
+        pdf.drawString(PDF_REPORT_LEFT_MARGIN, y, line)
+        y -= PDF_REPORT_LEADING
+    finish_page()
+    pdf.save()
+    return None
+
+
+@register_shopping_list_report('pdf', 'application/pdf')
 def get_pdf_report(request, filename: str) -> FileResponse:
     """
     Генерация списка покупок в PDF.
-    TODO: Некорректно отображается кириллица,
-    несмотря на попытки исправить кодировки с помощью регистрации TTF-шрифтов
-    """
-    buffer = io.BytesIO()
-    pdf = canvas.Canvas(buffer)
-    pdfmetrics.registerFont(TTFont('Vera', 'Vera.ttf'))
-    pdfmetrics.registerFont(TTFont('VeraBd', 'VeraBd.ttf'))
-    pdfmetrics.registerFont(TTFont('VeraIt', 'VeraIt.ttf'))
-    pdfmetrics.registerFont(TTFont('VeraBI', 'VeraBI.ttf'))
-    pdf.setFont('Vera', 16)
-    shopping_list = _get_shopping_list(request.user)
-    textobject = pdf.beginText(
-        PDF_REPORT_LEFT_MARGIN,
-        PDF_REPORT_PAGE_WIDTH - PDF_REPORT_TOP_MARGIN)
-    textobject.textLine('SHOPPING LIST:')
-
-    num = 1
-    for ingredient in shopping_list:
-        ingredient_amount = (f'{num}. {ingredient.name.capitalize()} - '
-                             f'{ingredient.shop_amount} '
-                             f'{ingredient.measurement_unit}.')
-        textobject.textLine(ingredient_amount)
-        num += 1
-
-    pdf.drawText(textobject)
-    pdf.save()
-    buffer.seek(0)
-    return FileResponse(buffer, as_attachment=True, filename=filename)
+    Готовый документ сбрасывается на диск, если он больше
+    PDF_REPORT_SPOOL_MAX_SIZE, и отдается порциями.
+    """
+    output = tempfile.SpooledTemporaryFile(
+        max_size=PDF_REPORT_SPOOL_MAX_SIZE)
+    write_pdf_shopping_list(_get_shopping_list_rows(request.user), output)
+    output.seek(0)
+    return FileResponse(output, as_attachment=True, filename=filename)
+
+
+@register_shopping_list_report('csv', 'text/csv')
+def get_csv_report(request, filename: str) -> StreamingHttpResponse:
+    """
+    Генерация списка покупок в CSV (потоковая отдача)
+    """
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield writer.writerow(('name', 'amount', 'measurement_unit'))
+        for row in _get_shopping_list_rows(request.user):
+            yield writer.writerow(row)
+    return _streaming_attachment(
+        lines(), 'text/csv; charset=utf8', filename)
+
+
+@register_shopping_list_report('json', 'application/json')
+def get_json_report(request, filename: str) -> StreamingHttpResponse:
+    """
+    Генерация списка покупок в JSON (потоковая отдача)
+    """
+    def parts():
+        yield '['
+        rows = _get_shopping_list_rows(request.user)
+        for num, (name, amount, unit) in enumerate(rows):
+            item = json.dumps(
+                {'name': name, 'amount': amount, 'measurement_unit': unit},
+                ensure_ascii=False)
+            yield f',{item}' if num else item
+        yield ']'
+    return _streaming_attachment(parts(), 'application/json', filename)
 
 
 def _get_shopping_list(user: User) -> Iterable:
     """
     Получение списка покупок пользователя из БД.
+    Количества берутся из заранее посчитанных ShoppingListItem
+    и переводятся в базовые единицы измерения (MeasurementUnit),
+    после чего ингредиенты с одинаковым названием суммируются
+    одним сгруппированным запросом.
+    Единицы, которых нет в MeasurementUnit, остаются как есть.
     """
-    return models.Ingredient.objects.filter(
-        recipes__recipe__in=user.shopping_cart.values_list(
-            'recipe', flat=True)
-    ).annotate(shop_amount=Sum('recipes__amount'))
+    units = models.MeasurementUnit.objects.filter(
+        name=OuterRef('ingredient__measurement_unit'))
+    return models.ShoppingListItem.objects.filter(
+        user=user
+    ).annotate(
+        canonical_unit=Coalesce(
+            Subquery(units.values('canonical_unit')),
+            F('ingredient__measurement_unit')),
+        factor=Coalesce(Subquery(units.values('factor')), Value(1)),
+    ).values(
+        'canonical_unit', name=F('ingredient__name')
+    ).annotate(
+        measurement_unit=F('canonical_unit'),
+        shop_amount=Sum(F('amount') * F('factor')),
+    ).order_by('name', 'measurement_unit')
+
+
+def _get_live_shopping_lists(user_ids: Iterable = None) -> Iterable:
+    """
+    Списки покупок всех пользователей (или только user_ids),
+    посчитанные по текущему содержимому ShoppingCart и RecipeIngredient.
+    """
+    # Условия - в одном filter(): иначе для каждого будет отдельный JOIN
+    lookups = (
+        {'recipe__shopping_recipes__isnull': False} if user_ids is None
+        else {'recipe__shopping_recipes__user_id__in': user_ids})
+    return models.RecipeIngredient.objects.filter(
+        **lookups
+    ).values(
+        'ingredient_id', user_id=F('recipe__shopping_recipes__user_id')
+    ).annotate(
+        total_amount=Sum('amount'), total_recipes=Count('id')
+    ).order_by()
+
+
+def _case_by_ingredient(changes: dict, index: int) -> Case:
+    return Case(
+        *[When(ingredient_id=ingredient_id, then=Value(change[index]))
+          for ingredient_id, change in changes.items()],
+        default=Value(0), output_field=IntegerField())
+
+
+@transaction.atomic
+def _change_shopping_lists(user_ids: Iterable, changes: dict) -> None:
+    """
+    Изменение списков покупок пользователей user_ids.
+    changes: {id ингредиента: (изменение количества,
+                               изменение количества рецептов)}
+    """
+    changes = {
+        ingredient_id: change for ingredient_id, change in changes.items()
+        if change != (0, 0)}
+    if not changes:
+        return None
+    user_ids = _lock_users(user_ids)
+    if not user_ids:
+        return None
+    items = models.ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=changes)
+    existing = set(items.values_list('user_id', 'ingredient_id'))
+    if existing:
+        items.update(
+            amount=F('amount') + _case_by_ingredient(changes, 0),
+            recipes_count=(
+                F('recipes_count') + _case_by_ingredient(changes, 1)))
+    models.ShoppingListItem.objects.bulk_create([
+        models.ShoppingListItem(
+            user_id=user_id, ingredient_id=ingredient_id,
+            amount=amount, recipes_count=recipes_count)
+        for user_id in user_ids
+        for ingredient_id, (amount, recipes_count) in changes.items()
+        if (user_id, ingredient_id) not in existing and recipes_count > 0
+    ])
+    models.ShoppingListItem.objects.filter(
+        user_id__in=user_ids, recipes_count__lte=0).delete()
+    return None
+
+
+def _get_recipe_amounts(recipe_id: int) -> dict:
+    return dict(models.RecipeIngredient.objects.filter(
+        recipe_id=recipe_id).values_list('ingredient_id', 'amount'))
+
+
+@transaction.atomic
+def add_recipe_to_shopping_list(user: User, recipe: models.Recipe) -> None:
+    _lock_recipe(recipe.pk)
+    _change_shopping_lists([user.pk], {
+        ingredient_id: (amount, 1)
+        for ingredient_id, amount in _get_recipe_amounts(recipe.pk).items()})
+    return None
+
+
+@transaction.atomic
+def remove_recipe_from_shopping_list(user_id: int, recipe_id: int) -> None:
+    _lock_recipe(recipe_id)
+    _change_shopping_lists([user_id], {
+        ingredient_id: (-amount, -1)
+        for ingredient_id, amount in _get_recipe_amounts(recipe_id).items()})
+    return None
+
+
+def remove_deleted_cart_from_shopping_list(sender, instance,
+                                           **kwargs) -> None:
+    """
+    Сигнал pre_delete для ShoppingCart: ингредиенты рецепта убираются
+    из списка покупок при любом удалении строки - через API, админку,
+    queryset.delete() или каскадом вместе с рецептом либо пользователем.
+    pre_delete отправляется до удаления строк, поэтому ингредиенты
+    рецепта еще на месте.
+    """
+    remove_recipe_from_shopping_list(instance.user_id, instance.recipe_id)
+    return None
+
+
+def _create_shopping_list_items(rows: Iterable) -> int:
+    items = models.ShoppingListItem.objects.bulk_create(
+        (models.ShoppingListItem(
+            user_id=row['user_id'], ingredient_id=row['ingredient_id'],
+            amount=row['total_amount'], recipes_count=row['total_recipes'])
+         for row in rows.iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)),
+        batch_size=SHOPPING_LIST_CHUNK_SIZE)
+    return len(items)
+
+
+@transaction.atomic
+def rebuild_shopping_lists() -> int:
+    """
+    Полный пересчет ShoppingListItem по текущим спискам покупок.
+    Возвращает количество созданных записей.
+    """
+    models.ShoppingListItem.objects.all().delete()
+    return _create_shopping_list_items(_get_live_shopping_lists())
+
+
+@transaction.atomic
+def refresh_shopping_lists(user_ids: Iterable) -> None:
+    """
+    Пересчет списков покупок пользователей user_ids - после изменений
+    в обход сервисов (например, в админке), когда разницу
+    для инкрементального обновления уже не посчитать.
+    """
+    user_ids = _lock_users(user_ids)
+    if not user_ids:
+        return None
+    models.ShoppingListItem.objects.filter(user_id__in=user_ids).delete()
+    _create_shopping_list_items(_get_live_shopping_lists(user_ids))
+    return None
+
+
+def verify_shopping_lists() -> list:
+    """
+    Сверка ShoppingListItem со списками покупок, посчитанными
+    по ShoppingCart и RecipeIngredient.
+    Возвращает список расхождений:
+    (id пользователя, id ингредиента, сохраненное значение, ожидаемое),
+    где значения - пары (количество, количество рецептов) либо None.
+    """
+    stored = {
+        (user_id, ingredient_id): (amount, recipes_count)
+        for user_id, ingredient_id, amount, recipes_count
+        in models.ShoppingListItem.objects.values_list(
+            'user_id', 'ingredient_id', 'amount', 'recipes_count'
+        ).iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)}
+    mismatches = []
+    for row in _get_live_shopping_lists().iterator(
+            chunk_size=SHOPPING_LIST_CHUNK_SIZE):
+        key = (row['user_id'], row['ingredient_id'])
+        expected = (row['total_amount'], row['total_recipes'])
+        actual = stored.pop(key, None)
+        if actual != expected:
+            mismatches.append((*key, actual, expected))
+    mismatches.extend(
+        (*key, actual, None) for key, actual in stored.items())
+    return mismatches
+
+
+def annotate_user_recipe_flags(user: User,
+                               queryset: Iterable) -> Iterable:
+    """
+    Добавляет к рецептам признаки is_favorited и is_in_shopping_cart
+    для пользователя user прямо в основном запросе (через EXISTS),
+    чтобы сериализатор не делал отдельных запросов на каждый рецепт.
+    """
+    if not user.is_authenticated:
+        return queryset.annotate(
+            is_favorited=Value(False, output_field=BooleanField()),
+            is_in_shopping_cart=Value(False, output_field=BooleanField())
+        )
+    return queryset.annotate(
+        is_favorited=Exists(models.Favorite.objects.filter(
+            user=user, recipe=OuterRef('pk'))),
+        is_in_shopping_cart=Exists(models.ShoppingCart.objects.filter(
+            user=user, recipe=OuterRef('pk')))
+    )
+
+
+def prefetch_recipe_related(user: User, queryset: Iterable) -> Iterable:
+    """
+    Загружает связанные с рецептами данные, необходимые для их отображения,
+    фиксированным числом запросов независимо от количества рецептов:
+    автора (вместе с признаком подписки на него), теги и ингредиенты.
+    """
+    return queryset.prefetch_related(
+        Prefetch('author', queryset=annotate_is_subscribed(
+            user=user, queryset=User.objects.all())),
+        'tags',
+        Prefetch('ingredients_in_recipe',
+                 queryset=models.RecipeIngredient.objects.select_related(
+                     'ingredient')),
+    )
+
+
+def prefetch_latest_recipes(authors: Iterable, limit: int = None) -> None:
+    """
+    Загружает в author.recipes последние limit рецептов каждого автора
+    из authors одним запросом (без limit - все рецепты).
+    Номер рецепта у автора считается оконной функцией ROW_NUMBER;
+    фильтровать по ней ORM Django 4.0 не умеет, поэтому запрос
+    с ее значением оборачивается в подзапрос.
+    """
+    queryset = models.Recipe.objects.order_by('-pub_date', '-id')
+    if limit is not None:
+        ranked = models.Recipe.objects.filter(author__in=authors).annotate(
+            row_number=Window(
+                RowNumber(), partition_by=F('author'),
+                order_by=(F('pub_date').desc(), F('id').desc()))
+        ).order_by().values('id', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        queryset = queryset.filter(id__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            f'WHERE ranked.row_number <= %s', (*params, limit)))
+    prefetch_related_objects(
+        list(authors), Prefetch('recipes', queryset=queryset))
+
+
+def get_tag_ids_by_slug() -> dict:
+    """
+    Словарь slug -> id всех тегов. Хранится в кэше до изменения тегов
+    (ключ включает версию данных тегов, см. recipes.data_versions)
+    """
+    key = TAG_IDS_KEY.format(get_data_version('tag'))
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(models.Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids,
+                  settings.REFERENCE_DATA_CACHE['VERSION_TTL'])
+    return tag_ids
+
+
+def filter_recipes_by_tags(queryset: Iterable, slugs: Iterable,
+                           match_all: bool = False) -> Iterable:
+    """
+    Рецепты с любым из тегов slugs (match_all - со всеми тегами).
+    Фильтр через EXISTS по RecipeTag, а не JOIN, поэтому рецепты
+    не дублируются и DISTINCT не нужен.
+    """
+    tag_ids = get_tag_ids_by_slug()
+    ids = {tag_ids[slug] for slug in slugs if slug in tag_ids}
+    if not ids or (match_all and len(ids) < len(set(slugs))):
+        return queryset.none()
+    if not match_all:
+        return queryset.filter(Exists(models.RecipeTag.objects.filter(
+            recipe=OuterRef('pk'), tag_id__in=ids)))
+    return queryset.filter(*(
+        Exists(models.RecipeTag.objects.filter(
+            recipe=OuterRef('pk'), tag_id=tag_id))
+        for tag_id in ids))
 
 
 def get_user_favorite_recipes(user: User,
@@ -119,7 +720,7 @@ def get_user_favorite_recipes(user: User,
 
 def get_user_shopping_cart_recipes(user: User,
                                    queryset: Iterable) -> Iterable:
-    return models.Recipe.objects.filter(
+    return queryset.filter(
         id__in=user.shopping_cart.values_list(
             'recipe', flat=True)
     )
@@ -0,0 +1,96 @@
+# Поиск по названиям ингредиентов и рецептов и по тексту рецептов.
+# На PostgreSQL используются триграммные GIN-индексы (pg_trgm)
+# и полнотекстовый поиск по столбцу Recipe.search_vector
+# с русской конфигурацией; на остальных БД - поиск через LIKE.
+
+from collections.abc import Iterable
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, F, FloatField, Q, Value, When
+
+SEARCH_CONFIG = 'russian'
+
+# Объекты БД для поиска на PostgreSQL. Создаются после migrate
+# (см. create_postgres_search_objects), т.к. зависят от расширения
+# pg_trgm и не поддерживаются другими БД.
+POSTGRES_SEARCH_SQL = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    # icontains в Django - это UPPER(name) LIKE UPPER(...),
+    # поэтому индексы для него строятся по UPPER(name)
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_upper_name_trgm '
+    'ON recipes_ingredient USING gin (UPPER(name) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_upper_name_trgm '
+    'ON recipes_recipe USING gin (UPPER(name) gin_trgm_ops)',
+    # Для оператора схожести name % 'запрос'
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_name_trgm '
+    'ON recipes_recipe USING gin (name gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector '
+    'ON recipes_recipe USING gin (search_vector)',
+    # search_vector пересчитывается самой БД при любой записи
+    # name/text, в том числе при bulk_create и update()
+    'DROP TRIGGER IF EXISTS recipes_recipe_search_vector_update '
+    'ON recipes_recipe',
+    f'CREATE TRIGGER recipes_recipe_search_vector_update '
+    f'BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe '
+    f'FOR EACH ROW EXECUTE PROCEDURE tsvector_update_trigger('
+    f'search_vector, \'pg_catalog.{SEARCH_CONFIG}\', name, text)',
+    f'UPDATE recipes_recipe SET search_vector = to_tsvector('
+    f'\'pg_catalog.{SEARCH_CONFIG}\', '
+    f'COALESCE(name, \'\') || \' \' || COALESCE(text, \'\')) '
+    f'WHERE search_vector IS NULL',
+)
+
+
+def is_postgres_search_enabled(using: str = 'default') -> bool:
+    return (settings.POSTGRES_SEARCH
+            and connections[using].vendor == 'postgresql')
+
+
+def create_postgres_search_objects(using: str = 'default', **kwargs) -> None:
+    """
+    Обработчик post_migrate: создает расширение, индексы и триггер
+    для поиска на PostgreSQL. Повторный запуск безопасен.
+    """
+    if not is_postgres_search_enabled(using):
+        return None
+    with connections[using].cursor() as cursor:
+        for sql in POSTGRES_SEARCH_SQL:
+            cursor.execute(sql)
+    return None
+
+
+def filter_ingredients(queryset: Iterable, query: str) -> Iterable:
+    """
+    Ингредиенты, в названии которых встречается query.
+    На PostgreSQL запрос обслуживается триграммным индексом.
+    """
+    return queryset.filter(name__icontains=query)
+
+
+def search_recipes(queryset: Iterable, query: str) -> Iterable:
+    """
+    Поиск рецептов по названию и тексту с сортировкой по релевантности.
+    PostgreSQL: полнотекстовый поиск по search_vector плюс схожесть
+    названия (допускает опечатки). Остальные БД: поиск подстроки,
+    совпадения в начале названия выше совпадений в середине и в тексте.
+    """
+    if not is_postgres_search_enabled(queryset.db):
+        return queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+        ).annotate(
+            search_rank=Case(
+                When(name__istartswith=query, then=Value(2.0)),
+                When(name__icontains=query, then=Value(1.0)),
+                default=Value(0.0), output_field=FloatField())
+        ).order_by('-search_rank', '-pub_date')
+
+    from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                                TrigramSimilarity)
+    search_query = SearchQuery(query, config=SEARCH_CONFIG)
+    return queryset.filter(
+        Q(search_vector=search_query) | Q(name__trigram_similar=query)
+    ).annotate(
+        search_rank=(SearchRank(F('search_vector'), search_query)
+                     + TrigramSimilarity('name', query))
+    ).order_by('-search_rank', '-pub_date')
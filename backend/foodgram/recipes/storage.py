@@ -0,0 +1,66 @@
+import hashlib
+import os
+import re
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+# Имя файла - SHA-256 содержимого (64 шестнадцатеричных символа)
+CONTENT_NAME_RE = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла определяется его содержимым:
+    <каталог>/<первые 2 символа хэша>/<sha256>.<расширение>.
+    Одинаковые файлы хранятся один раз: если файл с таким хэшем уже
+    есть, он не перезаписывается. Учет ссылок на файлы и удаление
+    ненужных - в recipes.media.
+    """
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        return super().save(
+            self.get_content_name(name, content), content, max_length)
+
+    def get_content_name(self, name: str, content) -> str:
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if content.seekable():
+            content.seek(0)
+        digest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return '/'.join(
+            part for part in (directory, digest[:2], digest + extension)
+            if part)
+
+    @staticmethod
+    def is_content_name(name: str) -> bool:
+        return bool(name) and CONTENT_NAME_RE.search(name) is not None
+
+    def get_available_name(self, name, max_length=None):
+        # Имя по содержимому не меняется: существующий файл и есть нужный
+        return name
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+        # Запись во временный файл и атомарная замена: параллельная
+        # запись того же файла или сбой не оставят файл недописанным,
+        # а другие запросы не увидят его раньше времени
+        temporary_name = super()._save(
+            f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temporary_name), self.path(name))
+        return name
+
+
+content_storage = ContentAddressedStorage()
+
+
+def get_content_storage():
+    return content_storage
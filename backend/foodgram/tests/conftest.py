@@ -0,0 +1,247 @@
+import base64
+import csv
+import io
+import os
+import random
+import time
+from collections import Counter
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes import counters, models, recipes_services
+from recipes.ingredients_index import ingredients_index
+from recipes.management.commands.load_csv_data import (
+    CSV_DATA_PATH, load_csv_through_reader)
+from users.models import Subscription
+
+User = get_user_model()
+
+# Объем тестовых данных
+SEED = 2022
+USERS_COUNT = 300
+TAGS_COUNT = 15
+RECIPES_COUNT = 3000
+MAX_INGREDIENTS_IN_RECIPE = 15
+MAX_TAGS_IN_RECIPE = 3
+SUBSCRIPTIONS_PER_USER = 10
+# Подписки, избранное и список покупок "основного" пользователя,
+# от имени которого выполняются запросы
+BUDGET_USER_SUBSCRIPTIONS = 60
+BUDGET_USER_FAVORITES = 100
+BUDGET_USER_SHOPPING_CART = 30
+
+BUDGET_USER_EMAIL = 'budget@foodgram.test'
+
+# Результаты замеров: (метод, url, кол-во запросов, время в мс)
+MEASUREMENTS = []
+
+
+def _load_ingredients():
+    with open(os.path.join(CSV_DATA_PATH, 'ingredients.csv'),
+              encoding='UTF-8', newline='') as csv_file:
+        models.Ingredient.objects.bulk_create([
+            models.Ingredient(name=name, measurement_unit=measurement_unit)
+            for name, measurement_unit in csv.reader(csv_file)
+        ])
+
+
+def seed_dataset():
+    """
+    Наполнение БД данными, близкими по объему к реальным:
+    все ингредиенты из data/ingredients.csv, теги, пользователи,
+    подписки, рецепты с ингредиентами и тегами, избранное и покупки.
+    """
+    rnd = random.Random(SEED)
+    _load_ingredients()
+    load_csv_through_reader(file='measurement_units.csv')
+    ingredient_ids = list(
+        models.Ingredient.objects.values_list('id', flat=True))
+
+    models.Tag.objects.bulk_create([
+        models.Tag(name=f'Тег {num}', color=f'#{num:06X}', slug=f'tag{num}')
+        for num in range(TAGS_COUNT)
+    ])
+    tag_ids = list(models.Tag.objects.values_list('id', flat=True))
+
+    User.objects.bulk_create([
+        User(username=f'user{num}', email=f'user{num}@foodgram.test',
+             first_name=f'Имя{num}', last_name=f'Фамилия{num}')
+        for num in range(USERS_COUNT)
+    ])
+    budget_user = User.objects.create(
+        username='budget', email=BUDGET_USER_EMAIL,
+        first_name='Бюджет', last_name='Запросов')
+    user_ids = list(
+        User.objects.exclude(pk=budget_user.pk).values_list('id', flat=True))
+
+    # Популярность авторов неравномерна: часть авторов пишет
+    # значительно больше остальных
+    authors = rnd.choices(
+        user_ids,
+        weights=[1 / (rank + 1) for rank in range(len(user_ids))],
+        k=RECIPES_COUNT)
+    models.Recipe.objects.bulk_create([
+        models.Recipe(
+            name=f'Рецепт {num}', image='images/seed.png',
+            text=f'Описание рецепта {num}',
+            cooking_time=rnd.randint(1, 180), author_id=author_id)
+        for num, author_id in enumerate(authors)
+    ])
+    recipe_ids = list(models.Recipe.objects.values_list('id', flat=True))
+
+    recipe_tags = []
+    recipe_ingredients = []
+    for recipe_id in recipe_ids:
+        for tag_id in rnd.sample(tag_ids, rnd.randint(1, MAX_TAGS_IN_RECIPE)):
+            recipe_tags.append(
+                models.RecipeTag(recipe_id=recipe_id, tag_id=tag_id))
+        for ingredient_id in rnd.sample(
+                ingredient_ids, rnd.randint(1, MAX_INGREDIENTS_IN_RECIPE)):
+            recipe_ingredients.append(models.RecipeIngredient(
+                recipe_id=recipe_id, ingredient_id=ingredient_id,
+                amount=rnd.randint(1, 500)))
+    models.RecipeTag.objects.bulk_create(recipe_tags, batch_size=5000)
+    models.RecipeIngredient.objects.bulk_create(
+        recipe_ingredients, batch_size=5000)
+
+    subscriptions = []
+    for subscriber_id in user_ids:
+        for subscribed_id in rnd.sample(user_ids, SUBSCRIPTIONS_PER_USER):
+            if subscribed_id != subscriber_id:
+                subscriptions.append(Subscription(
+                    subscriber_id=subscriber_id,
+                    subscribed_id=subscribed_id))
+    # Основной пользователь подписан на самых плодовитых авторов
+    prolific_authors = Counter(authors).most_common(
+        BUDGET_USER_SUBSCRIPTIONS)
+    for subscribed_id, _ in prolific_authors:
+        subscriptions.append(Subscription(
+            subscriber_id=budget_user.pk, subscribed_id=subscribed_id))
+    Subscription.objects.bulk_create(subscriptions, batch_size=5000)
+
+    models.Favorite.objects.bulk_create([
+        models.Favorite(user=budget_user, recipe_id=recipe_id)
+        for recipe_id in rnd.sample(recipe_ids, BUDGET_USER_FAVORITES)
+    ])
+    models.ShoppingCart.objects.bulk_create([
+        models.ShoppingCart(user=budget_user, recipe_id=recipe_id)
+        for recipe_id in rnd.sample(recipe_ids, BUDGET_USER_SHOPPING_CART)
+    ])
+    recipes_services.rebuild_shopping_lists()
+    counters.reconcile_counters()
+
+
+@pytest.fixture(scope='session')
+def django_db_setup(django_db_setup, django_db_blocker):
+    with django_db_blocker.unblock():
+        seed_dataset()
+
+
+@pytest.fixture(autouse=True)
+def reset_caches():
+    # Откат транзакции теста не вызывает сигналов, поэтому индекс
+    # и кэш сбрасываются вручную, чтобы не хранить откатанные данные
+    yield
+    ingredients_index.invalidate()
+    cache.clear()
+
+
+@pytest.fixture
+def budget_user(db):
+    return User.objects.get(email=BUDGET_USER_EMAIL)
+
+
+@pytest.fixture
+def user_client(budget_user):
+    client = APIClient()
+    client.force_authenticate(budget_user)
+    return client
+
+
+@pytest.fixture
+def anon_client(db):
+    return APIClient()
+
+
+@pytest.fixture
+def base64_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), color='orange').save(buffer, format='PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+@pytest.fixture
+def image_upload():
+    """
+    Фабрика загружаемых файлов изображений (PNG цвета color)
+    """
+    def _image_upload(color='orange'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 32), color=color).save(buffer, format='PNG')
+        return ContentFile(buffer.getvalue(), name='upload.png')
+    return _image_upload
+
+
+@pytest.fixture
+def create_recipe(budget_user):
+    """
+    Фабрика рецептов: автор по умолчанию - основной пользователь,
+    ingredient_ids и tag_ids - id ингредиентов и тегов рецепта,
+    остальные поля рецепта можно переопределить.
+    """
+    def _create_recipe(author=None, ingredient_ids=(), tag_ids=(),
+                       **fields):
+        recipe = models.Recipe.objects.create(**{
+            'author': author or budget_user, 'name': 'Рецепт',
+            'text': 'Описание', 'image': 'images/seed.png',
+            'cooking_time': 5, **fields})
+        models.RecipeIngredient.objects.bulk_create([
+            models.RecipeIngredient(
+                recipe=recipe, ingredient_id=pk, amount=10)
+            for pk in ingredient_ids])
+        models.RecipeTag.objects.bulk_create([
+            models.RecipeTag(recipe=recipe, tag_id=pk) for pk in tag_ids])
+        return recipe
+    return _create_recipe
+
+
+@pytest.fixture
+def measure():
+    """
+    Выполняет запрос клиентом и возвращает ответ вместе с количеством
+    SQL-запросов и временем выполнения. Замеры попадают в итоговый отчет.
+    """
+    def _measure(client, method, url, data=None, **extra):
+        if method != 'get':
+            extra.setdefault('format', 'json')
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = getattr(client, method)(url, data=data, **extra)
+            if getattr(response, 'streaming', False):
+                # Потоковый ответ обращается к БД во время чтения
+                response.streaming_content = [
+                    b''.join(response.streaming_content)]
+            elapsed = (time.perf_counter() - started) * 1000
+        MEASUREMENTS.append(
+            (method.upper(), url, len(context.captured_queries), elapsed))
+        return response, len(context.captured_queries)
+    return _measure
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not MEASUREMENTS:
+        return
+    terminalreporter.section('SQL query budget')
+    terminalreporter.write_line(
+        f'{"queries":>8} {"time, ms":>10}  endpoint')
+    for method, url, queries, elapsed in MEASUREMENTS:
+        terminalreporter.write_line(
+            f'{queries:>8} {elapsed:>10.1f}  {method} {url}')
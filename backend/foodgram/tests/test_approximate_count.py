@@ -0,0 +1,84 @@
+import pytest
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+
+from api import pagination
+from recipes import models
+
+
+@pytest.fixture
+def threshold(settings):
+    settings.APPROXIMATE_COUNT = {'THRESHOLD': 100, 'CACHE_TIMEOUT': 60}
+    settings.RECIPES_RESPONSE_CACHE = {
+        **settings.RECIPES_RESPONSE_CACHE, 'ENABLED': False}
+    return 100
+
+
+def test_large_list_count_is_approximate(threshold, user_client):
+    total = models.Recipe.objects.count()
+    response = user_client.get('/api/recipes/?limit=5')
+    assert response.data['count'] == total
+    assert response.data['approximate'] is False
+
+    with CaptureQueriesContext(connection) as context:
+        response = user_client.get('/api/recipes/?page=2')
+    assert response.data['count'] == total
+    assert response.data['approximate'] is True
+    assert not any('COUNT(' in query['sql']
+                   for query in context.captured_queries)
+
+
+def test_small_list_count_is_exact(threshold, user_client):
+    author = models.Recipe.objects.values('author').annotate(
+        recipes=Count('id')).order_by('recipes').first()
+    assert author['recipes'] < threshold
+    for _ in range(2):
+        response = user_client.get(
+            f'/api/recipes/?author={author["author"]}')
+        assert response.data['count'] == author['recipes']
+        assert response.data['approximate'] is False
+
+
+def test_filtered_list_count_is_exact(threshold, user_client):
+    tag = models.Tag.objects.first()
+    total = models.Recipe.objects.filter(tags=tag).distinct().count()
+    assert total >= threshold
+    for _ in range(2):
+        response = user_client.get(f'/api/recipes/?tags={tag.slug}')
+        assert response.data['count'] == total
+        assert response.data['approximate'] is False
+
+
+def test_pages_beyond_estimate_are_served(threshold, user_client,
+                                          monkeypatch):
+    # Оценка сильно меньше реального количества
+    monkeypatch.setattr(
+        pagination, 'estimate_count', lambda queryset: threshold)
+    response = user_client.get('/api/recipes/?limit=10&page=50')
+    assert response.status_code == 200
+    assert response.data['approximate'] is True
+    assert len(response.data['results']) == 10
+    assert response.data['next']
+    last_page = models.Recipe.objects.count() // 10 + 1
+    response = user_client.get(f'/api/recipes/?limit=10&page={last_page}')
+    assert response.status_code == 404
+
+
+def test_cached_count_is_dropped_on_create(threshold, create_recipe):
+    queryset = models.Recipe.objects.all()
+    pagination.remember_count(queryset, 12345)
+    assert pagination.estimate_count(queryset) == 12345
+    create_recipe()
+    assert pagination.estimate_count(queryset) is None
+
+
+@pytest.mark.parametrize('client_name', ('user_client', 'anon_client'))
+def test_recipes_limit_is_counted_exactly(threshold, request, client_name):
+    client = request.getfixturevalue(client_name)
+    for _ in range(2):
+        response = client.get('/api/recipes/?recipes_limit=3')
+        assert response.status_code == 200
+        assert response.data['count'] == 3
+        assert response.data['approximate'] is False
+        assert len(response.data['results']) == 3
@@ -0,0 +1,97 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import F
+
+from api.serializers import RecipeSerializer
+from recipes import counters, models
+from users.models import Subscription
+
+User = get_user_model()
+
+
+def test_favorite_and_shopping_cart(user_client, budget_user):
+    recipe = models.Recipe.objects.exclude(
+        favorite_recipes__user=budget_user).exclude(
+        shopping_recipes__user=budget_user).first()
+    favorites, carts = recipe.favorites_count, recipe.shopping_cart_count
+    for action in ('favorite', 'shopping_cart'):
+        response = user_client.post(f'/api/recipes/{recipe.pk}/{action}/')
+        assert response.status_code == 201
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == favorites + 1
+    assert recipe.shopping_cart_count == carts + 1
+
+    user_client.delete(f'/api/recipes/{recipe.pk}/favorite/')
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == favorites
+
+
+def test_subscription(user_client, budget_user):
+    author = User.objects.exclude(
+        subscribers__subscriber=budget_user).exclude(pk=budget_user.pk)[0]
+    subscribers = author.subscribers_count
+    user_client.post(f'/api/users/{author.pk}/subscribe/')
+    author.refresh_from_db()
+    assert author.subscribers_count == subscribers + 1
+    user_client.delete(f'/api/users/{author.pk}/subscribe/')
+    author.refresh_from_db()
+    assert author.subscribers_count == subscribers
+
+
+def test_recipe_author_change(budget_user, create_recipe):
+    other = User.objects.exclude(pk=budget_user.pk)[0]
+    recipes, other_recipes = budget_user.recipes_count, other.recipes_count
+    recipe = create_recipe()
+    budget_user.refresh_from_db()
+    assert budget_user.recipes_count == recipes + 1
+
+    recipe = models.Recipe.objects.get(pk=recipe.pk)
+    recipe.author = other
+    recipe.save()
+    budget_user.refresh_from_db()
+    other.refresh_from_db()
+    assert budget_user.recipes_count == recipes
+    assert other.recipes_count == other_recipes + 1
+
+    recipe.delete()
+    other.refresh_from_db()
+    assert other.recipes_count == other_recipes
+
+
+def test_reconcile(budget_user):
+    assert set(counters.reconcile_counters().values()) == {0}
+    models.Recipe.objects.filter(
+        pk=budget_user.favorites.first().recipe_id).update(favorites_count=0)
+    Subscription.objects.filter(subscriber=budget_user).delete()
+    User.objects.filter(pk=budget_user.pk).update(recipes_count=100)
+    repaired = counters.reconcile_counters()
+    assert repaired['recipe.favorites_count'] == 1
+    assert repaired['user.recipes_count'] == 1
+    assert repaired['user.subscribers_count'] == 0
+    call_command('reconcile_counters')
+    assert set(counters.reconcile_counters().values()) == {0}
+
+
+def test_full_save_keeps_concurrent_counter_changes(budget_user,
+                                                    create_recipe):
+    recipe = create_recipe()
+    recipe = models.Recipe.objects.get(pk=recipe.pk)
+    user = User.objects.get(pk=budget_user.pk)
+    # Параллельные запросы меняют счетчики после чтения объектов
+    models.Recipe.objects.filter(pk=recipe.pk).update(
+        favorites_count=F('favorites_count') + 1)
+    User.objects.filter(pk=user.pk).update(
+        subscribers_count=F('subscribers_count') + 1)
+
+    serializer = RecipeSerializer(
+        recipe, data={'name': 'Новое название'}, partial=True)
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+    user.set_password('new-password')
+    user.save()
+
+    recipe.refresh_from_db()
+    assert recipe.name == 'Новое название'
+    assert recipe.favorites_count == 1
+    assert User.objects.get(pk=user.pk).subscribers_count == (
+        budget_user.subscribers_count + 1)
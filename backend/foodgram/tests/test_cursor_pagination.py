@@ -0,0 +1,79 @@
+import pytest
+
+from recipes import models
+from users.models import Subscription
+
+
+def collect_pages(client, url, pages):
+    ids = []
+    for _ in range(pages):
+        response = client.get(url)
+        assert response.status_code == 200
+        assert 'count' not in response.data
+        ids += [item['id'] for item in response.data['results']]
+        url = response.data['next']
+        if url is None:
+            break
+    return ids, url
+
+
+def test_recipe_feed(anon_client):
+    ids, next_url = collect_pages(
+        anon_client, '/api/recipes/?cursor=&limit=7', pages=5)
+    expected = list(models.Recipe.objects.order_by(
+        '-pub_date', '-id').values_list('id', flat=True)[:35])
+    assert ids == expected
+    assert next_url is not None
+
+
+def test_recipe_feed_with_equal_pub_dates(anon_client, budget_user):
+    recipe = models.Recipe.objects.order_by('-pub_date', '-id').first()
+    models.Recipe.objects.filter(
+        pk__in=list(models.Recipe.objects.order_by(
+            '-pub_date', '-id').values_list('pk', flat=True)[:10])
+    ).update(pub_date=recipe.pub_date)
+    ids, _ = collect_pages(
+        anon_client, '/api/recipes/?cursor=&limit=3', pages=5)
+    assert len(ids) == len(set(ids)) == 15
+    assert ids == list(models.Recipe.objects.order_by(
+        '-pub_date', '-id').values_list('id', flat=True)[:15])
+
+
+def test_recipe_feed_with_filter(anon_client):
+    author = models.Recipe.objects.values_list(
+        'author', flat=True).first()
+    ids, next_url = collect_pages(
+        anon_client, f'/api/recipes/?cursor=&limit=50&author={author}',
+        pages=100)
+    assert next_url is None
+    assert ids == list(models.Recipe.objects.filter(
+        author=author).order_by('-pub_date', '-id').values_list(
+        'id', flat=True))
+
+
+def test_subscriptions(user_client, budget_user):
+    ids, next_url = collect_pages(
+        user_client, '/api/users/subscriptions/?cursor=&limit=25', pages=10)
+    assert next_url is None
+    assert ids == sorted(Subscription.objects.filter(
+        subscriber=budget_user).values_list('subscribed', flat=True))
+
+
+@pytest.mark.parametrize('cursor', ('мусор', 'WyIxIl0=', 'WyJ4IiwgIjEiXQ=='))
+def test_invalid_cursor(anon_client, cursor):
+    response = anon_client.get(f'/api/recipes/?cursor={cursor}')
+    assert response.status_code == 404
+
+
+def test_page_number_is_default(anon_client):
+    response = anon_client.get('/api/recipes/?page=2&limit=5')
+    assert response.data['count'] == models.Recipe.objects.count()
+    assert 'page=3' in response.data['next']
+
+
+def test_recipes_limit_ignores_cursor(anon_client):
+    response = anon_client.get('/api/recipes/?cursor=&recipes_limit=3')
+    assert response.status_code == 200
+    # Срез выдачи - постраничная пагинация
+    assert response.data['count'] == 3
+    assert len(response.data['results']) == 3
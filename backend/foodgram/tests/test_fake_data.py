@@ -0,0 +1,84 @@
+import datetime
+import io
+from collections import Counter
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from recipes import fake_data, models
+
+User = get_user_model()
+
+VOLUMES = dict(users=60, tags=6, recipes=600, subscriptions=5,
+               favorites=10, shopping_cart=2, batch_size=100)
+
+
+def _generate(seed):
+    last_id = models.Recipe.objects.aggregate(last=Max('id'))['last']
+    with transaction.atomic():
+        created = fake_data.generate(seed=seed, **VOLUMES)
+        recipes = list(models.Recipe.objects.filter(
+            id__gt=last_id).values_list(
+            'author__username', 'cooking_time', 'pub_date', 'tags__slug'))
+        transaction.set_rollback(True)
+    return created, recipes
+
+
+def test_volumes_and_skew(db):
+    last_id = models.Recipe.objects.aggregate(last=Max('id'))['last']
+    created = fake_data.generate(**VOLUMES)
+    assert created['users.User'] == VOLUMES['users']
+    assert created['recipes.Recipe'] == VOLUMES['recipes']
+    assert created['recipes.Favorite'] > 0
+    recipes = models.Recipe.objects.filter(id__gt=last_id)
+    assert not recipes.filter(tags=None).exists()
+    assert not recipes.filter(ingredients=None).exists()
+    assert recipes.values('pub_date').distinct().count() > 1
+    # Самый плодовитый автор пишет намного больше среднего
+    authors = Counter(recipes.values_list('author_id', flat=True))
+    top_author_id, top_count = authors.most_common(1)[0]
+    assert top_count > 5 * VOLUMES['recipes'] / VOLUMES['users']
+    # Счетчики пересчитаны после пакетной вставки
+    assert User.objects.get(pk=top_author_id).recipes_count == top_count
+
+
+def test_reproducible_from_seed(db):
+    first = _generate(seed=1)
+    assert _generate(seed=1) == first
+    assert _generate(seed=2) != first
+
+
+def test_dates_do_not_depend_on_current_time(db, monkeypatch):
+    first = _generate(seed=1)
+    later = timezone.now() + datetime.timedelta(days=3)
+    monkeypatch.setattr(timezone, 'now', lambda: later)
+    assert _generate(seed=1) == first
+
+
+def test_copy_requires_postgresql(db):
+    with pytest.raises(ValueError):
+        fake_data.generate(use_copy=True, **VOLUMES)
+
+
+def test_command(db):
+    recipes = models.Recipe.objects.count()
+    out = io.StringIO()
+    call_command('generate_fake_data', users=5, tags=2, recipes=10,
+                 stdout=out)
+    assert models.Recipe.objects.count() == recipes + 10
+    assert 'Данные сгенерированы' in out.getvalue()
+
+
+def test_response_cache_is_invalidated(anon_client):
+    anon_client.get('/api/recipes/?limit=1')
+    fake_data.generate(users=2, tags=1, recipes=2)
+    response = anon_client.get('/api/recipes/?limit=1')
+    assert response['X-Cache'] == 'MISS'
+    # Даты публикации сгенерированы, а не взяты из auto_now_add
+    assert response.data['results'][0]['id'] not in (
+        models.Recipe.objects.order_by('-id').values_list(
+            'id', flat=True)[:2])
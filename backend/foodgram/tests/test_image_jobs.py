@@ -0,0 +1,142 @@
+import datetime
+import io
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from PIL import Image
+
+from recipes import image_jobs, images, models
+
+
+@pytest.fixture
+def recipe(create_recipe):
+    return create_recipe(image=image_jobs.get_placeholder())
+
+
+def test_recipe_is_saved_with_placeholder(user_client, base64_image):
+    response = user_client.post('/api/recipes/', data={
+        'tags': [models.Tag.objects.first().pk],
+        'ingredients': [{'id': models.Ingredient.objects.first().pk,
+                         'amount': 100}],
+        'image': base64_image,
+        'name': 'Рецепт в обработке',
+        'text': 'Описание',
+        'cooking_time': 5,
+    }, format='json')
+    assert response.status_code == 201
+    assert response.data['image'].endswith(image_jobs.get_placeholder())
+    job = models.ImageJob.objects.get(recipe=response.data['id'])
+    assert job.status == models.ImageJob.PENDING
+
+    call_command('process_image_jobs', once=True, stdout=io.StringIO())
+    job.refresh_from_db()
+    assert job.status == models.ImageJob.DONE
+    assert job.processing_time is not None and not job.upload
+    response = user_client.get(f'/api/recipes/{job.recipe_id}/')
+    assert not response.data['image'].endswith(image_jobs.get_placeholder())
+
+
+def test_retry_with_backoff(recipe, image_upload, monkeypatch, settings):
+    def broken(content):
+        raise OSError('Хранилище недоступно')
+    monkeypatch.setattr(images, 'process_image', broken)
+    job = image_jobs.enqueue(recipe, image_upload())
+    for attempt in range(1, settings.IMAGE_JOBS['MAX_ATTEMPTS'] + 1):
+        assert image_jobs.process_available() == (0, 1)
+        job.refresh_from_db()
+        assert job.attempts == attempt
+        assert 'Хранилище недоступно' in job.last_error
+        # До истечения задержки задача не берется
+        assert image_jobs.process_available() == (0, 0)
+        models.ImageJob.objects.filter(pk=job.pk).update(
+            available_at=timezone.now())
+    assert job.status == models.ImageJob.FAILED
+    recipe.refresh_from_db()
+    assert recipe.image.name == image_jobs.get_placeholder()
+
+
+def test_invalid_image_is_not_retried(recipe):
+    job = image_jobs.enqueue(recipe, ContentFile(
+        b'not an image', name='upload.png'))
+    upload_name = job.upload.name
+    assert image_jobs.process_available() == (0, 1)
+    job.refresh_from_db()
+    assert job.status == models.ImageJob.FAILED and job.attempts == 1
+    # Загруженный файл неудачной задачи удален
+    assert not job.upload
+    assert not default_storage.exists(upload_name)
+
+
+def test_newer_upload_wins(recipe, image_upload):
+    image_jobs.enqueue(recipe, image_upload('red'))
+    first = image_jobs.claim_next_job()
+    image_jobs.enqueue(recipe, image_upload('blue'))
+    assert image_jobs.run_job(first)
+    recipe.refresh_from_db()
+    assert recipe.image.name == image_jobs.get_placeholder()
+    assert image_jobs.process_available() == (1, 0)
+    recipe.refresh_from_db()
+    with recipe.image.open() as file:
+        assert Image.open(file).getpixel((0, 0))[2] > 200
+    # Не начатая задача отменяется новой загрузкой
+    image_jobs.enqueue(recipe, image_upload())
+    image_jobs.enqueue(recipe, image_upload())
+    assert models.ImageJob.objects.filter(
+        recipe=recipe, status=models.ImageJob.PENDING).count() == 1
+
+
+def test_stale_job_is_reclaimed(recipe, image_upload, settings):
+    job = image_jobs.enqueue(recipe, image_upload())
+    assert image_jobs.claim_next_job().pk == job.pk
+    assert image_jobs.claim_next_job() is None
+    models.ImageJob.objects.filter(pk=job.pk).update(
+        started_at=timezone.now() - datetime.timedelta(
+            seconds=settings.IMAGE_JOBS['STALE_TIMEOUT'] + 1))
+    assert image_jobs.process_available() == (1, 0)
+
+
+def test_inline_processing(recipe, image_upload, settings):
+    settings.IMAGE_JOBS = dict(settings.IMAGE_JOBS, ASYNC=False)
+    job = image_jobs.enqueue(recipe, image_upload())
+    job.refresh_from_db()
+    assert job.status == models.ImageJob.DONE
+
+
+def test_failed_enqueue_removes_upload(recipe, image_upload, monkeypatch):
+    def broken_save(*args, **kwargs):
+        raise IntegrityError('Сбой записи задачи')
+    image_jobs.enqueue(recipe, image_upload())
+    _, before = default_storage.listdir('uploads/')
+    monkeypatch.setattr(models.ImageJob, 'save', broken_save)
+    with pytest.raises(IntegrityError):
+        image_jobs.enqueue(recipe, image_upload())
+    assert default_storage.listdir('uploads/')[1] == before
+
+
+def test_rolled_back_upload_is_collected(recipe, image_upload, settings):
+    settings.MEDIA_FILES = dict(settings.MEDIA_FILES, GC_GRACE_PERIOD=-1)
+    kept = image_jobs.enqueue(recipe, image_upload('green'))
+    with pytest.raises(RuntimeError):
+        with transaction.atomic():
+            job = image_jobs.enqueue(recipe, image_upload('red'))
+            raise RuntimeError('Откат запроса')
+    assert default_storage.exists(job.upload.name)
+    out = io.StringIO()
+    call_command('collect_media_garbage', stdout=out)
+    assert job.upload.name in out.getvalue()
+    assert not default_storage.exists(job.upload.name)
+    # Файл задачи, восстановленной откатом, на месте
+    assert default_storage.exists(kept.upload.name)
+
+
+def test_stats(recipe, image_upload):
+    image_jobs.enqueue(recipe, image_upload())
+    image_jobs.process_available()
+    stats = image_jobs.get_job_stats()
+    assert stats[models.ImageJob.DONE] >= 1
+    assert stats['avg_processing_time'] > 0
+    assert stats['max_wait_time'] >= 0
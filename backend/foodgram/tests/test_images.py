@@ -0,0 +1,99 @@
+import base64
+import io
+
+import pytest
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from PIL import Image
+
+from recipes import image_jobs, images, models
+
+
+def _data_url(image, image_format='PNG'):
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/{image_format.lower()};base64,{encoded}'
+
+
+def _create_recipe(client, image):
+    return client.post('/api/recipes/', data={
+        'tags': [models.Tag.objects.first().pk],
+        'ingredients': [{'id': models.Ingredient.objects.first().pk,
+                         'amount': 100}],
+        'image': image,
+        'name': 'Рецепт с изображением',
+        'text': 'Описание',
+        'cooking_time': 5,
+    }, format='json')
+
+
+def _open(name):
+    with default_storage.open(name) as file:
+        image = Image.open(file)
+        image.load()
+    return image
+
+
+def test_image_is_reencoded_with_thumbnails(user_client):
+    response = _create_recipe(user_client, _data_url(
+        Image.new('RGBA', (2000, 1000), color=(255, 0, 0, 128))))
+    assert response.status_code == 201
+    assert image_jobs.process_available() == (1, 0)
+    recipe = models.Recipe.objects.get(pk=response.data['id'])
+
+    stored = _open(recipe.image.name)
+    assert stored.format == images.get_output_format()
+    max_dimension = settings.RECIPE_IMAGES['MAX_DIMENSION']
+    assert stored.size == (max_dimension, max_dimension // 2)
+    for variant, size in settings.RECIPE_IMAGES['THUMBNAILS'].items():
+        assert _open(images.thumbnail_name(
+            recipe.image.name, variant)).size == size
+    response = user_client.get(f'/api/recipes/{recipe.pk}/')
+    assert set(response.data['thumbnails']) == set(
+        settings.RECIPE_IMAGES['THUMBNAILS'])
+    assert response.data['thumbnails']['small'].endswith(
+        images.thumbnail_name(recipe.image.url, 'small'))
+
+
+def test_compact_recipe_has_thumbnails(user_client):
+    recipe = models.Recipe.objects.exclude(
+        favorite_recipes__user__email='budget@foodgram.test').first()
+    response = user_client.post(f'/api/recipes/{recipe.pk}/favorite/')
+    assert response.status_code == 201
+    assert response.data['thumbnails']['small'].endswith(
+        images.thumbnail_name(recipe.image.url, 'small'))
+
+
+def test_size_limit_is_checked_before_decoding(user_client, base64_image,
+                                               settings):
+    settings.RECIPE_IMAGES = dict(
+        settings.RECIPE_IMAGES, MAX_UPLOAD_SIZE=10)
+    response = _create_recipe(user_client, base64_image)
+    assert response.status_code == 400
+    assert 'image' in response.data
+
+
+@pytest.mark.parametrize('image', (
+    'data:image/png;base64,bm90IGFuIGltYWdl',
+    'data:image/png;base64,###',
+    'not a data url',
+    _data_url(Image.new('RGB', (8, 8)), image_format='BMP'),
+))
+def test_invalid_image(user_client, image):
+    response = _create_recipe(user_client, image)
+    assert response.status_code == 400
+    assert 'image' in response.data
+
+
+def test_rebuild_thumbnails(db):
+    recipe = models.Recipe.objects.first()
+    buffer = io.BytesIO()
+    Image.new('RGB', (100, 50)).save(buffer, format='PNG')
+    recipe.image.save('old.png', io.BytesIO(buffer.getvalue()))
+    out = io.StringIO()
+    call_command('rebuild_thumbnails', stdout=out)
+    assert _open(images.thumbnail_name(recipe.image.name, 'small')).size == (
+        settings.RECIPE_IMAGES['THUMBNAILS']['small'])
+    assert 'ошибок' in out.getvalue()
@@ -0,0 +1,106 @@
+import io
+import json
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes import importers, models
+from recipes.management.commands.load_csv_data import CSV_DATA_PATH
+
+INGREDIENTS = importers.IMPORT_SPECS['ingredients']
+UNITS = importers.IMPORT_SPECS['measurement_units']
+
+
+def test_reimport_is_idempotent(db):
+    total = models.Ingredient.objects.count()
+    result = importers.import_file(
+        INGREDIENTS, f'{CSV_DATA_PATH}ingredients.csv')
+    assert result.inserted == result.updated == 0
+    assert result.skipped == total
+    assert models.Ingredient.objects.count() == total
+
+
+def test_insert_update_and_skip(db):
+    rows = [
+        {'name': 'импорт-ед', 'canonical_unit': 'г', 'factor': '10'},
+        {'name': 'импорт-ед', 'canonical_unit': 'г', 'factor': '20'},
+        {'name': 'импорт-пусто', 'canonical_unit': '', 'factor': '1'},
+        {'name': 'импорт-число', 'canonical_unit': 'г', 'factor': 'x'},
+        ['не', 'объект'],
+    ]
+    assert importers.import_rows(UNITS, rows) == (1, 0, 4)
+    assert models.MeasurementUnit.objects.get(name='импорт-ед').factor == 10
+
+    rows = [{'name': 'импорт-ед', 'canonical_unit': 'г', 'factor': 100}]
+    assert importers.import_rows(UNITS, rows) == (0, 1, 0)
+    assert models.MeasurementUnit.objects.get(name='импорт-ед').factor == 100
+    assert importers.import_rows(UNITS, rows) == (0, 0, 1)
+
+
+def test_conflicting_rows_are_not_counted_as_inserted(db, monkeypatch):
+    ingredient = models.Ingredient.objects.first()
+    rows = [
+        {'name': ingredient.name,
+         'measurement_unit': ingredient.measurement_unit},
+        {'name': 'импорт конфликт', 'measurement_unit': 'г'},
+    ]
+    # Запись появилась после поиска существующих (параллельная загрузка)
+    monkeypatch.setattr(importers, '_get_existing', lambda spec, keys: {})
+    assert importers.import_rows(INGREDIENTS, rows) == (1, 0, 1)
+
+
+def test_queries_per_batch(db):
+    rows = [{'name': f'импорт {num}', 'measurement_unit': 'г'}
+            for num in range(50)]
+    with CaptureQueriesContext(connection) as queries:
+        importers.import_rows(INGREDIENTS, rows, batch_size=50)
+    few = len(queries)
+    rows = [{'name': f'импорт {num}', 'measurement_unit': 'кг'}
+            for num in range(400)]
+    with CaptureQueriesContext(connection) as queries:
+        importers.import_rows(INGREDIENTS, rows, batch_size=400)
+    assert len(queries) == few
+
+
+@pytest.mark.parametrize('content', (
+    '[{"name": "импорт json", "measurement_unit": "г"},\n'
+    ' {"name": "импорт json", "measurement_unit": "мл"}]',
+    '{"name": "импорт json", "measurement_unit": "г"}\n'
+    '{"name": "импорт json", "measurement_unit": "мл"}\n',
+))
+def test_json_rows(monkeypatch, content):
+    # Объекты разрезаются границами чтения
+    monkeypatch.setattr(importers, 'JSON_READ_CHUNK_SIZE', 7)
+    assert list(importers.iter_json_rows(io.StringIO(content))) == [
+        {'name': 'импорт json', 'measurement_unit': 'г'},
+        {'name': 'импорт json', 'measurement_unit': 'мл'},
+    ]
+
+
+def test_truncated_json_is_an_error(monkeypatch):
+    monkeypatch.setattr(importers, 'JSON_READ_CHUNK_SIZE', 7)
+    rows = importers.iter_json_rows(io.StringIO(
+        '[{"name": "a", "measurement_unit": "г"}, {"name": "b"'))
+    assert next(rows) == {'name': 'a', 'measurement_unit': 'г'}
+    with pytest.raises(json.JSONDecodeError):
+        next(rows)
+
+
+def test_csv_header_is_skipped():
+    content = 'name,measurement_unit\nимпорт csv,г\n'
+    assert list(importers.iter_csv_rows(
+        io.StringIO(content), INGREDIENTS.fields)) == [
+        {'name': 'импорт csv', 'measurement_unit': 'г'}]
+
+
+def test_command(db, tmp_path):
+    path = tmp_path / 'ingredients.json'
+    path.write_text(json.dumps(
+        [{'name': 'импорт команда', 'measurement_unit': 'г'}]),
+        encoding='UTF-8')
+    out = io.StringIO()
+    call_command('import_ingredients', str(path), stdout=out)
+    assert 'добавлено 1' in out.getvalue()
+    assert models.Ingredient.objects.filter(name='импорт команда').exists()
@@ -0,0 +1,70 @@
+"""
+Проверка планов запросов эндпоинтов API.
+
+Запросы, которые выполняет эндпоинт, объясняются через EXPLAIN,
+и в планах должны встречаться индексы, рассчитанные на эти запросы
+(Meta.indexes моделей). На PostgreSQL последовательное чтение
+отключается, чтобы на небольших тестовых таблицах планировщик
+выбирал индекс, если он вообще применим к запросу.
+"""
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes import models
+
+EXPLAIN_PREFIX = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+}
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute(EXPLAIN_PREFIX[connection.vendor] + sql)
+        return '\n'.join(
+            ' '.join(str(column) for column in row)
+            for row in cursor.fetchall())
+
+
+def get_plans(client, method, url):
+    with CaptureQueriesContext(connection) as context:
+        response = getattr(client, method)(url)
+    assert response.status_code < 400
+    return [explain(query['sql']) for query in context.captured_queries
+            if query['sql'].startswith('SELECT')]
+
+
+@pytest.fixture
+def own_recipe(budget_user, create_recipe):
+    recipe = create_recipe()
+    models.Favorite.objects.create(user=budget_user, recipe=recipe)
+    return recipe
+
+
+@pytest.mark.parametrize('client_name, method, url, index', (
+    ('anon_client', 'get', '/api/recipes/', 'recipe_pub_date_idx'),
+    ('user_client', 'get', '/api/recipes/?limit=50', 'recipe_pub_date_idx'),
+    ('anon_client', 'get', '/api/recipes/?author={author}',
+     'recipe_author_pub_date_idx'),
+    ('user_client', 'get', '/api/users/subscriptions/?recipes_limit=3',
+     'recipe_author_pub_date_idx'),
+    ('user_client', 'delete', '/api/recipes/{recipe}/',
+     'favorite_recipe_user_idx'),
+))
+def test_endpoint_uses_index(request, own_recipe, client_name, method, url,
+                             index):
+    client = request.getfixturevalue(client_name)
+    url = url.format(author=own_recipe.author_id, recipe=own_recipe.pk)
+    plans = get_plans(client, method, url)
+    assert any(index in plan for plan in plans), '\n\n'.join(plans)
+
+
+def test_ingredients_ordered_by_index(settings, anon_client):
+    settings.INGREDIENT_SEARCH_INDEX = {
+        **settings.INGREDIENT_SEARCH_INDEX, 'ENABLED': False}
+    plans = get_plans(anon_client, 'get', '/api/ingredients/')
+    assert any('ingredient_lower_name_idx' in plan for plan in plans), (
+        '\n\n'.join(plans))
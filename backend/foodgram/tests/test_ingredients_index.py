@@ -0,0 +1,34 @@
+from django.conf import settings
+
+from recipes import models
+
+
+def test_prefix_matches_first(anon_client):
+    response = anon_client.get('/api/ingredients/?name=сок')
+    names = [ingredient['name'] for ingredient in response.json()]
+    prefix = [name for name in names if name.startswith('сок')]
+    assert prefix and names[:len(prefix)] == prefix
+    assert all('сок' in name for name in names[len(prefix):])
+    assert names[len(prefix):]
+    assert set(response.json()[0]) == {'id', 'name', 'measurement_unit'}
+
+
+def test_results_are_capped(anon_client):
+    response = anon_client.get('/api/ingredients/?name=а')
+    assert len(response.json()) == (
+        settings.INGREDIENT_SEARCH_INDEX['MAX_RESULTS'])
+
+
+def test_full_list_without_query(anon_client):
+    response = anon_client.get('/api/ingredients/')
+    assert len(response.json()) == models.Ingredient.objects.count()
+
+
+def test_index_is_rebuilt_on_change(anon_client):
+    ingredient = models.Ingredient.objects.create(
+        name='ябл тестовый', measurement_unit='г')
+    response = anon_client.get('/api/ingredients/?name=ябл')
+    assert response.json()[0]['id'] == ingredient.pk
+    ingredient.delete()
+    response = anon_client.get('/api/ingredients/?name=ябл')
+    assert ingredient.pk not in [item['id'] for item in response.json()]
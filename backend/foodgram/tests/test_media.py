@@ -0,0 +1,102 @@
+import io
+import os
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+
+from recipes import image_jobs, images, media, models
+from recipes.storage import content_storage
+
+
+@pytest.fixture
+def no_grace_period(settings):
+    settings.MEDIA_FILES = dict(settings.MEDIA_FILES, GC_GRACE_PERIOD=-1)
+
+
+@pytest.fixture
+def processed_recipe(create_recipe, image_upload):
+    """
+    Фабрика рецептов с обработанным изображением цвета color
+    """
+    def _processed_recipe(color):
+        recipe = create_recipe(image=image_jobs.get_placeholder())
+        image_jobs.enqueue(recipe, image_upload(color))
+        image_jobs.process_available()
+        recipe.refresh_from_db()
+        return recipe
+    return _processed_recipe
+
+
+def _references(name):
+    return models.MediaFile.objects.get(name=name).references
+
+
+def test_storage_names_files_by_content():
+    first = content_storage.save('images/a.webp', ContentFile(b'content'))
+    path = content_storage.path(first)
+    modified = os.stat(path).st_mtime_ns
+    second = content_storage.save('images/b.WEBP', ContentFile(b'content'))
+    assert first == second
+    assert content_storage.is_content_name(first)
+    assert first.startswith('images/') and first.endswith('.webp')
+    # Повторная запись пропущена
+    assert os.stat(path).st_mtime_ns == modified
+    assert not any(name.endswith('.tmp') for name in os.listdir(
+        os.path.dirname(path)))
+    assert content_storage.save(
+        'images/c.webp', ContentFile(b'other')) != first
+
+
+def test_identical_images_are_stored_once(processed_recipe, image_upload):
+    first = processed_recipe('green')
+    second = processed_recipe('green')
+    assert first.image.name == second.image.name
+    assert _references(first.image.name) == 2
+
+    # Повторная загрузка того же изображения ничего не меняет
+    image_jobs.enqueue(first, image_upload('green'))
+    image_jobs.process_available()
+    assert _references(first.image.name) == 2
+
+
+def test_garbage_collection(processed_recipe, image_upload, no_grace_period):
+    recipe = processed_recipe('purple')
+    other = processed_recipe('purple')
+    old_name = recipe.image.name
+    image_jobs.enqueue(recipe, image_upload('yellow'))
+    image_jobs.process_available()
+    recipe.refresh_from_db()
+    assert _references(old_name) == 1
+    assert old_name not in media.collect_garbage()
+
+    other.delete()
+    assert _references(old_name) == 0
+    assert media.collect_garbage(dry_run=True) == [old_name]
+    assert content_storage.exists(old_name)
+    assert media.collect_garbage() == [old_name]
+    assert not content_storage.exists(old_name)
+    assert not default_storage.exists(images.thumbnail_name(old_name, 'small'))
+    assert content_storage.exists(recipe.image.name)
+    assert not models.MediaFile.objects.filter(name=old_name).exists()
+
+
+def test_grace_period(processed_recipe):
+    recipe = processed_recipe('navy')
+    name = recipe.image.name
+    recipe.delete()
+    assert _references(name) == 0
+    assert media.collect_garbage() == []
+    assert content_storage.exists(name)
+
+
+def test_rebuild_references(processed_recipe, no_grace_period):
+    recipe = processed_recipe('olive')
+    models.MediaFile.objects.filter(name=recipe.image.name).update(
+        references=0)
+    out = io.StringIO()
+    call_command('collect_media_garbage', rebuild=True, stdout=out)
+    assert _references(recipe.image.name) == 1
+    assert content_storage.exists(recipe.image.name)
+    assert 'исправлено: 1' in out.getvalue()
@@ -0,0 +1,279 @@
+"""
+Бюджет SQL-запросов для эндпоинтов API.
+
+Количество запросов не должно зависеть от количества объектов в ответе:
+каждый эндпоинт вызывается с разными размерами страницы (либо с разным
+объемом вложенных данных), и количество запросов сравнивается.
+"""
+import pytest
+from django.contrib.auth import get_user_model
+from django.db.models import Count
+from rest_framework.test import APIClient
+
+from recipes import models
+
+User = get_user_model()
+
+PAGE_SIZES = (1, 10, 50)
+
+
+def assert_constant(counts):
+    assert len(set(counts.values())) == 1, (
+        f'Количество SQL-запросов растет с размером ответа: {counts}'
+    )
+
+
+@pytest.mark.parametrize('client_name, url', (
+    ('user_client', '/api/recipes/'),
+    ('user_client', '/api/recipes/?tags=tag1&tags=tag2'),
+    ('user_client', '/api/recipes/?is_favorited=1'),
+    ('user_client', '/api/recipes/?is_in_shopping_cart=1'),
+    ('anon_client', '/api/recipes/'),
+    ('anon_client', '/api/recipes/?tags=tag1&tags=tag2'),
+    ('user_client', '/api/users/'),
+    ('anon_client', '/api/users/'),
+    ('user_client', '/api/users/subscriptions/'),
+    ('user_client', '/api/users/subscriptions/?recipes_limit=3'),
+))
+def test_paginated_list(request, measure, client_name, url):
+    client = request.getfixturevalue(client_name)
+    separator = '&' if '?' in url else '?'
+    # Первый запрос заполняет кэши справочных данных (например, теги)
+    client.get(url)
+    counts = {}
+    for page_size in PAGE_SIZES:
+        response, counts[page_size] = measure(
+            client, 'get', f'{url}{separator}limit={page_size}')
+        assert response.status_code == 200
+        assert len(response.data['results']) == min(
+            page_size, response.data['count'])
+    assert_constant(counts)
+
+
+def test_subscriptions_recipes_limit(measure, user_client):
+    counts = {}
+    for recipes_limit in (1, 3, 50):
+        response, counts[recipes_limit] = measure(
+            user_client, 'get',
+            f'/api/users/subscriptions/?limit=10'
+            f'&recipes_limit={recipes_limit}')
+        assert response.status_code == 200
+    assert_constant(counts)
+
+
+@pytest.mark.parametrize('client_name', ('user_client', 'anon_client'))
+def test_recipe_detail(request, measure, client_name):
+    client = request.getfixturevalue(client_name)
+    recipes = models.Recipe.objects.annotate(
+        ingredients_count=Count('ingredients_in_recipe', distinct=True),
+        tags_count=Count('recipetag', distinct=True),
+    ).order_by('ingredients_count', 'tags_count')
+    counts = {}
+    for recipe in (recipes.first(), recipes.last()):
+        response, counts[recipe.ingredients_count] = measure(
+            client, 'get', f'/api/recipes/{recipe.pk}/')
+        assert response.status_code == 200
+    assert_constant(counts)
+
+
+@pytest.mark.parametrize('action', ('favorite', 'shopping_cart'))
+def test_recipe_favorite_and_shopping_cart(measure, user_client, budget_user,
+                                           action):
+    # Пустой список покупок: иначе набор запросов зависит от того,
+    # есть ли уже в нем ингредиенты рецепта (UPDATE и/или INSERT строк)
+    budget_user.shopping_cart.all().delete()
+    recipes = models.Recipe.objects.exclude(
+        favorite_recipes__user=budget_user
+    ).exclude(
+        shopping_recipes__user=budget_user
+    ).annotate(
+        ingredients_count=Count('ingredients_in_recipe')
+    ).order_by('ingredients_count', 'pk')
+    counts = {'post': {}, 'delete': {}}
+    for recipe in (recipes.first(), recipes.last()):
+        url = f'/api/recipes/{recipe.pk}/{action}/'
+        for method, status_code in (('post', 201), ('delete', 204)):
+            response, counts[method][recipe.ingredients_count] = measure(
+                user_client, method, url)
+            assert response.status_code == status_code
+    assert_constant(counts['post'])
+    assert_constant(counts['delete'])
+
+
+def test_subscribe(measure, user_client, budget_user):
+    authors = User.objects.exclude(
+        subscribers__subscriber=budget_user
+    ).exclude(pk=budget_user.pk).order_by('recipes_count', 'pk')
+    counts = {'post': {}, 'delete': {}}
+    for author in (authors.first(), authors.last()):
+        url = f'/api/users/{author.pk}/subscribe/'
+        for method, status_code in (('post', 201), ('delete', 204)):
+            response, counts[method][author.recipes_count] = measure(
+                user_client, method, url)
+            assert response.status_code == status_code
+    assert_constant(counts['post'])
+    assert_constant(counts['delete'])
+
+
+def test_users_me(measure, budget_user):
+    # Основной пользователь подписан на многих авторов, новый - ни на кого
+    new_user = User.objects.create(
+        username='new', email='new@foodgram.test',
+        first_name='Новый', last_name='Пользователь')
+    counts = {}
+    for user in (budget_user, new_user):
+        client = APIClient()
+        client.force_authenticate(user)
+        response, counts[user.username] = measure(
+            client, 'get', '/api/users/me/')
+        assert response.status_code == 200
+    assert_constant(counts)
+
+
+@pytest.mark.parametrize('client_name', ('user_client', 'anon_client'))
+def test_user_detail(request, measure, budget_user, client_name):
+    client = request.getfixturevalue(client_name)
+    subscribed = budget_user.subscriptions.values('subscribed_id')
+    counts = {}
+    for user in (User.objects.filter(pk__in=subscribed).first(),
+                 User.objects.exclude(pk__in=subscribed).first()):
+        response, counts[user.pk] = measure(
+            client, 'get', f'/api/users/{user.pk}/')
+        assert response.status_code == 200
+    assert_constant(counts)
+
+
+def test_recipe_delete(measure, user_client, create_recipe):
+    """
+    Удаление рецепта не зависит от количества ингредиентов и тегов.
+    Строки списка покупок, в котором есть рецепт, обновляются
+    сигналом pre_delete отдельно для каждой строки ShoppingCart
+    (см. recipes_services.remove_deleted_cart_from_shopping_list),
+    поэтому рецепты здесь не добавлены ни в один список покупок.
+    """
+    ingredient_ids = list(
+        models.Ingredient.objects.values_list('id', flat=True)[:15])
+    tag_ids = list(models.Tag.objects.values_list('id', flat=True)[:3])
+    counts = {}
+    for size in (1, 3, 15):
+        recipe = create_recipe(ingredient_ids=ingredient_ids[:size],
+                               tag_ids=tag_ids[:size])
+        response, counts[size] = measure(
+            user_client, 'delete', f'/api/recipes/{recipe.pk}/')
+        assert response.status_code == 204
+    assert_constant(counts)
+
+
+@pytest.mark.parametrize('url', ('/api/ingredients/', '/api/tags/'))
+def test_reference_data(measure, anon_client, url):
+    response, queries = measure(anon_client, 'get', url)
+    assert response.status_code == 200
+    assert queries == 1
+
+
+def test_ingredients_search(measure, anon_client):
+    # Первый запрос строит индекс ингредиентов в памяти
+    anon_client.get('/api/ingredients/')
+    counts = {}
+    for name in ('абрикосовое в', 'мо', 'а'):
+        response, counts[name] = measure(
+            anon_client, 'get', f'/api/ingredients/?name={name}')
+        assert response.status_code == 200
+    assert_constant(counts)
+
+
+def test_recipe_create(measure, user_client, base64_image):
+    tag_ids = list(models.Tag.objects.values_list('id', flat=True))
+    ingredient_ids = list(
+        models.Ingredient.objects.values_list('id', flat=True))
+    counts = {}
+    for size in (1, 3, 15):
+        response, counts[size] = measure(
+            user_client, 'post', '/api/recipes/',
+            data={
+                'tags': tag_ids[:size],
+                'ingredients': [
+                    {'id': pk, 'amount': 10} for pk in ingredient_ids[:size]
+                ],
+                'image': base64_image,
+                'name': f'Новый рецепт {size}',
+                'text': 'Описание',
+                'cooking_time': 5,
+            })
+        assert response.status_code == 201, response.data
+    assert_constant(counts)
+
+
+@pytest.mark.parametrize('report_format', ('txt', 'pdf', 'csv', 'json'))
+def test_download_shopping_cart(measure, user_client, budget_user,
+                                report_format):
+    counts = {}
+    for cart_size in (budget_user.shopping_cart.count(), 1):
+        budget_user.shopping_cart.exclude(
+            pk__in=list(budget_user.shopping_cart.values_list(
+                'pk', flat=True)[:cart_size])
+        ).delete()
+        response, counts[cart_size] = measure(
+            user_client, 'get',
+            f'/api/recipes/download_shopping_cart/?format={report_format}')
+        assert response.status_code == 200
+        assert (f'shopping_list.{report_format}'
+                in response['Content-Disposition'])
+    assert_constant(counts)
+
+
+def test_recipe_update(measure, user_client, create_recipe):
+    ingredient_ids = list(
+        models.Ingredient.objects.values_list('id', flat=True)[:30])
+    recipe = create_recipe()
+    counts = {}
+    for size in (1, 3, 15):
+        ingredients = [
+            {'id': pk, 'amount': size} for pk in ingredient_ids[size:size * 2]
+        ]
+        response, counts[size] = measure(
+            user_client, 'patch', f'/api/recipes/{recipe.pk}/',
+            data={'tags': [models.Tag.objects.first().pk],
+                  'ingredients': ingredients})
+        assert response.status_code == 200, response.data
+        assert sorted(
+            (item['id'], item['amount'])
+            for item in response.data['ingredients']
+        ) == sorted((item['id'], item['amount']) for item in ingredients)
+    assert_constant(counts)
+
+
+def test_recipe_update_keeps_unchanged_rows(measure, user_client,
+                                            create_recipe):
+    ingredient_ids = list(
+        models.Ingredient.objects.values_list('id', flat=True)[:20])
+    tag_ids = list(models.Tag.objects.values_list('id', flat=True)[:2])
+    recipe = create_recipe()
+    url = f'/api/recipes/{recipe.pk}/'
+    ingredients = [{'id': pk, 'amount': 10} for pk in ingredient_ids[:10]]
+    user_client.patch(url, data={'tags': tag_ids, 'ingredients': ingredients},
+                      format='json')
+    tag_rows = models.RecipeTag.objects.filter(recipe=recipe)
+    tag_pks = set(tag_rows.values_list('pk', flat=True))
+    ingredient_rows = dict(recipe.ingredients_in_recipe.values_list(
+        'ingredient_id', 'pk'))
+
+    ingredients[0] = {'id': ingredient_ids[0], 'amount': 20}
+    response, changed_one = measure(
+        user_client, 'patch', url,
+        data={'tags': tag_ids, 'ingredients': ingredients})
+    assert response.status_code == 200, response.data
+    assert set(tag_rows.values_list('pk', flat=True)) == tag_pks
+    # Все строки на месте, включая измененную
+    assert dict(recipe.ingredients_in_recipe.values_list(
+        'ingredient_id', 'pk')) == ingredient_rows
+    assert recipe.ingredients_in_recipe.get(
+        ingredient_id=ingredient_ids[0]).amount == 20
+
+    # Полная замена ингредиентов - удаление и вставка строк
+    response, replaced_all = measure(
+        user_client, 'patch', url,
+        data={'tags': tag_ids, 'ingredients': [
+            {'id': pk, 'amount': 10} for pk in ingredient_ids[10:]]})
+    assert response.status_code == 200, response.data
+    assert changed_one < replaced_all
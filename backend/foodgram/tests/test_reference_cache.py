@@ -0,0 +1,59 @@
+import pytest
+
+from recipes import models
+
+
+@pytest.mark.parametrize('url', (
+    '/api/tags/', '/api/ingredients/', '/api/ingredients/?name=мол'))
+def test_not_modified(measure, anon_client, url):
+    response = anon_client.get(url)
+    assert response.status_code == 200
+    assert 'max-age' in response['Cache-Control']
+    etag = response['ETag']
+
+    response, queries = measure(
+        anon_client, 'get', url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert response['ETag'] == etag
+    assert queries == 0
+
+
+def test_cached_body(measure, anon_client):
+    first = anon_client.get('/api/tags/')
+    response, queries = measure(anon_client, 'get', '/api/tags/')
+    assert response.status_code == 200
+    assert response.content == first.content
+    assert response['ETag'] == first['ETag']
+    assert queries == 0
+
+
+@pytest.mark.parametrize('url, create', (
+    ('/api/tags/', lambda: models.Tag.objects.create(
+        name='Новый тег', color='#ABCDEF', slug='new_tag')),
+    ('/api/ingredients/', lambda: models.Ingredient.objects.create(
+        name='новый ингредиент', measurement_unit='г')),
+))
+def test_version_changes_on_save(anon_client, url, create):
+    etag = anon_client.get(url)['ETag']
+    obj = create()
+    response = anon_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+    assert obj.name in response.content.decode()
+
+    etag = response['ETag']
+    obj.delete()
+    response = anon_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert obj.name not in response.content.decode()
+
+
+def test_detail(anon_client):
+    tag = models.Tag.objects.first()
+    response = anon_client.get(f'/api/tags/{tag.pk}/')
+    assert response.status_code == 200
+    assert response.json()['slug'] == tag.slug
+    response = anon_client.get(
+        f'/api/tags/{tag.pk}/', HTTP_IF_NONE_MATCH=response['ETag'])
+    assert response.status_code == 304
+    assert anon_client.get('/api/tags/0/').status_code == 404
@@ -0,0 +1,152 @@
+import pytest
+from django.contrib import admin
+from django.core.management import call_command
+from rest_framework.test import APIClient
+
+from api import response_cache
+from recipes import models
+
+
+@pytest.fixture
+def recipe():
+    return models.Recipe.objects.order_by('pk').first()
+
+
+@pytest.fixture
+def cache_stats(settings):
+    settings.RECIPES_RESPONSE_CACHE = {
+        **settings.RECIPES_RESPONSE_CACHE, 'STATS': True}
+
+
+def test_list_is_cached(measure, anon_client, cache_stats):
+    first = anon_client.get('/api/recipes/?limit=5')
+    assert first['X-Cache'] == 'MISS'
+    response, queries = measure(anon_client, 'get', '/api/recipes/?limit=5')
+    assert response['X-Cache'] == 'HIT'
+    assert response.content == first.content
+    assert queries == 0
+    assert response_cache.get_cache_stats() == {
+        'hits': 1, 'misses': 1, 'hit_ratio': 0.5}
+
+
+def test_stats_are_off_by_default(anon_client):
+    anon_client.get('/api/recipes/?limit=5')
+    anon_client.get('/api/recipes/?limit=5')
+    assert response_cache.get_cache_stats() == {
+        'hits': 0, 'misses': 0, 'hit_ratio': 0.0}
+
+
+def test_query_params_are_normalized(anon_client):
+    anon_client.get('/api/recipes/?tags=tag1&tags=tag2&limit=5&author=')
+    response = anon_client.get('/api/recipes/?limit=5&tags=tag2&tags=tag1')
+    assert response['X-Cache'] == 'HIT'
+    response = anon_client.get('/api/recipes/?limit=5&tags=tag2')
+    assert response['X-Cache'] == 'MISS'
+
+
+def test_authenticated_requests_are_not_cached(user_client):
+    for _ in range(2):
+        response = user_client.get('/api/recipes/?limit=5')
+        assert 'X-Cache' not in response
+
+
+def test_invalidated_on_recipe_change(anon_client, recipe):
+    url = f'/api/recipes/{recipe.pk}/'
+    anon_client.get(url)
+    recipe.name = 'Новое название'
+    recipe.save()
+    response = anon_client.get(url)
+    assert response['X-Cache'] == 'MISS'
+    assert response.data['name'] == 'Новое название'
+
+
+def test_invalidated_on_tag_change(anon_client, recipe):
+    url = f'/api/recipes/{recipe.pk}/'
+    anon_client.get(url)
+    tag = recipe.tags.first()
+    tag.name = 'Новый тег'
+    tag.save()
+    response = anon_client.get(url)
+    assert response['X-Cache'] == 'MISS'
+    assert 'Новый тег' in [item['name'] for item in response.data['tags']]
+
+
+def test_invalidated_on_tags_only_update(
+        anon_client, user_client, create_recipe):
+    recipe = create_recipe()
+    tags = list(models.Tag.objects.order_by('pk')[:2])
+    recipe.tags.set(tags[:1])
+    url = f'/api/recipes/{recipe.pk}/'
+    anon_client.get(url)
+    assert anon_client.get(url)['X-Cache'] == 'HIT'
+    response = user_client.patch(
+        url, data={'tags': [tags[1].pk]}, format='json')
+    assert response.status_code == 200
+    response = anon_client.get(url)
+    assert response['X-Cache'] == 'MISS'
+    assert [item['id'] for item in response.data['tags']] == [tags[1].pk]
+
+
+def test_invalidated_on_author_change(anon_client, recipe):
+    url = f'/api/recipes/{recipe.pk}/'
+    anon_client.get(url)
+    author = recipe.author
+    author.first_name = 'Новое имя'
+    author.save()
+    response = anon_client.get(url)
+    assert response['X-Cache'] == 'MISS'
+    assert response.data['author']['first_name'] == 'Новое имя'
+
+
+def test_login_keeps_cache(anon_client, recipe):
+    author = recipe.author
+    author.set_password('foodgram-password')
+    author.save()
+    url = f'/api/recipes/{recipe.pk}/'
+    anon_client.get(url)
+    response = APIClient().post('/api/auth/token/login/', data={
+        'email': author.email, 'password': 'foodgram-password'})
+    assert response.status_code == 200, response.data
+    assert anon_client.get(url)['X-Cache'] == 'HIT'
+
+    author.delete()
+    assert anon_client.get(url).status_code == 404
+
+
+def test_invalidated_on_admin_row_delete(anon_client, recipe):
+    url = f'/api/recipes/{recipe.pk}/'
+    for model in (models.RecipeTag, models.RecipeIngredient):
+        model_admin = admin.site._registry[model]
+        anon_client.get(url)
+        assert anon_client.get(url)['X-Cache'] == 'HIT'
+        model_admin.delete_model(
+            None, model.objects.filter(recipe=recipe).first())
+        assert anon_client.get(url)['X-Cache'] == 'MISS'
+        model_admin.delete_queryset(None, model.objects.filter(recipe=recipe))
+        assert anon_client.get(url)['X-Cache'] == 'MISS'
+
+
+def test_file_based_backend(settings, tmp_path, anon_client, recipe):
+    settings.CACHES = {
+        **settings.CACHES,
+        'responses': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(tmp_path),
+        },
+    }
+    settings.RECIPES_RESPONSE_CACHE = {
+        **settings.RECIPES_RESPONSE_CACHE, 'CACHE_ALIAS': 'responses'}
+    url = f'/api/recipes/{recipe.pk}/'
+    assert anon_client.get(url)['X-Cache'] == 'MISS'
+    assert anon_client.get(url)['X-Cache'] == 'HIT'
+    models.RecipeIngredient.objects.create(
+        recipe=recipe, ingredient=models.Ingredient.objects.last(),
+        amount=1)
+    assert anon_client.get(url)['X-Cache'] == 'MISS'
+
+
+def test_stats_command(anon_client, capsys, cache_stats):
+    anon_client.get('/api/recipes/?limit=1')
+    call_command('recipes_cache_stats', '--reset')
+    assert 'промахов: 1' in capsys.readouterr().out
+    assert response_cache.get_cache_stats()['misses'] == 0
@@ -0,0 +1,21 @@
+def test_recipe_search_ranks_name_prefix_first(anon_client, create_recipe):
+    for name, text in (('Салат Оливье', 'Нарезать'),
+                       ('Оливье зимний', 'Нарезать кубиками'),
+                       ('Винегрет', 'Как Оливье, но со свеклой')):
+        create_recipe(name=name, text=text)
+    response = anon_client.get('/api/recipes/?search=Оливье&limit=10')
+    assert response.status_code == 200
+    assert [recipe['name'] for recipe in response.data['results']] == [
+        'Оливье зимний', 'Салат Оливье', 'Винегрет']
+
+
+def test_search_ignores_cursor(anon_client, create_recipe):
+    # Более релевантный рецепт - старше: по дате он был бы вторым
+    for name in ('Оливье зимний', 'Салат Оливье'):
+        create_recipe(name=name, text='Нарезать')
+    response = anon_client.get('/api/recipes/?search=Оливье&cursor=&limit=1')
+    assert response.status_code == 200
+    # Постраничная пагинация с сортировкой по релевантности
+    assert response.data['count'] == 2
+    assert response.data['results'][0]['name'] == 'Оливье зимний'
+    assert 'page=2' in response.data['next']
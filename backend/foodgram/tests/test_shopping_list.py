@@ -0,0 +1,213 @@
+import io
+import logging
+import re
+
+import pytest
+from django.contrib import admin
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import pre_save
+from django.test.utils import CaptureQueriesContext
+from reportlab.pdfbase import pdfmetrics
+
+from recipes import models, recipes_services
+
+
+def test_shopping_list_is_maintained_incrementally(
+        user_client, budget_user, base64_image):
+    ingredient_ids = list(
+        models.Ingredient.objects.values_list('id', flat=True)[:4])
+    response = user_client.post('/api/recipes/', data={
+        'tags': [models.Tag.objects.first().pk],
+        'ingredients': [
+            {'id': pk, 'amount': 100} for pk in ingredient_ids[:3]],
+        'image': base64_image,
+        'name': 'Рецепт для списка покупок',
+        'text': 'Описание',
+        'cooking_time': 5,
+    }, format='json')
+    recipe_id = response.data['id']
+    other_recipe = models.Recipe.objects.exclude(
+        shopping_recipes__user=budget_user).exclude(pk=recipe_id).first()
+
+    for pk in (recipe_id, other_recipe.pk):
+        response = user_client.post(f'/api/recipes/{pk}/shopping_cart/')
+        assert response.status_code == 201
+    assert recipes_services.verify_shopping_lists() == []
+
+    response = user_client.patch(f'/api/recipes/{recipe_id}/', data={
+        'ingredients': [
+            {'id': ingredient_ids[0], 'amount': 100},
+            {'id': ingredient_ids[1], 'amount': 250},
+            {'id': ingredient_ids[3], 'amount': 5},
+        ]}, format='json')
+    assert response.status_code == 200
+    assert recipes_services.verify_shopping_lists() == []
+
+    response = user_client.delete(
+        f'/api/recipes/{other_recipe.pk}/shopping_cart/')
+    assert response.status_code == 204
+    assert recipes_services.verify_shopping_lists() == []
+
+    response = user_client.delete(f'/api/recipes/{recipe_id}/')
+    assert response.status_code == 204
+    assert recipes_services.verify_shopping_lists() == []
+
+
+def test_cart_locks_are_taken_before_insert(
+        monkeypatch, user_client, budget_user):
+    events = []
+    lock_recipe = recipes_services._lock_recipe
+    lock_users = recipes_services._lock_users
+
+    def record_recipe_lock(recipe):
+        events.append('recipe')
+        return lock_recipe(recipe)
+
+    def record_users_lock(user_ids):
+        events.append('users')
+        return lock_users(user_ids)
+
+    def record_insert(sender, **kwargs):
+        events.append('insert')
+
+    monkeypatch.setattr(recipes_services, '_lock_recipe', record_recipe_lock)
+    monkeypatch.setattr(recipes_services, '_lock_users', record_users_lock)
+    pre_save.connect(record_insert, sender=models.ShoppingCart)
+    try:
+        recipe = models.Recipe.objects.exclude(
+            shopping_recipes__user=budget_user).first()
+        response = user_client.post(
+            f'/api/recipes/{recipe.pk}/shopping_cart/')
+    finally:
+        pre_save.disconnect(record_insert, sender=models.ShoppingCart)
+    assert response.status_code == 201
+    # Рецепт, затем пользователь - до строки ShoppingCart
+    assert events[:3] == ['recipe', 'users', 'insert']
+
+
+@pytest.mark.skipif(connection.vendor != 'postgresql',
+                    reason='SELECT ... FOR UPDATE есть только на PostgreSQL')
+def test_shopping_list_locks_do_not_block_key_share(budget_user):
+    recipe = models.Recipe.objects.first()
+    with CaptureQueriesContext(connection) as queries:
+        recipes_services.lock_shopping_list(budget_user, recipe)
+    locks = [query['sql'] for query in queries.captured_queries
+             if 'FOR ' in query['sql']]
+    assert len(locks) == 2
+    assert all('FOR NO KEY UPDATE' in sql for sql in locks)
+
+
+def test_rebuild_shopping_lists_command(budget_user):
+    models.ShoppingListItem.objects.filter(user=budget_user).update(amount=0)
+    assert recipes_services.verify_shopping_lists()
+    call_command('rebuild_shopping_lists')
+    assert recipes_services.verify_shopping_lists() == []
+
+
+def test_admin_changes_keep_shopping_lists(budget_user):
+    recipe = models.Recipe.objects.exclude(
+        shopping_recipes__user=budget_user).filter(
+        ingredients_in_recipe__isnull=False).first()
+    cart_admin = admin.site._registry[models.ShoppingCart]
+    ingredients_admin = admin.site._registry[models.RecipeIngredient]
+    recipe_admin = admin.site._registry[models.Recipe]
+
+    cart_admin.save_model(
+        None, models.ShoppingCart(user=budget_user, recipe=recipe),
+        None, False)
+    assert recipes_services.verify_shopping_lists() == []
+
+    ingredient_in_recipe = recipe.ingredients_in_recipe.first()
+    ingredient_in_recipe.amount += 7
+    ingredients_admin.save_model(None, ingredient_in_recipe, None, True)
+    assert recipes_services.verify_shopping_lists() == []
+
+    ingredients_admin.delete_queryset(
+        None, models.RecipeIngredient.objects.filter(
+            pk=ingredient_in_recipe.pk))
+    assert recipes_services.verify_shopping_lists() == []
+
+    cart = models.ShoppingCart.objects.get(user=budget_user, recipe=recipe)
+    cart_admin.delete_model(None, cart)
+    assert recipes_services.verify_shopping_lists() == []
+
+    in_carts = models.Recipe.objects.filter(
+        shopping_recipes__isnull=False).first()
+    recipe_admin.delete_queryset(
+        None, models.Recipe.objects.filter(pk=in_carts.pk))
+    assert recipes_services.verify_shopping_lists() == []
+
+
+def test_cascade_deletes_keep_shopping_lists(budget_user):
+    carts = models.ShoppingCart.objects.filter(user=budget_user)
+    assert carts.count() > 5
+    models.Recipe.objects.filter(
+        pk__in=list(carts.values_list('recipe_id', flat=True)[:3])).delete()
+    assert recipes_services.verify_shopping_lists() == []
+
+    models.ShoppingCart.objects.filter(
+        pk__in=list(carts.values_list('pk', flat=True)[:2])).delete()
+    assert recipes_services.verify_shopping_lists() == []
+
+    budget_user.delete()
+    assert recipes_services.verify_shopping_lists() == []
+
+
+def test_shopping_list_sums_in_canonical_units(user_client, budget_user):
+    budget_user.shopping_cart.all().delete()
+    models.ShoppingListItem.objects.filter(user=budget_user).delete()
+    grams = models.Ingredient.objects.create(
+        name='тестовый сахар', measurement_unit='г')
+    kilograms = models.Ingredient.objects.create(
+        name='тестовый сахар', measurement_unit='кг')
+    pieces = models.Ingredient.objects.create(
+        name='тестовый сахар', measurement_unit='кусок')
+    for ingredient, amount in ((grams, 300), (kilograms, 2), (pieces, 4)):
+        models.ShoppingListItem.objects.create(
+            user=budget_user, ingredient=ingredient, amount=amount,
+            recipes_count=1)
+
+    response = user_client.get(
+        '/api/recipes/download_shopping_cart/?format=csv')
+    lines = b''.join(response.streaming_content).decode().splitlines()
+    assert lines[1:] == [
+        'Тестовый сахар,2300,г',
+        'Тестовый сахар,4,кусок',
+    ]
+
+
+def _count_pdf_pages(content: bytes) -> int:
+    return len(re.findall(rb'/Type /Page\b(?!s)', content))
+
+
+def test_long_pdf_shopping_list_spans_pages():
+    output = io.BytesIO()
+    rows = [(f'Ингредиент {num}', num, 'г') for num in range(120)]
+    recipes_services.write_pdf_shopping_list(rows, output)
+    content = output.getvalue()
+    assert content.startswith(b'%PDF')
+    assert _count_pdf_pages(content) > 1
+
+
+def test_pdf_font_fallback(monkeypatch, settings, caplog):
+    # Шрифты регистрируются один раз на процесс: для проверки
+    # регистрация выполняется заново на копии реестра reportlab
+    monkeypatch.setattr(pdfmetrics, '_fonts', {
+        name: font for name, font in pdfmetrics._fonts.items()
+        if name not in (recipes_services.PDF_REPORT_FONT,
+                        recipes_services.PDF_REPORT_FONT_BOLD)})
+    settings.SHOPPING_LIST_PDF_FONTS = {
+        'regular': '/nonexistent/regular.ttf',
+        'bold': '/nonexistent/bold.ttf',
+    }
+    with caplog.at_level(logging.WARNING):
+        recipes_services.register_pdf_fonts()
+    assert 'Шрифты для PDF не найдены' in caplog.text
+    font = pdfmetrics.getFont(recipes_services.PDF_REPORT_FONT)
+    assert font.face.filename.endswith('Vera.ttf')
+
+    output = io.BytesIO()
+    recipes_services.write_pdf_shopping_list(
+        [(f'Ингредиент {num}', num, 'г') for num in range(60)], output)
+    assert _count_pdf_pages(output.getvalue()) == 2
@@ -0,0 +1,32 @@
+import pytest
+
+from recipes import models
+
+
+@pytest.mark.parametrize('recipes_limit', (None, 0, 3))
+def test_latest_recipes_per_author(user_client, budget_user, recipes_limit):
+    url = '/api/users/subscriptions/?limit=20'
+    if recipes_limit is not None:
+        url += f'&recipes_limit={recipes_limit}'
+    response = user_client.get(url)
+    assert response.status_code == 200
+    authors = response.data['results']
+    assert len(authors) == 20
+    for author in authors:
+        recipes = models.Recipe.objects.filter(
+            author_id=author['id']).order_by('-pub_date', '-id')
+        expected = list(recipes.values_list('id', flat=True))
+        assert author['recipes_count'] == len(expected)
+        assert [recipe['id'] for recipe in author['recipes']] == (
+            expected[:recipes_limit])
+        assert author['is_subscribed'] is True
+
+
+def test_subscribe_response(user_client, budget_user):
+    author = models.Recipe.objects.exclude(
+        author__subscribers__subscriber=budget_user).first().author
+    response = user_client.post(
+        f'/api/users/{author.pk}/subscribe/?recipes_limit=1')
+    assert response.status_code == 201, response.data
+    assert response.data['recipes_count'] == author.recipes.count()
+    assert len(response.data['recipes']) == 1
@@ -0,0 +1,64 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes import models
+
+SLUGS = ('tag1', 'tag2')
+
+
+def get_all_ids(client, url):
+    response = client.get(f'{url}&limit=999')
+    assert response.status_code == 200
+    return [recipe['id'] for recipe in response.data['results']]
+
+
+@pytest.mark.parametrize('match, expected', (
+    ('any', lambda recipe_tags: recipe_tags & set(SLUGS)),
+    ('all', lambda recipe_tags: recipe_tags >= set(SLUGS)),
+))
+def test_tags_match(user_client, match, expected):
+    ids = get_all_ids(
+        user_client,
+        f'/api/recipes/?tags=tag1&tags=tag2&tags_match={match}')
+    assert len(ids) == len(set(ids))
+    recipes = models.Recipe.objects.prefetch_related('tags')
+    assert set(ids) == {
+        recipe.pk for recipe in recipes
+        if expected({tag.slug for tag in recipe.tags.all()})
+    }
+
+
+def test_exact_slug_match(user_client):
+    # Раньше tag1 совпадал и с tag10..tag14
+    ids = get_all_ids(user_client, '/api/recipes/?tags=tag1')
+    assert set(ids) == set(models.Recipe.objects.filter(
+        tags__slug='tag1').values_list('id', flat=True))
+
+
+def test_unknown_tag(user_client):
+    assert get_all_ids(user_client, '/api/recipes/?tags=unknown') == []
+    assert get_all_ids(
+        user_client,
+        '/api/recipes/?tags=tag1&tags=unknown&tags_match=all') == []
+    assert get_all_ids(
+        user_client, '/api/recipes/?tags=tag1&tags=unknown') == (
+        get_all_ids(user_client, '/api/recipes/?tags=tag1'))
+
+
+def test_no_tag_queries(user_client):
+    user_client.get('/api/recipes/?tags=tag1')
+    with CaptureQueriesContext(connection) as context:
+        user_client.get('/api/recipes/?tags=tag1&tags=tag2')
+    sql = ' '.join(query['sql'] for query in context.captured_queries)
+    assert 'DISTINCT' not in sql
+    assert 'FROM "recipes_tag" WHERE' not in sql
+    assert 'SELECT DISTINCT "recipes_tag"."slug"' not in sql
+
+
+def test_tag_map_follows_changes(user_client):
+    recipe = models.Recipe.objects.first()
+    user_client.get('/api/recipes/?tags=new')
+    tag = models.Tag.objects.create(name='Новый', color='#123456', slug='new')
+    models.RecipeTag.objects.create(recipe=recipe, tag=tag)
+    assert get_all_ids(user_client, '/api/recipes/?tags=new') == [recipe.pk]
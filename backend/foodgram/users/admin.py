@@ -6,7 +6,8 @@ from .models import Subscription, User
 
 @register(User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('username', 'first_name', 'last_name', 'email')
+    list_display = ('username', 'first_name', 'last_name', 'email',
+                    'recipes_count', 'subscribers_count')
     list_filter = ('username', 'email')
     empty_value_display = '-пусто-'
 
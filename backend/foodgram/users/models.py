@@ -2,10 +2,38 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 
-class User(AbstractUser):
+class CountersModelMixin:
+    """
+    Денормализованные счетчики counter_fields меняются только атомарным
+    UPDATE с F() (см. recipes.counters). Сохранение уже существующего
+    объекта целиком записывает все поля, кроме них: иначе значения,
+    прочитанные в начале запроса, затерли бы изменения параллельных
+    запросов.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not args and not self._state.adding
+                and kwargs.get('update_fields') is None):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred]
+        super().save(*args, **kwargs)
+
+
+class User(CountersModelMixin, AbstractUser):
     first_name = models.CharField('Имя', max_length=150)
     last_name = models.CharField('Фамилия', max_length=150)
     email = models.EmailField('Email', unique=True)
+    # Счетчики поддерживаются обработчиками сигналов (см. recipes.counters)
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False)
+    subscribers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0, editable=False)
+    counter_fields = ('recipes_count', 'subscribers_count')
 
     def __str__(self):
         return f'{self.username} - {self.first_name} {self.last_name}'
@@ -1,6 +1,9 @@
-from collections import Iterable
+from collections.abc import Iterable
 
 from django.contrib.auth import get_user_model
+from django.db.models import BooleanField, Exists, OuterRef, Value
+
+from users.models import Subscription
 
 User = get_user_model()
 
@@ -12,3 +15,17 @@ def get_user_subscriptions(user: User) -> Iterable:
     return User.objects.filter(
         id__in=user.subscriptions.all().values_list('subscribed', flat=True)
     )
+
+
+def annotate_is_subscribed(user: User, queryset: Iterable) -> Iterable:
+    """
+    Добавляет к пользователям признак is_subscribed (подписан ли на них
+    пользователь user) прямо в запросе, без отдельного запроса на каждого.
+    """
+    if not user.is_authenticated:
+        return queryset.annotate(
+            is_subscribed=Value(False, output_field=BooleanField()))
+    return queryset.annotate(
+        is_subscribed=Exists(Subscription.objects.filter(
+            subscriber=user, subscribed=OuterRef('pk')))
+    )